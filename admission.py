@@ -0,0 +1,176 @@
+import asyncio
+import contextvars
+import time
+from contextlib import asynccontextmanager
+
+
+class RateLimited(Exception):
+    """Raised when a user or channel has used up its token bucket."""
+
+    def __init__(self, scope, retry_after, notify):
+        super().__init__(f"{scope} rate limit, retry in {retry_after:.1f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+        # Only the first rejection in a row is worth a reply; later ones would just add to the spam
+        self.notify = notify
+
+
+class Overloaded(Exception):
+    """Raised when the wait queue is full or a queued command waited too long."""
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "notified")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.notified = False
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def retry_after(self):
+        return (1 - self.tokens) / self.rate
+
+    def idle(self, now):
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class _Ticket:
+    __slots__ = ("held",)
+
+    def __init__(self):
+        self.held = False
+
+
+class AdmissionController:
+    """Admission control in front of command handlers.
+
+    A command must take a token from its user's and its channel's bucket, then
+    a slot in a pool of max_concurrent running commands. When the pool is full
+    it waits in a FIFO queue of at most max_queue commands for up to
+    queue_timeout seconds; beyond that it is shed with Overloaded. observer, if
+    given, is called with the seconds each admitted command spent queued.
+    """
+
+    def __init__(self, max_concurrent=8, max_queue=50, queue_timeout=10.0, user_rate=0.5, user_burst=5,
+                 channel_rate=2.0, channel_burst=20, max_buckets=10000, observer=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limits = {"user": (user_rate, user_burst), "channel": (channel_rate, channel_burst)}
+        self.max_buckets = max_buckets
+        self.observer = observer
+        self.buckets = {}
+        self.running = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._ticket = contextvars.ContextVar("admission_ticket", default=None)
+
+    def _take(self, user_id, channel_id):
+        now = time.monotonic()
+        if len(self.buckets) > self.max_buckets:
+            self.buckets = {key: bucket for key, bucket in self.buckets.items() if not bucket.idle(now)}
+        buckets = []
+        for scope, identifier in (("user", user_id), ("channel", channel_id)):
+            bucket = self.buckets.get((scope, identifier))
+            if bucket is None:
+                rate, capacity = self.limits[scope]
+                bucket = self.buckets[(scope, identifier)] = TokenBucket(rate, capacity, now)
+            bucket.refill(now)
+            if bucket.tokens < 1:
+                self.rate_limited += 1
+                notify = not bucket.notified
+                bucket.notified = True
+                raise RateLimited(scope, bucket.retry_after(), notify)
+            buckets.append(bucket)
+        # Only charge once both buckets have a token, so a channel rejection doesn't cost the user
+        for bucket in buckets:
+            bucket.tokens -= 1
+            bucket.notified = False
+
+    async def _acquire(self, ticket, bounded=True):
+        if self._slots.locked():
+            if bounded and self.queued >= self.max_queue:
+                self.shed += 1
+                raise Overloaded(f"{self.queued} commands already queued")
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+            try:
+                if bounded:
+                    await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+                else:
+                    await self._slots.acquire()
+            except asyncio.TimeoutError:
+                self.shed += 1
+                raise Overloaded(f"queued for more than {self.queue_timeout}s") from None
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+        ticket.held = True
+        self.running += 1
+
+    def _release(self, ticket):
+        if ticket.held:
+            ticket.held = False
+            self.running -= 1
+            self._slots.release()
+
+    @asynccontextmanager
+    async def admit(self, user_id, channel_id):
+        """Run the block once admitted. Raises RateLimited or Overloaded instead of running it."""
+        self._take(user_id, channel_id)
+        ticket = _Ticket()
+        start = time.perf_counter()
+        await self._acquire(ticket)
+        waited = time.perf_counter() - start
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        if self.observer is not None:
+            self.observer(waited)
+        token = self._ticket.set(ticket)
+        try:
+            yield
+        finally:
+            self._ticket.reset(token)
+            self._release(ticket)
+
+    @asynccontextmanager
+    async def suspended(self):
+        """Give the current command's slot back while it waits on something slow, like a user reply.
+
+        The slot is taken back afterwards without the queue limit, since the command was already admitted.
+        """
+        ticket = self._ticket.get()
+        if ticket is None or not ticket.held:
+            yield
+            return
+        self._release(ticket)
+        try:
+            yield
+        finally:
+            await self._acquire(ticket, bounded=False)
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "shed": self.shed,
+            "mean_wait_ms": self.total_wait / self.admitted * 1000 if self.admitted else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
@@ -0,0 +1,215 @@
+import re
+
+STOP_WORDS = frozenset({
+    "add", "team", "new", "create", "to", "for", "the", "with", "and",
+    "update", "role", "repo", "repository", "status", "show", "info",
+})
+
+# One tokenizer for every slot: (separator, GitHub URL, word). URLs come first so "github" is not split off as a word
+TOKEN_PATTERN = re.compile(r"(\W*)(?:((?:https?://)?github\.com/\S+)|(\w+))", re.IGNORECASE)
+URL = "<url>"
+
+
+class Token:
+    __slots__ = ("text", "lower", "kind", "gap")
+
+    def __init__(self, text, kind, gap):
+        self.text = text
+        self.lower = text.lower()
+        self.kind = kind
+        self.gap = gap  # the characters between the previous token and this one
+
+    @property
+    def follows_space(self):
+        """True if only whitespace separates this token from the previous one (regex \\s+)"""
+        return self.gap.isspace()
+
+
+class CommandArgs:
+    """Arguments pulled out of one utterance. Extension slots live in .extra."""
+
+    __slots__ = ("role", "team_name", "project_repo", "team_members", "status", "extra")
+
+    def __init__(self):
+        self.role = None
+        self.team_name = None
+        self.project_repo = None
+        self.team_members = []
+        self.status = None
+        self.extra = {}
+
+    def get(self, name, default=None):
+        if name in self.extra:
+            return self.extra[name]
+        if name != "extra" and name in CommandArgs.__slots__:
+            value = getattr(self, name)
+            return default if value is None else value
+        return default
+
+    def set(self, name, value):
+        if name != "extra" and name in CommandArgs.__slots__:
+            setattr(self, name, value)
+        else:
+            self.extra[name] = value
+
+    def as_dict(self):
+        args = {name: getattr(self, name) for name in CommandArgs.__slots__ if name != "extra"}
+        args.update(self.extra)
+        return args
+
+    def __repr__(self):
+        return f"CommandArgs({self.as_dict()!r})"
+
+
+class Slot:
+    """One argument to extract.
+
+    triggers are lowercase words (or "<url>" for GitHub URLs) whose positions the
+    tokenizer records. resolve(tokens, positions) gets every token plus a dict of
+    trigger -> token indices, and returns the slot value or None.
+    """
+
+    __slots__ = ("name", "triggers", "resolve")
+
+    def __init__(self, name, triggers, resolve):
+        self.name = name
+        self.triggers = frozenset(triggers)
+        self.resolve = resolve
+
+
+def word_after(tokens, index, exclude=STOP_WORDS):
+    """The word directly after tokens[index] (whitespace-separated), unless excluded"""
+    if index + 1 < len(tokens):
+        token = tokens[index + 1]
+        if token.kind == "word" and token.follows_space and token.lower not in exclude:
+            return token
+    return None
+
+
+def first_word_after(tokens, positions, trigger, exclude=STOP_WORDS):
+    for index in positions.get(trigger, ()):
+        token = word_after(tokens, index, exclude)
+        if token is not None:
+            return token
+    return None
+
+
+def _resolve_role(tokens, positions):
+    token = first_word_after(tokens, positions, "role")
+    return token.lower if token else None
+
+
+# "team name Beta" would otherwise capture "name"
+TEAM_EXCLUDE = STOP_WORDS | {"name"}
+STATUS_EXCLUDE = STOP_WORDS - {"to"}
+
+
+def _resolve_team_name(tokens, positions):
+    token = (first_word_after(tokens, positions, "team", TEAM_EXCLUDE)
+             or first_word_after(tokens, positions, "name")
+             or first_word_after(tokens, positions, "to"))
+    return token.text.capitalize() if token else None
+
+
+def _resolve_project_repo(tokens, positions):
+    indices = positions.get(URL)
+    if not indices:
+        return None
+    repo_url = tokens[indices[0]].text
+    return repo_url if repo_url.lower().startswith("http") else "https://" + repo_url
+
+
+MEMBER_TRIGGERS = ("member", "members", "user", "users", "person")
+MEMBER_EXCLUDE = STOP_WORDS.union(MEMBER_TRIGGERS)
+
+
+def _resolve_team_members(tokens, positions):
+    """Capture "member Alice" and lists such as "members alice, bob and carol" """
+    starts = sorted(index for trigger in MEMBER_TRIGGERS for index in positions.get(trigger, ()))
+    exclude = MEMBER_EXCLUDE
+    for start in starts:
+        token = word_after(tokens, start, exclude)
+        if token is None:
+            continue
+        members = [token.text.capitalize()]
+        index = start + 1
+        while index + 1 < len(tokens):
+            following = tokens[index + 1]
+            if following.lower == "and" and index + 2 < len(tokens):
+                index += 1
+                following = tokens[index + 1]
+            elif "," not in following.gap:
+                break
+            if following.kind != "word" or following.lower in exclude:
+                break
+            members.append(following.text.capitalize())
+            index += 1
+        return members
+    return []
+
+
+def _resolve_status(tokens, positions):
+    for index in positions.get("status", ()):
+        token = word_after(tokens, index, STATUS_EXCLUDE)
+        if token is not None and token.lower == "to":
+            # "set status to done"
+            token = word_after(tokens, index + 1)
+        if token is not None:
+            return token.text.capitalize()
+    # "change to done status"
+    for index in positions.get("to", ()):
+        token = word_after(tokens, index, ())
+        if token is not None and index + 2 < len(tokens):
+            after = tokens[index + 2]
+            if after.lower == "status" and after.follows_space:
+                return token.text.capitalize()
+    return None
+
+
+DEFAULT_SLOTS = (
+    Slot("role", ("role",), _resolve_role),
+    Slot("team_name", ("team", "name", "to"), _resolve_team_name),
+    Slot("project_repo", (URL,), _resolve_project_repo),
+    Slot("team_members", MEMBER_TRIGGERS, _resolve_team_members),
+    Slot("status", ("status", "to"), _resolve_status),
+)
+
+
+class ArgExtractor:
+    """Extracts every slot from one tokenizer pass over the input.
+
+    New slots are added with register(); they reuse the same pass because the
+    tokenizer only records where trigger words occur.
+    """
+
+    def __init__(self, slots=DEFAULT_SLOTS):
+        self.slots = []
+        self.triggers = frozenset()
+        for slot in slots:
+            self.register(slot)
+
+    def register(self, slot):
+        self.slots = [existing for existing in self.slots if existing.name != slot.name] + [slot]
+        self.triggers = self.triggers | slot.triggers
+
+    def tokenize(self, text):
+        """Return (tokens, positions of trigger words) from a single pass"""
+        tokens = []
+        positions = {}
+        triggers = self.triggers
+        for gap, url, word in TOKEN_PATTERN.findall(text):
+            token = Token(url, "url", gap) if url else Token(word, "word", gap)
+            key = URL if url else token.lower
+            if key in triggers:
+                positions.setdefault(key, []).append(len(tokens))
+            tokens.append(token)
+        return tokens, positions
+
+    def extract(self, text):
+        tokens, positions = self.tokenize(text)
+        args = CommandArgs()
+        for slot in self.slots:
+            value = slot.resolve(tokens, positions)
+            if value is not None:
+                args.set(slot.name, value)
+        return args
@@ -0,0 +1,336 @@
+"""Microbenchmarks for intent matching and argument extraction.
+
+    python bench.py                       # stubbed transformer, no network needed
+    python bench.py --output before.json
+    python bench.py --compare before.json
+    python bench.py --real-model          # load the real DistilBERT pipeline
+    python bench.py --cascade-check       # how often the cascade's string matcher answers, and how accurately
+
+--cascade-check uses the stub model unless --real-model is given too. The stub
+only stands in for the transformer's latency and rough scores, so a stub run
+says nothing about whether the string matcher agrees with the real model; that
+parity has not been verified.
+"""
+import argparse
+import builtins
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import zlib
+
+NAMES = ["alice", "bob", "carol", "dave", "eve", "frank", "grace", "heidi", "ivan", "judy", "mallory", "oscar"]
+ROLES = ["frontend", "backend", "design", "devops", "ml", "mobile", "qa", "infra", "docs", "security"]
+TEAMS = ["alpha", "beta", "gamma", "delta", "echo", "phoenix", "orion", "nova"]
+STATUSES = ["started", "blocked", "done", "review", "testing", "deployed"]
+FILLER = ["please", "quickly", "now", "for", "the", "hackathon", "thanks", "asap", "today", "again"]
+
+TEMPLATES = [
+    "add team {team} for role {role}",
+    "create team {team} for role {role} with repo {repo}",
+    "add member {name} to role {role}",
+    "add members {names} to role {role}",
+    "include user {name} in team {team}",
+    "remove member {name} from role {role}",
+    "kick member {name} from role {role}",
+    "delete team for role {role}",
+    "update team name {team} for role {role}",
+    "rename team to {team} role {role}",
+    "update repo for role {role} to {repo}",
+    "set repo {repo} for role {role}",
+    "update role {role}",
+    "show info for role {role}",
+    "view info role {role}",
+    "set status {status} for role {role}",
+    "update status to {status} for role {role}",
+    "link github repo {repo} for project {role} with users {names}",
+    "what is the status of team {team}",
+]
+
+# Appended to a command phrase to make a labeled utterance for finalmodel's command_mapping
+LABELED_TAILS = [
+    "",
+    " {role}",
+    " for role {role}",
+    " for {role} github.com/{team}/{role}-app",
+    " to {status} for team {role}",
+]
+
+
+def add_typo(text, rng):
+    """Swap, drop or double one character of a random word"""
+    words = text.split()
+    index = rng.randrange(len(words))
+    word = words[index]
+    if len(word) > 3 and not word.startswith(("http", "github")):
+        pos = rng.randrange(1, len(word) - 1)
+        kind = rng.choice(("swap", "drop", "double"))
+        if kind == "swap":
+            word = word[:pos - 1] + word[pos] + word[pos - 1] + word[pos + 1:]
+        elif kind == "drop":
+            word = word[:pos] + word[pos + 1:]
+        else:
+            word = word[:pos] + word[pos] + word[pos:]
+        words[index] = word
+    return " ".join(words)
+
+
+def make_corpus(size=500, seed=0):
+    """Synthetic but realistic utterances: varied lengths, typos, GitHub URLs and member lists"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        names = rng.sample(NAMES, rng.randint(2, 5))
+        text = rng.choice(TEMPLATES).format(
+            team=rng.choice(TEAMS).capitalize(),
+            role=rng.choice(ROLES),
+            name=rng.choice(NAMES).capitalize(),
+            names=", ".join(names[:-1]) + " and " + names[-1],
+            status=rng.choice(STATUSES),
+            repo=rng.choice(("https://", "")) + f"github.com/{rng.choice(TEAMS)}/{rng.choice(ROLES)}-app",
+        )
+        corpus.append(add_noise(text, rng))
+    return corpus
+
+
+def add_noise(text, rng):
+    """Sometimes add a typo, trailing filler words or a different case"""
+    if rng.random() < 0.3:
+        text = add_typo(text, rng)
+    if rng.random() < 0.3:
+        text = " ".join([text] + rng.sample(FILLER, rng.randint(1, 6)))
+    if rng.random() < 0.2:
+        text = text.upper() if rng.random() < 0.5 else text.capitalize()
+    return text
+
+
+def make_labeled_corpus(command_mapping, size=1000, seed=0):
+    """(utterance, command) pairs: a phrase of the command plus arguments, with make_corpus's noise"""
+    rng = random.Random(seed)
+    commands = sorted(command_mapping)
+    corpus = []
+    for _ in range(size):
+        command = rng.choice(commands)
+        text = rng.choice(command_mapping[command]["commands"]) + rng.choice(LABELED_TAILS).format(
+            role=rng.choice(ROLES),
+            team=rng.choice(TEAMS),
+            status=rng.choice(STATUSES),
+        )
+        corpus.append((add_noise(text, rng), command))
+    return corpus
+
+
+def check_cascade(cascade, corpus):
+    """Resolve each labeled utterance and count how often each tier answers, and answers correctly"""
+    counts = {"cheap": 0, "cheap_correct": 0, "neural": 0, "neural_correct": 0}
+    for text, command in corpus:
+        result, tier = cascade.resolve(text)
+        counts[tier] += 1
+        if result is not None and result["command"] == command:
+            counts[f"{tier}_correct"] += 1
+    return {
+        "utterances": len(corpus),
+        **counts,
+        "acceptance_rate": counts["cheap"] / len(corpus) if corpus else 0.0,
+        "cheap_accuracy": counts["cheap_correct"] / counts["cheap"] if counts["cheap"] else 1.0,
+        "neural_accuracy": counts["neural_correct"] / counts["neural"] if counts["neural"] else 1.0,
+        **{key: value for key, value in cascade.stats().items() if key.startswith("mean_") or key == "saved_seconds"},
+    }
+
+
+class StubPipeline:
+    """Stands in for the transformer: deterministic scores, no model, no network"""
+
+    def __call__(self, texts, batch_size=None, truncation=True, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        return [{"label": "POSITIVE", "score": (zlib.crc32(text.encode("utf-8")) % 1000) / 1000.0} for text in texts]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_benchmark(name, func, corpus, iterations):
+    for text in corpus[:50]:
+        func(text)  # warm up
+
+    timings = []
+    clock = time.perf_counter_ns
+    for _ in range(iterations):
+        for text in corpus:
+            start = clock()
+            func(text)
+            timings.append(clock() - start)
+    timings.sort()
+    total_seconds = sum(timings) / 1e9
+
+    # Allocation pass, kept separate because tracemalloc slows every call down
+    tracemalloc.start()
+    peak_total = 0
+    blocks_before = sys.getallocatedblocks()
+    for text in corpus:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        func(text)
+        peak_total += tracemalloc.get_traced_memory()[1] - baseline
+    retained_blocks = sys.getallocatedblocks() - blocks_before
+    tracemalloc.stop()
+
+    return {
+        "name": name,
+        "calls": len(timings),
+        "ops_per_sec": len(timings) / total_seconds if total_seconds else float("inf"),
+        "mean_us": total_seconds / len(timings) * 1e6,
+        "p50_us": percentile(timings, 0.50) / 1000,
+        "p99_us": percentile(timings, 0.99) / 1000,
+        "peak_alloc_bytes_per_call": peak_total / len(corpus),
+        "retained_blocks_per_call": retained_blocks / len(corpus),
+    }
+
+
+def load_targets(real_model=False):
+    """Return [(name, callable)] for every implementation that can be imported here"""
+    targets = []
+    os.environ.setdefault("NEOBOT_LOG_LEVEL", "WARNING")
+    try:
+        import bot
+    except ImportError as e:
+        print(f"Skipping bot.py benchmarks: {e}", file=sys.stderr)
+    else:
+        targets += [
+            ("bot.score_command", bot.score_command),
+            ("bot.get_best_command (cached)", bot.get_best_command),
+            ("bot.extract_command_args", bot.extract_command_args),
+        ]
+
+    os.environ["NEOBOT_WARMUP"] = "0"
+    import finalmodel
+    if not real_model:
+        finalmodel.intent_recognition_pipeline = StubPipeline()
+    targets += [
+        ("finalmodel.score_command", finalmodel.score_command),
+        ("finalmodel.resolve_command (cascade)", finalmodel.resolve_command),
+        ("finalmodel.get_best_command (cached)", finalmodel.get_best_command),
+        # finalmodel prompts for a missing role on stdin; answer it without blocking
+        ("finalmodel.extract_command_args", lambda text: finalmodel.extract_command_args(text, "addroledata")),
+    ]
+    return targets
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    previous = {row["name"]: row for row in (baseline or {}).get("results", [])}
+    print(f"{'benchmark':<38} {'ops/sec':>11} {'p50 us':>9} {'p99 us':>9} {'peak B/call':>12} {'blocks/call':>11}")
+    for row in results:
+        line = (f"{row['name']:<38} {row['ops_per_sec']:>11.0f} {row['p50_us']:>9.1f} {row['p99_us']:>9.1f} "
+                f"{row['peak_alloc_bytes_per_call']:>12.0f} {row['retained_blocks_per_call']:>11.2f}")
+        old = previous.get(row["name"])
+        if old:
+            change = (row["ops_per_sec"] / old["ops_per_sec"] - 1) * 100
+            line += f"  {change:+.1f}% ops/sec vs {baseline.get('revision') or 'baseline'}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark intent matching and argument extraction")
+    parser.add_argument("--corpus-size", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=5, help="passes over the corpus per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--real-model", action="store_true", help="use the real transformer instead of the stub")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier run to compare against")
+    parser.add_argument("--cascade-check", action="store_true",
+                        help="instead of timing, resolve a labeled corpus through finalmodel's cascade; "
+                             "fails if the string matcher accepts a wrong command (stub model unless --real-model)")
+    args = parser.parse_args(argv)
+
+    if args.cascade_check:
+        return run_cascade_check(parser, args)
+
+    corpus = make_corpus(args.corpus_size, args.seed)
+    original_input = builtins.input
+    builtins.input = lambda prompt="": "bench"
+    try:
+        results = [run_benchmark(name, func, corpus, args.iterations)
+                   for name, func in load_targets(args.real_model) if args.filter in name]
+    finally:
+        builtins.input = original_input
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus_size": args.corpus_size,
+        "iterations": args.iterations,
+        "seed": args.seed,
+        "real_model": args.real_model,
+        "results": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+    print_results(results, baseline)
+    if "finalmodel" in sys.modules:
+        cascade = sys.modules["finalmodel"].intent_cascade.stats()
+        print(f"cascade: {cascade['escalation_rate']:.1%} escalated, {cascade['cheap_seconds']:.2f}s in the string "
+              f"matcher, {cascade['neural_seconds']:.2f}s in the {'model' if args.real_model else 'stub model'}"
+              + (f", estimated saving {cascade['saved_seconds']:.2f}s" if cascade["saved_seconds"] is not None else ""))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+    return report
+
+
+def run_cascade_check(parser, args):
+    os.environ["NEOBOT_WARMUP"] = "0"
+    import finalmodel
+    from intent_engine import IntentCascade
+    if not args.real_model:
+        finalmodel.intent_recognition_pipeline = StubPipeline()
+    # A cascade of its own, so the counts cover exactly this corpus
+    cascade = IntentCascade(finalmodel.cheap_matcher, neural=finalmodel.score_command,
+                            margin=finalmodel.CASCADE_MARGIN, accept=finalmodel.match_result)
+    check = check_cascade(cascade, make_labeled_corpus(finalmodel.command_mapping, args.corpus_size, args.seed))
+    model = "model" if args.real_model else "stub model"
+    print(f"string matcher: {check['cheap']}/{check['utterances']} accepted ({check['acceptance_rate']:.1%}), "
+          f"{check['cheap_correct']} correct ({check['cheap_accuracy']:.1%}), {check['mean_cheap_ms']:.2f} ms each")
+    print(f"{model}: {check['neural']} escalated, {check['neural_correct']} correct ({check['neural_accuracy']:.1%}), "
+          f"{check['mean_neural_ms']:.1f} ms each")
+    if check["saved_seconds"] is not None:
+        print(f"estimated saving: {check['saved_seconds']:.2f}s ({check['cheap']} accepted at the {model}'s mean "
+              f"latency, less the string matcher's time)")
+    if not args.real_model:
+        print("stub model only: agreement with the real model is not checked; rerun with --real-model")
+    report = {
+        "revision": git_revision(),
+        "corpus_size": args.corpus_size,
+        "seed": args.seed,
+        "real_model": args.real_model,
+        "margin": finalmodel.CASCADE_MARGIN,
+        "cascade_check": check,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+    if check["cheap_correct"] < check["cheap"]:
+        parser.exit(1, f"{check['cheap'] - check['cheap_correct']} utterances accepted with the wrong command\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
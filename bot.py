@@ -1,51 +1,133 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
 import asyncio
+import inspect
 from pymongo import MongoClient
-import re
 from difflib import SequenceMatcher
 import os
 from dotenv import load_dotenv
-import traceback
 import sys
+import logging
+import time
+from pymongo.errors import DuplicateKeyError
+from role_repository import RoleRepository
+from role_cache import RoleCache, start_change_listener
+from role_index import RoleIndex
+from intent_cache import IntentCache
+from intent_engine import IntentCascade, IntentMatcher
+from arg_extractor import ArgExtractor, STOP_WORDS
+from logging_config import configure_logging, set_level, Sampler
+import metrics
+from conversations import ConversationManager, ConversationCancelled, ConversationLimitError
+from pymongo.errors import BulkWriteError
+import team_batch
+from admission import AdmissionController, RateLimited, Overloaded
+from intent_executor import IntentExecutor
+import outbound
+import role_io
+import io
+import tempfile
+from discord_commands import DISCORD_COMMANDS
 
 # Load environment variables
 load_dotenv(dotenv_path='C:/Users/Hrida/OneDrive/Documents/Desktop/Avni_College/foss_p/Model/data.env')
 
-# Define debug_print at the top
-def debug_print(message):
-    """Print debug messages if DEBUG is True"""
-    global DEBUG
-    if DEBUG:
-        print(f"[DEBUG] {message}")
+# Structured JSON logging from a background thread; levels via NEOBOT_LOG_LEVEL / NEOBOT_LOG_LEVELS
+configure_logging()
+logger = logging.getLogger("bot")
+# Every incoming message is a hot-path event, so only one in NEOBOT_LOG_SAMPLE is logged
+message_log_sampler = Sampler(int(os.getenv("NEOBOT_LOG_SAMPLE", "20")))
 
 # Set up intents and bot
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.guilds = True
-bot = commands.Bot(
-    command_prefix="!",
-    intents=intents,
-    description="A simple team management bot with NLP",
-    help_command=None
-)
 
-# Debug flag and MongoDB setup
-DEBUG = True
-try:
-    mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
-    debug_print(f"Attempting MongoDB connection with URI: {mongo_uri}")
-    mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-    mongo_client.server_info()
-    db = mongo_client["discordbot"]
-    roles_collection = db["roles"]
-    debug_print("Connected to MongoDB successfully")
-except Exception as e:
-    print(f"Failed to connect to MongoDB: {e}")
-    traceback.print_exc()
-    print("Continuing without database functionality...")
-    roles_collection = None
+def parse_shard_ids(spec):
+    """Parse a shard range like "0-3,8" into [0, 1, 2, 3, 8]; empty means None"""
+    shard_ids = []
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        first, _, last = part.partition("-")
+        shard_ids.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(shard_ids)) or None
+
+# Sharding: NEOBOT_SHARD_COUNT is the total across every process and NEOBOT_SHARD_IDS the range this
+# process runs (e.g. "0-3"). NEOBOT_AUTOSHARD=1 alone lets Discord pick the count for a single process.
+shard_count = int(os.getenv("NEOBOT_SHARD_COUNT", "0")) or None
+shard_ids = parse_shard_ids(os.getenv("NEOBOT_SHARD_IDS", ""))
+if shard_ids and (shard_count is None or shard_ids[-1] >= shard_count):
+    raise ValueError("NEOBOT_SHARD_IDS needs NEOBOT_SHARD_COUNT greater than every id in the range")
+if shard_count or os.getenv("NEOBOT_AUTOSHARD", "0") == "1":
+    bot = commands.AutoShardedBot(
+        command_prefix="!",
+        intents=intents,
+        description="A simple team management bot with NLP",
+        help_command=None,
+        shard_count=shard_count,
+        shard_ids=shard_ids,
+    )
+else:
+    bot = commands.Bot(
+        command_prefix="!",
+        intents=intents,
+        description="A simple team management bot with NLP",
+        help_command=None
+    )
+
+# MongoDB setup happens in setup_database() at startup, so importing this module stays side-effect free.
+# All handler database access goes through the repository so pymongo never blocks the event loop
+roles_collection = None
+roles_repo = None
+role_cache = RoleCache(maxsize=int(os.getenv("ROLE_CACHE_SIZE", "1024")),
+                       ttl=float(os.getenv("ROLE_CACHE_TTL", "300")))
+# Every role name per guild, so slash-command autocomplete never waits on MongoDB
+role_index = RoleIndex()
+
+def setup_database(collection=None):
+    """Connect to MongoDB (or use the given collection) and build the role repository"""
+    global roles_collection, roles_repo
+    if collection is None:
+        try:
+            mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+            logger.debug("Attempting MongoDB connection with URI: %s", mongo_uri)
+            mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+            mongo_client.server_info()
+            collection = mongo_client["discordbot"]["roles"]
+            logger.info("Connected to MongoDB successfully")
+        except Exception as e:
+            logger.exception("Failed to connect to MongoDB: %s", e)
+            logger.warning("Continuing without database functionality...")
+            return None
+    roles_collection = collection
+    roles_repo = RoleRepository(roles_collection, max_workers=int(os.getenv("MONGO_EXECUTOR_WORKERS", "4")),
+                                cache=role_cache, index=role_index,
+                                observer=lambda operation, seconds: metrics.observe_stage("mongo", seconds))
+    # Optional: pick up edits from other bot instances (needs a replica set)
+    if os.getenv("ROLE_CACHE_WATCH", "0") == "1":
+        start_change_listener(roles_collection, role_cache, role_index)
+    try:
+        # Documents from before guild scoping have no guild_id; NEOBOT_LEGACY_GUILD_ID adopts them into one guild
+        legacy_guild_id = os.getenv("NEOBOT_LEGACY_GUILD_ID")
+        if legacy_guild_id:
+            migrated = roles_repo.migrate_legacy_documents(int(legacy_guild_id))
+            logger.info("Assigned %d legacy role documents to guild %s", migrated, legacy_guild_id)
+        else:
+            legacy_count = roles_repo.count_legacy_documents()
+            if legacy_count:
+                logger.warning("%d role documents have no guild_id and are not visible to any guild; "
+                               "set NEOBOT_LEGACY_GUILD_ID or run `python role_io.py migrate`", legacy_count)
+        roles_repo.ensure_indexes()
+    except Exception as e:
+        logger.error("Failed to migrate or index the roles collection: %s", e)
+    try:
+        start = time.perf_counter()
+        loaded = role_index.load(roles_collection)
+        logger.info("Loaded %d role names for autocomplete in %.2fs", loaded, time.perf_counter() - start)
+    except Exception as e:
+        logger.error("Failed to load role names for autocomplete: %s", e)
+    return roles_repo
 
 # NLP setup - Simplified to avoid issues
 nlp_enabled = False
@@ -82,149 +164,172 @@ command_mapping = {
                 },
 }
 
+# Compiled once; scoring semantics match the original keyword + SequenceMatcher loop
+intent_matcher = IntentMatcher(command_mapping, context_score=0.5, threshold=0.1)
+# Private copy for scoring on the event loop when the executor is saturated, so it never waits on intent_matcher's lock
+fallback_matcher = IntentMatcher(command_mapping, context_score=0.5, threshold=0.1)
+
+# Follow-up replies are routed by (channel, author) instead of one wait_for listener per prompt
+conversations = ConversationManager(max_open=int(os.getenv("MAX_OPEN_CONVERSATIONS", "1000")))
+
+# !cmd admission: per-user and per-channel token buckets, then a bounded pool of running commands
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("CMD_MAX_CONCURRENT", "8")),
+    max_queue=int(os.getenv("CMD_MAX_QUEUE", "50")),
+    queue_timeout=float(os.getenv("CMD_QUEUE_TIMEOUT", "10")),
+    user_rate=float(os.getenv("CMD_USER_RATE", "0.5")),
+    user_burst=int(os.getenv("CMD_USER_BURST", "5")),
+    channel_rate=float(os.getenv("CMD_CHANNEL_RATE", "2")),
+    channel_burst=int(os.getenv("CMD_CHANNEL_BURST", "20")),
+    observer=lambda seconds: metrics.observe_stage("queue", seconds),
+)
+
+# Every argument slot is pulled out of a single tokenizer pass
+arg_extractor = ArgExtractor()
+
+# Repeat phrasings skip scoring; set INTENT_CACHE_PATH to keep the cache across restarts
+intent_cache = IntentCache(command_mapping, maxsize=int(os.getenv("INTENT_CACHE_SIZE", "512")),
+                           path=os.getenv("INTENT_CACHE_PATH"))
+
+def _cache_counters():
+    values = {}
+    for cache_name, cache in (("role", role_cache), ("intent", intent_cache)):
+        stats = cache.stats()
+        values[(cache_name, "hit")] = stats["hits"]
+        values[(cache_name, "miss")] = stats["misses"]
+    return values
+
+metrics.REGISTRY.callback_counter("neobot_cache_lookups_total", "Cache lookups since start", ("cache", "result"),
+                                  _cache_counters)
+metrics.REGISTRY.gauge("neobot_open_conversations", "Prompts waiting for a reply", (),
+                       lambda: {(): len(conversations.pending)})
+metrics.REGISTRY.gauge("neobot_intent_tier", "Utterances resolved by each cascade tier", ("tier",),
+                       lambda: {("cheap",): intent_cascade.accepted, ("neural",): intent_cascade.escalated})
+metrics.REGISTRY.gauge("neobot_intent_fallbacks", "Utterances scored by the fallback matcher", ("reason",),
+                       lambda: {(reason,): count for reason, count in intent_executor.fallbacks.items()})
+metrics.REGISTRY.gauge("neobot_outbound_queued", "Messages waiting in the outbound queue", ("priority",),
+                       lambda: {(priority,): count for priority, count in outbound_queue.depth().items()})
+metrics.REGISTRY.callback_counter("neobot_outbound_messages_total", "Outbound messages since start", ("state",),
+                                  lambda: {("enqueued",): outbound_queue.enqueued,
+                                           ("delivered",): outbound_queue.delivered,
+                                           ("payloads",): outbound_queue.payloads,
+                                           ("dropped",): outbound_queue.dropped})
+metrics.REGISTRY.gauge("neobot_admission_commands", "!cmd commands running or queued for a slot", ("state",),
+                       lambda: {("running",): admission.running, ("queued",): admission.queued})
+
 def calculate_string_similarity(str1, str2):
-    similarity = SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
-    debug_print(f"String similarity between '{str1}' and '{str2}': {similarity}")
-    return similarity
+    return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
 
 def calculate_semantic_similarity(text1, text2):
     # Fallback to string similarity for simplicity and reliability
     return calculate_string_similarity(text1, text2)
 
+def match_result(match):
+    logger.debug("Command: %s, Keyword score: %s, Context score: %s, Best command similarity: %s ('%s'), Final score: %s",
+                 match.command, match.keyword_score, match.context_score, match.command_score, match.phrase, match.score)
+    return {"command": match.command, "score": match.score}
+
+def neural_score_command(user_input):
+    # finalmodel's transformer scorer over this bot's intents; the model loads on first escalation
+    import finalmodel
+    return finalmodel.score_command(user_input, mapping=command_mapping)
+
+# The fuzzy matcher settles clear-cut utterances; with NEOBOT_NEURAL_TIER=1 close calls go to the transformer
+intent_cascade = IntentCascade(intent_matcher,
+                               neural=neural_score_command if os.getenv("NEOBOT_NEURAL_TIER", "0") == "1" else None,
+                               accept=match_result, margin=float(os.getenv("NEOBOT_CASCADE_MARGIN", "0.05")))
+
+def score_command(user_input):
+    """Score user_input against every command, bypassing the intent cache"""
+    best, tier = intent_cascade.resolve(user_input)
+    if tier == "neural":
+        logger.debug("Escalated '%s' to the neural tier: %s", user_input, best)
+    return {"command": best["command"], "score": best["score"]} if best else None
+
+def fallback_score_command(user_input):
+    match = fallback_matcher.match(user_input)
+    return match_result(match) if match else None
+
+# Intent scoring runs off the event loop: NEOBOT_INTENT_EXECUTOR is "thread", "process" or "inline"
+intent_executor = IntentExecutor(score_command, fallback=fallback_score_command,
+                                 kind=os.getenv("NEOBOT_INTENT_EXECUTOR", "thread"),
+                                 max_workers=int(os.getenv("NEOBOT_INTENT_WORKERS", "1")),
+                                 timeout=float(os.getenv("NEOBOT_INTENT_TIMEOUT", "2.0")))
+
+async def get_best_command_async(user_input):
+    """get_best_command with scoring on the intent executor; fallback answers are not cached"""
+    cached, best = intent_cache.get(user_input)
+    if cached:
+        logger.debug("Intent cache hit: %s", best)
+        return dict(best) if best else None
+    best, degraded = await intent_executor.run(user_input)
+    if degraded:
+        logger.debug("Intent executor busy, scored '%s' on the event loop", user_input)
+    else:
+        intent_cache.put(user_input, dict(best) if best else None)
+    return best
+
 def get_best_command(user_input):
-    debug_print(f"Finding best command match for: '{user_input}'")
-    command_scores = []
-    user_words = set(user_input.lower().split())  # Splitting input into words
-    debug_print(f"User words: {user_words}")
-
-    for command_key, command_data in command_mapping.items():
-        keywords = set(command_data["keywords"])  # Keywords to match
-        keyword_matches = len(keywords.intersection(user_words))  # Count keyword matches
-        keyword_score = keyword_matches / len(keywords) if keywords else 0  # Score based on keywords
-        debug_print(f"Command: {command_key}, Keyword matches: {keyword_matches}, Keyword score: {keyword_score}")
-        
-        # Check for command similarities based on string similarity calculation
-        command_similarities = [calculate_string_similarity(user_input, cmd) for cmd in command_data["commands"]]
-        context_score = 0.5  # You can tweak this value as needed
-        
-        # Get the best similarity score
-        command_score = max(command_similarities) if command_similarities else 0
-        debug_print(f"Command: {command_key}, Context score: {context_score}, Best command similarity: {command_score}")
-        
-        # Calculate the final score combining keyword match, command similarity, and context score
-        final_score = (0.4 * keyword_score) + (0.3 * context_score) + (0.3 * command_score)
-        command_scores.append({"command": command_key, "score": final_score})
-        debug_print(f"Command: {command_key}, Final score: {final_score}")
-    
-    # Sort commands by score and return the best match
-    command_scores.sort(key=lambda x: x["score"], reverse=True)
-    best = command_scores[0] if command_scores and command_scores[0]["score"] > 0.1 else None
-    debug_print(f"Best command: {best}")
+    logger.debug("Finding best command match for: '%s'", user_input)
+    cached, best = intent_cache.get(user_input)
+    if cached:
+        logger.debug("Intent cache hit: %s", best)
+        return dict(best) if best else None
+    best = score_command(user_input)
+    logger.debug("Best command: %s", best)
+    intent_cache.put(user_input, dict(best) if best else None)
     return best
 
 def extract_command_args(user_input):
-    debug_print(f"Extracting arguments from: '{user_input}'")
-    args = {}
-    STOP_WORDS = {"add", "team", "new", "create", "to", "for", "the", "with", "and", "update", "role", "repo", "repository", "status", "show", "info"}
-    user_input_lower = user_input.lower()
-
-    # Enhanced role pattern matching
-    role_patterns = [
-        r"\brole\s+(\w+)", 
-        r"\bfor\s+role\s+(\w+)",
-        r"\bfrom\s+role\s+(\w+)",
-        r"\bto\s+role\s+(\w+)"
-    ]
-    for pattern in role_patterns:
-        role_match = re.search(pattern, user_input, re.IGNORECASE)
-        if role_match and role_match.group(1).lower() not in STOP_WORDS:
-            args["role"] = role_match.group(1).lower()
-            debug_print(f"Found role: {args['role']}")
-            break
-    else:
-        args["role"] = None
-
-    # Enhanced team name pattern matching
-    team_patterns = [
-        r"\bteam\s+(\w+)", 
-        r"\bname\s+(\w+)",
-        r"\bteam\s+name\s+(\w+)",
-        r"\bto\s+(\w+)"
-    ]
-    for pattern in team_patterns:
-        team_match = re.search(pattern, user_input, re.IGNORECASE)
-        if team_match and team_match.group(1).lower() not in STOP_WORDS:
-            args["team_name"] = team_match.group(1).capitalize()
-            debug_print(f"Found team name: {args['team_name']}")
-            break
-    else:
-        args["team_name"] = None
-
-    # Enhanced repo pattern matching
-    repo_patterns = [
-        r"(https?://github\.com/[^\s]+)",
-        r"(github\.com/[^\s]+)"
-    ]
-    for pattern in repo_patterns:
-        repo_match = re.search(pattern, user_input, re.IGNORECASE)
-        if repo_match:
-            repo_url = repo_match.group(1)
-            if not repo_url.startswith("http"):
-                repo_url = "https://" + repo_url
-            args["project_repo"] = repo_url
-            debug_print(f"Found project repo: {args['project_repo']}")
-            break
-    else:
-        args["project_repo"] = None
-
-    # Enhanced member pattern matching
-    member_patterns = [
-        r"\bmember\s+(\w+)", 
-        r"\buser\s+(\w+)",
-        r"\bperson\s+(\w+)"
-    ]
-    args["team_members"] = []
-    for pattern in member_patterns:
-        members_match = re.search(pattern, user_input, re.IGNORECASE)
-        if members_match:
-            args["team_members"] = [members_match.group(1).capitalize()]
-            debug_print(f"Found team member: {args['team_members']}")
-            break
-
-    # Enhanced status pattern matching
-    status_patterns = [
-        r"\bstatus\s+(\w+)",
-        r"\bto\s+(\w+)\s+status"
-    ]
-    for pattern in status_patterns:
-        status_match = re.search(pattern, user_input_lower)
-        if status_match:
-            args["status"] = status_match.group(1).capitalize()
-            debug_print(f"Found status: {args['status']}")
-            break
-    else:
-        args["status"] = None
-
-    debug_print(f"Extracted arguments: {args}")
+    args = arg_extractor.extract(user_input)
+    logger.debug("Extracted arguments from '%s': %s", user_input, args)
     return args
 
+# Replies go through a per-channel queue that stays under Discord's rate limits and merges bursts
+outbound_queue = outbound.OutboundQueue(
+    channel_rate=float(os.getenv("OUTBOUND_CHANNEL_RATE", "1")),
+    channel_burst=int(os.getenv("OUTBOUND_CHANNEL_BURST", "5")),
+    global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "50")),
+    coalesce_window=float(os.getenv("OUTBOUND_COALESCE_WINDOW", "0.025")),
+    observer=lambda priority, seconds: metrics.OUTBOUND_WAIT_SECONDS.observe(seconds, priority),
+)
+
+async def reply(ctx, content, priority=outbound.NORMAL, **kwargs):
+    """Queue a message for the invoking channel and wait until it is sent, timed as the "send" stage.
+
+    Returns the sent message, or None if the channel's queue was full and the message was dropped.
+    """
+    # A throttled channel can hold a message for seconds; that wait shouldn't hold an admission slot
+    with metrics.stage("send"):
+        async with admission.suspended():
+            try:
+                return await outbound_queue.send(ctx, content, priority=priority, **kwargs)
+            except outbound.OutboundFull as e:
+                # Raising would only make the handler's error path reply into the same full channel; the drop is
+                # counted in neobot_outbound_messages_total{state="dropped"}
+                logger.warning("Dropped a reply to %s: %s", ctx.author, e)
+                return None
+
 # Enhanced ask_user function with validation
 async def ask_user(ctx, question, validation_func=None, error_message=None):
     try:
-        debug_print(f"Asking user: '{question}'")
-        await ctx.send(question)
+        logger.debug("Asking user: '%s'", question)
+        if await reply(ctx, question, priority=outbound.PROMPT) is None:
+            # Nobody saw the question, so there is no answer to wait for
+            metrics.set_outcome(metrics.BUSY)
+            return None
         
         attempts = 0
         max_attempts = 3
         
         while attempts < max_attempts:
-            def check(m):
-                return m.author == ctx.author and m.channel == ctx.channel
-            
             try:
-                msg = await bot.wait_for("message", check=check, timeout=30.0)
+                # Waiting on a human shouldn't hold one of the admission slots
+                with metrics.stage("prompt"):
+                    async with admission.suspended():
+                        msg = await conversations.wait_for_reply(ctx.channel.id, ctx.author.id, timeout=30.0)
                 response = msg.content.strip()
-                debug_print(f"User responded: '{response}'")
+                logger.debug("User responded: '%s'", response)
                 
                 # If validation function is provided, check the response
                 if validation_func is None or validation_func(response):
@@ -232,82 +337,159 @@ async def ask_user(ctx, question, validation_func=None, error_message=None):
                 else:
                     attempts += 1
                     if attempts < max_attempts:
-                        await ctx.send(error_message or "❌ Invalid input. Please try again.")
+                        await reply(ctx, error_message or "❌ Invalid input. Please try again.")
                     else:
-                        await ctx.send("❌ Too many invalid attempts. Command cancelled.")
+                        metrics.set_outcome(metrics.VALIDATION_FAILURE)
+                        await reply(ctx, "❌ Too many invalid attempts. Command cancelled.")
                         return None
             except asyncio.TimeoutError:
-                debug_print("User response timed out")
-                await ctx.send("⏰ Timeout! Please try again.")
+                logger.debug("User response timed out")
+                metrics.set_outcome(metrics.TIMEOUT)
+                await reply(ctx, "⏰ Timeout! Please try again.")
+                return None
+            except ConversationCancelled:
+                logger.debug("Prompt cancelled for %s", ctx.author)
+                metrics.set_outcome(metrics.CANCELLED)
+                return None
+            except ConversationLimitError:
+                metrics.set_outcome(metrics.BUSY)
+                await reply(ctx, "⏳ I'm handling too many conversations right now. Please try again in a moment.")
                 return None
                 
     except Exception as e:
-        debug_print(f"Error in ask_user: {e}")
-        await ctx.send("❌ Error processing your input. Try again.")
+        logger.exception("Error in ask_user: %s", e)
+        metrics.set_outcome(metrics.ERROR)
+        await reply(ctx, "❌ Error processing your input. Try again.")
         return None
 
 # Validation functions for different input types
 def validate_role(input_str):
-    STOP_WORDS = {"add", "team", "new", "create", "to", "for", "the", "with", "and", "update", "role", "repo", "repository", "status", "show", "info"}
     return input_str and input_str.lower() not in STOP_WORDS
 
 def validate_team_name(input_str):
-    STOP_WORDS = {"add", "team", "new", "create", "to", "for", "the", "with", "and", "update", "role", "repo", "repository", "status", "show", "info"}
     return input_str and input_str.lower() not in STOP_WORDS
 
 def validate_repo_url(input_str):
     return input_str and (input_str.startswith("http") or input_str.startswith("github.com"))
 
 def validate_member_name(input_str):
-    STOP_WORDS = {"add", "team", "new", "create", "to", "for", "the", "with", "and", "update", "role", "repo", "repository", "status", "show", "info"}
     return input_str and input_str.lower() not in STOP_WORDS
 
 def validate_status(input_str):
     return input_str and len(input_str) > 1
 
+async def resolve_role(ctx, guild_id, role, confirm=False):
+    """Map a mistyped role onto an existing one with the in-memory index, asking when it is a close call.
+
+    Returns the role to use, or None if the user didn't pick one. With confirm, even a single near-miss is
+    asked about, for commands that can't be undone. Names the index has never heard of are returned as
+    typed, for the database to report missing.
+    """
+    match, candidates = role_index.resolve(guild_id, role)
+    if match is not None and (not confirm or match == role.lower()):
+        if match != role.lower():
+            logger.debug("Resolved role '%s' to '%s'", role, match)
+        return match
+    if match is not None:
+        candidates = [match] + candidates
+    if not candidates:
+        return role
+    options = ", ".join(f"**{candidate}**" for candidate in candidates)
+    answer = await ask_user(ctx, f"❓ No role **{role}** found. Did you mean {options}? Reply with the role name.",
+                            lambda text: text and text.lower() in candidates,
+                            f"❌ Please reply with one of: {options}.")
+    return answer.lower() if answer else None
+
+def format_team_info(role, role_data):
+    members = ", ".join(role_data.get("team_members", [])) or "None"
+    return (f"**Info for {role}**:\nName: {role_data.get('team_name', role)}\nRepo: {role_data.get('project_repo') or 'None'}\n"
+            f"Members: {members}\nStatus: {role_data.get('status', 'Not started')}")
+
 @bot.event
 async def on_ready():
-    debug_print(f"Bot is ready. Logged in as {bot.user}")
-    print(f"Bot is ready. Logged in as {bot.user}")
+    logger.info("Bot is ready. Logged in as %s", bot.user, extra={"data": {"guilds": len(bot.guilds)}})
+
+@bot.event
+async def on_shard_ready(shard_id):
+    logger.info("Shard %d is ready", shard_id)
 
 @bot.event
 async def on_message(message):
     if message.author == bot.user:
         return
-    debug_print(f"Received message: '{message.content}' from {message.author}")
+    if logger.isEnabledFor(logging.DEBUG) and message_log_sampler():
+        logger.debug("Received message: '%s' from %s", message.content, message.author)
+    # Replies to a pending prompt are delivered with one dict lookup; a command such as !cancel is never taken
+    # as the answer, so it reaches process_commands and runs
+    if not message.content.startswith(bot.command_prefix):
+        conversations.dispatch(message)
     await bot.process_commands(message)
 
 @bot.event
 async def on_command_error(ctx, error):
-    debug_print(f"Command error: {error}")
+    logger.debug("Command error: %s", error)
     if isinstance(error, commands.CommandNotFound):
-        await ctx.send("❓ Command not found. Use `!help` for options.")
+        await reply(ctx, "❓ Command not found. Use `!help` for options.")
     elif isinstance(error, commands.MissingRequiredArgument):
-        await ctx.send(f"❌ Missing argument: {error.param}")
+        await reply(ctx, f"❌ Missing argument: {error.param}")
+    elif isinstance(error, commands.NoPrivateMessage):
+        await reply(ctx, "🏠 Teams belong to a server, so run this command in a server channel.")
+    elif isinstance(error, commands.MissingPermissions):
+        await reply(ctx, "🔒 You need the Manage Server permission for that command.")
     else:
-        print(f"Error: {error}")
-        traceback.print_exc()
-        await ctx.send(f"❌ An error occurred: {str(error)[:100]}...")
+        logger.error("Error: %s", error, exc_info=error)
+        await reply(ctx, f"❌ An error occurred: {str(error)[:100]}...")
 
 @bot.command(name="cmd")
+# Teams are stored per guild, so the commands that read or write them have nothing to act on in a DM
+@commands.guild_only()
 async def handle_natural_command(ctx, *, message: str = None):
+    trace = metrics.begin_command()
     try:
-        debug_print(f"Command received: '{message}' from {ctx.author}")
+        async with admission.admit(ctx.author.id, ctx.channel.id):
+            await run_natural_command(ctx, message)
+    except RateLimited as e:
+        metrics.set_outcome(metrics.RATE_LIMITED)
+        logger.debug("Rate limited %s (%s): retry in %.1fs", ctx.author, e.scope, e.retry_after)
+        if e.notify:
+            who = "You're" if e.scope == "user" else "This channel is"
+            await reply(ctx, f"🐢 {who} sending commands too fast. Try again in {max(1, round(e.retry_after))}s.")
+    except Overloaded as e:
+        metrics.set_outcome(metrics.BUSY)
+        logger.warning("Shed !cmd from %s: %s", ctx.author, e)
+        await reply(ctx, "⏳ I'm busy right now. Please retry in a few seconds.")
+    finally:
+        metrics.finish_command(trace)
+
+async def run_natural_command(ctx, message):
+    try:
+        logger.debug("Command received: '%s' from %s", message, ctx.author)
+
+        parts = message.split(maxsplit=1) if message else []
+        if parts and parts[0].lower() == "batch":
+            metrics.set_intent("batch")
+            await run_batch(ctx, parts[1] if len(parts) > 1 else "")
+            return
 
         if not message or not message.strip():
-            await ctx.send("❓ Please provide a command. Use `!help` for options.")
+            metrics.set_outcome(metrics.VALIDATION_FAILURE)
+            await reply(ctx, "❓ Please provide a command. Use `!help` for options.")
             return
 
-        debug_print(f"Processing command: '{message}'")
         # Get command intent
-        best_match = get_best_command(message)
+        with metrics.stage("intent"):
+            best_match = await get_best_command_async(message)
+            if best_match:
+                metrics.set_intent(best_match["command"])
         if not best_match:
-            await ctx.send("🤔 I didn't understand your command. Try using one of the formats shown in `!help`. For example: `!cmd add team`")
+            metrics.set_outcome(metrics.UNRECOGNIZED)
+            await reply(ctx, "🤔 I didn't understand your command. Try using one of the formats shown in `!help`. For example: `!cmd add team`")
             return
 
         intent = best_match["command"]
-        args = extract_command_args(message)
-        debug_print(f"Identified intent: {intent} with args: {args}")
+        with metrics.stage("args"):
+            args = extract_command_args(message)
+        logger.debug("Identified intent: %s with args: %s", intent, args)
 
         # Extract arguments
         role = args.get("role")
@@ -317,9 +499,11 @@ async def handle_natural_command(ctx, *, message: str = None):
         status = args.get("status")
 
         # Check if MongoDB is available
-        if roles_collection is None:
-            await ctx.send("❌ Database connection is not available. Please check server logs.")
+        if roles_repo is None:
+            metrics.set_outcome(metrics.UNAVAILABLE)
+            await reply(ctx, "❌ Database connection is not available. Please check server logs.")
             return
+        guild_id = ctx.guild.id
 
         # Handle different commands
         if intent == "add_team":
@@ -350,16 +534,13 @@ async def handle_natural_command(ctx, *, message: str = None):
                 if not project_repo.startswith("http"):
                     project_repo = "https://" + project_repo
 
-            # Check if team already exists
-            existing_team = roles_collection.find_one({"role": role.lower()})
-            if existing_team:
-                await ctx.send(f"❌ Role **{role}** already exists.")
+            # Create new team; the unique role index reports duplicates
+            new_team = {"guild_id": guild_id, "role": role.lower(), "team_name": team_name, "project_repo": project_repo, "team_members": [], "status": "Not started"}
+            if not await roles_repo.create_team(new_team):
+                metrics.set_outcome(metrics.DUPLICATE)
+                await reply(ctx, f"❌ Role **{role}** already exists.")
                 return
-
-            # Create new team
-            new_team = {"role": role.lower(), "team_name": team_name, "project_repo": project_repo, "team_members": [], "status": "Not started"}
-            roles_collection.insert_one(new_team)
-            await ctx.send(f"✅ Team **{team_name}** created for role **{role}**!")
+            await reply(ctx, f"✅ Team **{team_name}** created for role **{role}**!")
 
         elif intent == "add_member":
             # Ask for missing information
@@ -370,6 +551,9 @@ async def handle_natural_command(ctx, *, message: str = None):
                                      "❌ Please provide a valid role name.")
                 if not role:
                     return
+            role = await resolve_role(ctx, guild_id, role)
+            if not role:
+                return
             if not team_members or len(team_members) == 0:
                 member = await ask_user(ctx, 
                                        "Who's the new member? (e.g., Alice)",
@@ -379,16 +563,12 @@ async def handle_natural_command(ctx, *, message: str = None):
                     return
                 team_members = [member.capitalize()]
 
-            # Check if role exists (case-insensitive)
-            role_exists = roles_collection.find_one({"role": role.lower()})
-            if not role_exists:
-                await ctx.send(f"❌ No role **{role}** found.")
-                return
-
-
             # Add member
-            roles_collection.update_one({"role": role.lower()}, {"$addToSet": {"team_members": {"$each": team_members}}})
-            await ctx.send(f"✅ Added **{team_members[0]}** to **{role}**!")
+            if not await roles_repo.update_role(guild_id, role, {"$addToSet": {"team_members": {"$each": team_members}}}):
+                metrics.set_outcome(metrics.NOT_FOUND)
+                await reply(ctx, f"❌ No role **{role}** found.")
+                return
+            await reply(ctx, f"✅ Added **{', '.join(team_members)}** to **{role}**!")
 
         elif intent == "remove_member":
             # Ask for missing information
@@ -399,6 +579,9 @@ async def handle_natural_command(ctx, *, message: str = None):
                                      "❌ Please provide a valid role name.")
                 if not role:
                     return
+            role = await resolve_role(ctx, guild_id, role)
+            if not role:
+                return
             if not team_members or len(team_members) == 0:
                 member = await ask_user(ctx, 
                                        "Who to remove? (e.g., Alice)",
@@ -408,15 +591,12 @@ async def handle_natural_command(ctx, *, message: str = None):
                     return
                 team_members = [member.capitalize()]
 
-            # Check if role exists
-            role_exists = roles_collection.find_one({"role": role.lower()})
-            if not role_exists:
-                await ctx.send(f"❌ No role **{role}** found.")
-                return
-
             # Remove member
-            roles_collection.update_one({"role": role.lower()}, {"$pullAll": {"team_members": team_members}})
-            await ctx.send(f"✅ Removed **{team_members[0]}** from **{role}**!")
+            if not await roles_repo.update_role(guild_id, role, {"$pullAll": {"team_members": team_members}}):
+                metrics.set_outcome(metrics.NOT_FOUND)
+                await reply(ctx, f"❌ No role **{role}** found.")
+                return
+            await reply(ctx, f"✅ Removed **{', '.join(team_members)}** from **{role}**!")
 
         elif intent == "delete_team":
             # Handle delete team command
@@ -427,16 +607,16 @@ async def handle_natural_command(ctx, *, message: str = None):
                                      "❌ Please provide a valid role name.")
                 if not role:
                     return
-
-            # Check if role exists
-            role_exists = roles_collection.find_one({"role": role.lower()})
-            if not role_exists:
-                await ctx.send(f"❌ No role **{role}** found.")
+            role = await resolve_role(ctx, guild_id, role, confirm=True)
+            if not role:
                 return
 
             # Delete the entire team
-            roles_collection.delete_one({"role": role.lower()})
-            await ctx.send(f"✅ Team **{role}** and all its data have been deleted!")
+            if not await roles_repo.delete_role(guild_id, role):
+                metrics.set_outcome(metrics.NOT_FOUND)
+                await reply(ctx, f"❌ No role **{role}** found.")
+                return
+            await reply(ctx, f"✅ Team **{role}** and all its data have been deleted!")
 
         elif intent == "update_name":
             # Ask for missing information
@@ -447,6 +627,9 @@ async def handle_natural_command(ctx, *, message: str = None):
                                      "❌ Please provide a valid role name.")
                 if not role:
                     return
+            role = await resolve_role(ctx, guild_id, role)
+            if not role:
+                return
             if not team_name:
                 team_name = await ask_user(ctx, 
                                           "What's the new team name? (e.g., Beta)",
@@ -455,19 +638,16 @@ async def handle_natural_command(ctx, *, message: str = None):
                 if not team_name:
                     return
 
-            # Check if role exists
-            role_exists = roles_collection.find_one({"role": role.lower()})
-            if not role_exists:
-                await ctx.send(f"❌ No role **{role}** found.")
-                return
-
             # Update team name
-            result = roles_collection.update_one({"role": role.lower()}, {"$set": {"team_name": team_name}})
-            debug_print(f"Update result: {result.modified_count} documents updated.")
-            if result.modified_count == 0:
-                await ctx.send(f"❌ No changes were made to the role **{role}**.")
+            previous = await roles_repo.update_role(guild_id, role, {"$set": {"team_name": team_name}})
+            logger.debug("Update result: previous document %s", previous)
+            if not previous:
+                metrics.set_outcome(metrics.NOT_FOUND)
+                await reply(ctx, f"❌ No role **{role}** found.")
+            elif previous.get("team_name") == team_name:
+                await reply(ctx, f"❌ No changes were made to the role **{role}**.")
             else:
-                await ctx.send(f"✅ Team name for **{role}** updated to **{team_name}**! Now, you can add new members or update the repo with `!cmd update repo`.")
+                await reply(ctx, f"✅ Team name for **{role}** updated to **{team_name}**! Now, you can add new members or update the repo with `!cmd update repo`.")
 
         elif intent == "update_repo":
             # Ask for missing information
@@ -478,6 +658,9 @@ async def handle_natural_command(ctx, *, message: str = None):
                                      "❌ Please provide a valid role name.")
                 if not role:
                     return
+            role = await resolve_role(ctx, guild_id, role)
+            if not role:
+                return
             if not project_repo:
                 project_repo = await ask_user(ctx, 
                                              "What's the new GitHub repo? (e.g., https://github.com/org/repo)",
@@ -490,15 +673,12 @@ async def handle_natural_command(ctx, *, message: str = None):
                 if not project_repo.startswith("http"):
                     project_repo = "https://" + project_repo
 
-            # Check if role exists
-            role_exists = roles_collection.find_one({"role": role.lower()})
-            if not role_exists:
-                await ctx.send(f"❌ No role **{role}** found.")
-                return
-
             # Update repo
-            roles_collection.update_one({"role": role.lower()}, {"$set": {"project_repo": project_repo}})
-            await ctx.send(f"✅ Repo for **{role}** updated to {project_repo}!")
+            if not await roles_repo.update_role(guild_id, role, {"$set": {"project_repo": project_repo}}):
+                metrics.set_outcome(metrics.NOT_FOUND)
+                await reply(ctx, f"❌ No role **{role}** found.")
+                return
+            await reply(ctx, f"✅ Repo for **{role}** updated to {project_repo}!")
 
         elif intent == "update_role":
             # Ask for the role name
@@ -509,11 +689,15 @@ async def handle_natural_command(ctx, *, message: str = None):
                                     "❌ Please provide a valid role name.")
                 if not role:
                     return
+            role = await resolve_role(ctx, guild_id, role)
+            if not role:
+                return
 
-            # Check if the role exists in MongoDB
-            role_exists = roles_collection.find_one({"role": role.lower()})
+            # Check up front so the user isn't asked for a new name for a missing role
+            role_exists = await roles_repo.find_role(guild_id, role)
             if not role_exists:
-                await ctx.send(f"❌ No role **{role}** found.")
+                metrics.set_outcome(metrics.NOT_FOUND)
+                await reply(ctx, f"❌ No role **{role}** found.")
                 return
 
             # Ask for the new role name (or the updated name)
@@ -525,12 +709,18 @@ async def handle_natural_command(ctx, *, message: str = None):
                 return
 
             # Update the role name in the MongoDB database
-            roles_collection.update_one(
-                {"role": role.lower()},
-                {"$set": {"role": new_role_name.lower()}}
-            )
+            try:
+                renamed = await roles_repo.rename_role(guild_id, role, new_role_name)
+            except DuplicateKeyError:
+                metrics.set_outcome(metrics.DUPLICATE)
+                await reply(ctx, f"❌ Role **{new_role_name}** already exists.")
+                return
+            if not renamed:
+                metrics.set_outcome(metrics.NOT_FOUND)
+                await reply(ctx, f"❌ No role **{role}** found.")
+                return
 
-            await ctx.send(f"✅ Role **{role}** updated to **{new_role_name}**!")
+            await reply(ctx, f"✅ Role **{role}** updated to **{new_role_name}**!")
 
 
         elif intent == "show_info":
@@ -542,16 +732,19 @@ async def handle_natural_command(ctx, *, message: str = None):
                                      "❌ Please provide a valid role name.")
                 if not role:
                     return
+            role = await resolve_role(ctx, guild_id, role)
+            if not role:
+                return
 
             # Get role data
-            role_data = roles_collection.find_one({"role": role.lower()})
+            role_data = await roles_repo.find_role(guild_id, role)
             if not role_data:
-                await ctx.send(f"❌ No role **{role}** found.")
+                metrics.set_outcome(metrics.NOT_FOUND)
+                await reply(ctx, f"❌ No role **{role}** found.")
                 return
 
             # Display team info
-            members = ", ".join(role_data.get("team_members", [])) or "None"
-            await ctx.send(f"**Info for {role}**:\nName: {role_data['team_name']}\nRepo: {role_data.get('project_repo', 'None')}\nMembers: {members}\nStatus: {role_data.get('status', 'Not started')}")
+            await reply(ctx, format_team_info(role, role_data))
 
         elif intent == "set_status":
             # Ask for missing information
@@ -562,6 +755,9 @@ async def handle_natural_command(ctx, *, message: str = None):
                                      "❌ Please provide a valid role name.")
                 if not role:
                     return
+            role = await resolve_role(ctx, guild_id, role)
+            if not role:
+                return
             if not status:
                 status = await ask_user(ctx, 
                                        "What's the new status? (e.g., In Progress)",
@@ -570,26 +766,278 @@ async def handle_natural_command(ctx, *, message: str = None):
                 if not status:
                     return
 
-            # Check if role exists
-            role_exists = roles_collection.find_one({"role": role.lower()})
-            if not role_exists:
-                await ctx.send(f"❌ No role **{role}** found.")
-                return
-
             # Update status
-            roles_collection.update_one({"role": role.lower()}, {"$set": {"status": status.capitalize()}})
-            await ctx.send(f"✅ Status for **{role}** updated to **{status}**!")
+            if not await roles_repo.update_role(guild_id, role, {"$set": {"status": status.capitalize()}}):
+                metrics.set_outcome(metrics.NOT_FOUND)
+                await reply(ctx, f"❌ No role **{role}** found.")
+                return
+            await reply(ctx, f"✅ Status for **{role}** updated to **{status}**!")
         else:
-            await ctx.send("❌ Command not recognized. Use `!help` for available commands.")
+            metrics.set_outcome(metrics.UNRECOGNIZED)
+            await reply(ctx, "❌ Command not recognized. Use `!help` for available commands.")
 
     except Exception as e:
-        debug_print(f"Critical failure in handle_natural_command: {e}")
-        traceback.print_exc()
-        await ctx.send(f"❌ Something went wrong: {str(e)[:50]}... Please try again with a simpler command.")
+        logger.exception("Critical failure in handle_natural_command: %s", e)
+        metrics.set_outcome(metrics.ERROR)
+        await reply(ctx, f"❌ Something went wrong: {str(e)[:50]}... Please try again with a simpler command.")
+
+MAX_BATCH_LINES = int(os.getenv("MAX_BATCH_LINES", "500"))
+
+async def run_batch(ctx, text):
+    """Validate every line of a batch, then apply them all in one ordered bulk_write"""
+    for attachment in ctx.message.attachments:
+        text += "\n" + (await attachment.read()).decode("utf-8", errors="replace")
+    try:
+        lines = team_batch.split_batch(text, MAX_BATCH_LINES)
+    except ValueError as e:
+        metrics.set_outcome(metrics.VALIDATION_FAILURE)
+        await reply(ctx, f"❌ {e}")
+        return
+    if not lines:
+        metrics.set_outcome(metrics.VALIDATION_FAILURE)
+        await reply(ctx, "❓ Put one command per line after `!cmd batch`, or attach a text file.")
+        return
+    if roles_repo is None:
+        metrics.set_outcome(metrics.UNAVAILABLE)
+        await reply(ctx, "❌ Database connection is not available. Please check server logs.")
+        return
+
+    # Lines are scored on the intent executor one at a time, so a long batch neither blocks the event loop nor
+    # takes every executor slot from other users' commands
+    with metrics.stage("intent"):
+        intents = {}
+        for _, line_text in lines:
+            if line_text not in intents:
+                intents[line_text] = await get_best_command_async(line_text)
+    with metrics.stage("args"):
+        parsed = team_batch.parse_batch(lines, intents.get, extract_command_args)
+    roles = {line.args.get("role").lower() for line in parsed if line.args and line.args.get("role")}
+    existing = await roles_repo.find_existing_roles(ctx.guild.id, roles) if roles else set()
+    if not team_batch.plan_operations(parsed, existing, ctx.guild.id):
+        metrics.set_outcome(metrics.VALIDATION_FAILURE)
+        failed = sum(1 for line in parsed if line.error)
+        await reply(ctx, team_batch.format_summary(f"❌ Batch not applied: {failed} of {len(parsed)} lines have problems.", parsed),
+                    priority=outbound.BULK)
+        return
+
+    try:
+        await roles_repo.bulk_write([line.operation for line in parsed], ctx.guild.id, roles, ordered=True)
+    except BulkWriteError as e:
+        # Ordered writes stop at the first failure; later lines were not applied
+        failed_index = e.details["writeErrors"][0]["index"]
+        for line in parsed[failed_index:]:
+            line.error = "not applied"
+        parsed[failed_index].error = e.details["writeErrors"][0].get("errmsg", "write failed")[:80]
+        metrics.set_outcome(metrics.ERROR)
+        await reply(ctx, team_batch.format_summary(f"⚠️ Batch stopped at line {parsed[failed_index].number}: "
+                                                   f"{failed_index} of {len(parsed)} lines applied.", parsed), priority=outbound.BULK)
+        return
+    await reply(ctx, team_batch.format_summary(f"✅ Batch applied: {len(parsed)} lines.", parsed), priority=outbound.BULK)
+
+@bot.command(name="export")
+@commands.guild_only()
+@commands.has_permissions(manage_guild=True)
+async def export_teams(ctx, fmt: str = "csv"):
+    fmt = fmt.lower()
+    if fmt not in ("csv", "jsonl"):
+        await reply(ctx, "❌ Format must be `csv` or `jsonl`.")
+        return
+    if roles_repo is None:
+        await reply(ctx, "❌ Database connection is not available. Please check server logs.")
+        return
+    # Rows stream from the cursor to a temporary file, so the export never sits in memory
+    with tempfile.TemporaryFile() as spool:
+        text = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+        stats = await roles_repo.export_to(text, ctx.guild.id, fmt)
+        text.flush()
+        text.detach()
+        size = spool.tell()
+        if size > ctx.guild.filesize_limit:
+            await reply(ctx, f"❌ The export is {size / 1024 / 1024:.1f} MB, over Discord's upload limit. "
+                             f"Use `python role_io.py export --guild-id {ctx.guild.id}` instead.")
+            return
+        spool.seek(0)
+        logger.info("Exported %d roles in %.2fs for %s", stats["rows"], stats["seconds"], ctx.author)
+        await reply(ctx, f"📦 Exported {stats['rows']} teams in {stats['seconds']:.2f}s.",
+                    priority=outbound.BULK, file=discord.File(spool, filename=f"teams.{fmt}"))
+
+@bot.command(name="import")
+@commands.guild_only()
+@commands.has_permissions(manage_guild=True)
+async def import_teams(ctx):
+    attachment = ctx.message.attachments[0] if ctx.message.attachments else None
+    fmt = role_io.detect_format(attachment.filename, default=None) if attachment else None
+    if fmt is None:
+        await reply(ctx, "❓ Attach a `.csv` or `.jsonl` file to `!import`.")
+        return
+    if roles_repo is None:
+        await reply(ctx, "❌ Database connection is not available. Please check server logs.")
+        return
+    with tempfile.TemporaryFile() as spool:
+        await attachment.save(spool)
+        spool.seek(0)
+        text = io.TextIOWrapper(spool, encoding="utf-8-sig", errors="replace", newline="")
+        try:
+            stats = await roles_repo.import_from(text, ctx.guild.id, fmt)
+        except role_io.PartialImportError as e:
+            logger.error("Import from %s stopped: %s", attachment.filename, e.write_errors[:3])
+            lines = ", ".join(str(number) for number in e.stats["rejected_lines"])
+            await reply(ctx, f"⚠️ Import stopped after line {e.stats['last_line']}: {e.stats['rejected']} rows were rejected "
+                             f"(lines {lines}). {e.stats['upserted']} teams were created and {e.stats['modified']} updated "
+                             f"before that; later rows were not imported.", priority=outbound.BULK)
+            return
+    logger.info("Imported %d rows in %.2fs for %s", stats["rows"], stats["seconds"], ctx.author)
+    summary = (f"✅ Imported {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/s): "
+               f"{stats['upserted']} created, {stats['modified']} updated.")
+    if stats["skipped"]:
+        lines = ", ".join(str(number) for number in stats["skipped_lines"])
+        summary += f"\n⚠️ Skipped {stats['skipped']} rows without a role (lines {lines}{'…' if stats['skipped'] > len(stats['skipped_lines']) else ''})."
+    await reply(ctx, summary, priority=outbound.BULK)
+
+# Slash commands are generated from discord_commands.DISCORD_COMMANDS, so each option arrives typed and nothing is prompted for
+SLASH_OPTION_TYPES = {"string": str, "integer": int, "number": float, "boolean": bool}
+
+async def complete_role_name(interaction, current):
+    return [app_commands.Choice(name=role, value=role) for role in role_index.complete(interaction.guild_id, current)]
+
+def make_app_command(spec, handler):
+    """Build an app command from a DISCORD_COMMANDS entry; handler is called with (interaction, name, **options)"""
+    async def callback(interaction, **options):
+        await handler(interaction, spec["name"], **options)
+    # discord.py reads the options from the callback's signature, with required ones first
+    options = sorted(spec["options"].items(), key=lambda item: not item[1].get("required"))
+    callback.__signature__ = inspect.Signature(
+        [inspect.Parameter("interaction", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=discord.Interaction)]
+        + [inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=SLASH_OPTION_TYPES[option["type"]],
+                             default=inspect.Parameter.empty if option.get("required") else None)
+           for name, option in options])
+    callback = app_commands.describe(**{name: option["description"] for name, option in options})(callback)
+    command = app_commands.Command(name=spec["name"], description=spec["description"],
+                                   callback=app_commands.guild_only(callback))
+    if "role_name" in spec["options"]:
+        command.autocomplete("role_name")(complete_role_name)
+    return command
+
+async def respond(interaction, content, ephemeral=False):
+    """Answer an interaction, or follow up if it was already deferred, timed as the "send" stage"""
+    # Interaction replies use the interaction's own webhook, not the channel's rate limit, so they skip outbound_queue
+    with metrics.stage("send"):
+        if interaction.response.is_done():
+            return await interaction.followup.send(content, ephemeral=ephemeral)
+        return await interaction.response.send_message(content, ephemeral=ephemeral)
+
+async def handle_slash_command(interaction, command_name, **options):
+    trace = metrics.begin_command()
+    metrics.set_intent(command_name)
+    try:
+        # Discord drops interactions not answered within 3 seconds, so acknowledge first if commands are queued
+        if admission.queued or admission.running >= admission.max_concurrent:
+            await interaction.response.defer(thinking=True)
+        async with admission.admit(interaction.user.id, interaction.channel_id):
+            content = await run_slash_command(interaction.guild_id, command_name, **options)
+        await respond(interaction, content)
+    except RateLimited as e:
+        metrics.set_outcome(metrics.RATE_LIMITED)
+        logger.debug("Rate limited /%s from %s (%s): retry in %.1fs", command_name, interaction.user, e.scope, e.retry_after)
+        # Unlike !cmd, an interaction must always be answered; ephemeral keeps it out of the channel
+        await respond(interaction, f"🐢 Too many commands. Try again in {max(1, round(e.retry_after))}s.", ephemeral=True)
+    except Overloaded as e:
+        metrics.set_outcome(metrics.BUSY)
+        logger.warning("Shed /%s from %s: %s", command_name, interaction.user, e)
+        await respond(interaction, "⏳ I'm busy right now. Please retry in a few seconds.", ephemeral=True)
+    except Exception as e:
+        logger.exception("Failure in /%s: %s", command_name, e)
+        metrics.set_outcome(metrics.ERROR)
+        await respond(interaction, f"❌ Something went wrong: {str(e)[:50]}...", ephemeral=True)
+    finally:
+        metrics.finish_command(trace)
+
+async def run_slash_command(guild_id, command_name, role_name, github_repo=None, github_usernames=None, status=None):
+    """Apply one slash command to the guild's teams and return the reply"""
+    if roles_repo is None:
+        metrics.set_outcome(metrics.UNAVAILABLE)
+        return "❌ Database connection is not available. Please check server logs."
+    role = role_name.strip().lower()
+    if not validate_role(role):
+        metrics.set_outcome(metrics.VALIDATION_FAILURE)
+        return "❌ Please provide a valid role name (not a command word)."
+    if status is not None and not validate_status(status.strip()):
+        metrics.set_outcome(metrics.VALIDATION_FAILURE)
+        return "❌ Please provide a valid status."
+
+    if command_name in ("showroledata", "setstatus"):
+        # An interaction can't be asked a follow-up, so a close call is answered with the candidates instead
+        match, candidates = role_index.resolve(guild_id, role)
+        if match is not None:
+            role = match
+        elif candidates:
+            metrics.set_outcome(metrics.NOT_FOUND)
+            return f"❌ No role **{role}** found. Did you mean {', '.join(f'**{candidate}**' for candidate in candidates)}?"
+
+    if command_name == "showroledata":
+        role_data = await roles_repo.find_role(guild_id, role)
+        if not role_data:
+            metrics.set_outcome(metrics.NOT_FOUND)
+            return f"❌ No role **{role}** found."
+        return format_team_info(role, role_data)
+
+    if command_name == "setstatus":
+        status = status.strip().capitalize()
+        if not await roles_repo.update_role(guild_id, role, {"$set": {"status": status}}):
+            metrics.set_outcome(metrics.NOT_FOUND)
+            return f"❌ No role **{role}** found."
+        return f"✅ Status for **{role}** updated to **{status}**!"
+
+    if command_name == "addroledata":
+        changes = {}
+        if github_repo:
+            github_repo = github_repo.strip()
+            if not validate_repo_url(github_repo):
+                metrics.set_outcome(metrics.VALIDATION_FAILURE)
+                return "❌ Please provide a valid GitHub URL (starting with https://github.com/)."
+            changes["project_repo"] = github_repo if github_repo.startswith("http") else "https://" + github_repo
+        if status:
+            changes["status"] = status.strip().capitalize()
+        members = [name.strip() for name in (github_usernames or "").split(",") if name.strip()]
+        if not all(validate_member_name(name) for name in members):
+            metrics.set_outcome(metrics.VALIDATION_FAILURE)
+            return "❌ Please provide valid GitHub usernames, separated by commas."
+        # Mongo rejects an update that names a field in both $setOnInsert and $set/$addToSet
+        defaults = {"team_name": role, "project_repo": None, "team_members": [], "status": "Not started"}
+        update = {"$setOnInsert": {field: value for field, value in defaults.items()
+                                   if field not in changes and not (field == "team_members" and members)}}
+        if changes:
+            update["$set"] = changes
+        if members:
+            update["$addToSet"] = {"team_members": {"$each": members}}
+        created = await roles_repo.upsert_role(guild_id, role, update)
+        return f"✅ {'Created' if created else 'Updated'} team data for role **{role}**!"
+
+    metrics.set_outcome(metrics.UNRECOGNIZED)
+    return "❌ Command not recognized. Use `!help` for available commands."
+
+for command_spec in DISCORD_COMMANDS.values():
+    bot.tree.add_command(make_app_command(command_spec, handle_slash_command))
+
+async def sync_app_commands():
+    # Global commands can take a while to show up everywhere; NEOBOT_SYNC_GUILD_ID registers them in one server at once
+    if os.getenv("NEOBOT_SYNC_COMMANDS", "1") != "1":
+        return
+    guild_id = os.getenv("NEOBOT_SYNC_GUILD_ID")
+    guild = discord.Object(id=int(guild_id)) if guild_id else None
+    if guild is not None:
+        bot.tree.copy_global_to(guild=guild)
+    try:
+        synced = await bot.tree.sync(guild=guild)
+        logger.info("Synced %d slash commands %s", len(synced), f"to guild {guild_id}" if guild else "globally")
+    except discord.HTTPException as e:
+        logger.error("Failed to sync slash commands: %s", e)
+
+bot.setup_hook = sync_app_commands
 
 @bot.command(name="help")
 async def custom_help_command(ctx):
-    debug_print(f"Help command requested by {ctx.author}")
+    logger.debug("Help command requested by %s", ctx.author)
     help_text = (
         "👋 **Simple Team Bot Help**\n"
         "Use `!cmd` with one task at a time. Examples:\n"
@@ -600,38 +1048,107 @@ async def custom_help_command(ctx):
         "- `!cmd update repo` - Update a team's GitHub repo (will ask for role and URL).\n"
         "- `!cmd show info` - View team details (will ask for role).\n"
         "- `!cmd set status` - Set a team's status (will ask for role and status).\n"
+        "- `!cmd batch` - Run many changes at once: one command per line below it, or attach a text file.\n"
+        "- `!export [csv|jsonl]` / `!import` (attach a file) - Back up or bulk load teams (Manage Server only).\n"
+        "- `/addroledata`, `/showroledata`, `/setstatus` - Add team data, show a team or set its status in one step; role names are suggested as you type.\n"
+        "- `!cancel` - Cancel the command that is waiting for your answer.\n"
         "💡 Tip: Keep commands short and specific. I'll prompt for missing details!"
     )
-    await ctx.send(help_text)
+    await reply(ctx, help_text, priority=outbound.BULK)
 
 @bot.command(name="test")
 async def test_command(ctx):
-    debug_print(f"Test command executed by {ctx.author}")
-    await ctx.send("✅ I'm working! Try `!cmd` or `!help`.")
+    logger.debug("Test command executed by %s", ctx.author)
+    await reply(ctx, "✅ I'm working! Try `!cmd` or `!help`.")
 
 @bot.command(name="debug")
-async def toggle_debug(ctx):
-    global DEBUG
-    DEBUG = not DEBUG
-    debug_print(f"Debug mode toggled to {DEBUG} by {ctx.author}")
-    await ctx.send(f"🛠️ Debug mode {'enabled' if DEBUG else 'disabled'}.")
+async def toggle_debug(ctx, level: str = None, module: str = None):
+    # `!debug` toggles the bot logger; `!debug <level> [module]` sets any logger's level
+    if level is None:
+        enabled = not logger.isEnabledFor(logging.DEBUG)
+        set_level("DEBUG" if enabled else "INFO", "bot")
+        logger.info("Debug mode toggled to %s by %s", enabled, ctx.author)
+        await reply(ctx, f"🛠️ Debug mode {'enabled' if enabled else 'disabled'}.")
+        return
+    try:
+        set_level(level, module)
+    except KeyError:
+        await reply(ctx, "❌ Unknown level. Use one of: DEBUG, INFO, WARNING, ERROR, CRITICAL.")
+        return
+    logger.info("Log level for %s set to %s by %s", module or "root", level.upper(), ctx.author)
+    await reply(ctx, f"🛠️ Log level for **{module or 'all modules'}** set to **{level.upper()}**.")
+
+@bot.command(name="cancel")
+async def cancel_prompt(ctx):
+    if conversations.cancel(ctx.channel.id, ctx.author.id):
+        await reply(ctx, "🛑 Cancelled your pending command.")
+    else:
+        await reply(ctx, "Nothing to cancel.")
+
+@bot.command(name="stats")
+async def show_stats(ctx):
+    summary = metrics.summary()
+    outcomes = ", ".join(f"{outcome}: {count}" for outcome, count in sorted(summary["outcomes"].items())) or "none yet"
+    lines = ["📊 **Bot stats**", f"Commands handled: {summary['commands']} ({outcomes})"]
+    for stage_name in ("queue", "intent", "args", "mongo", "prompt", "send"):
+        stage_stats = summary["stages"].get(stage_name)
+        if stage_stats:
+            lines.append(f"- {stage_name}: {stage_stats['count']} calls, mean {stage_stats['mean_ms']:.1f} ms, "
+                         f"p95 ≤ {stage_stats['p95_ms']:.1f} ms")
+    role_stats = role_cache.stats()
+    intent_stats = intent_cache.stats()
+    lines.append(f"Role cache: {role_stats['hits']} hits / {role_stats['misses']} misses ({role_stats['hit_rate']:.0%})")
+    index_stats = role_index.stats()
+    lines.append(f"Role index: {index_stats['roles']} roles in {index_stats['guilds']} guilds")
+    lines.append(f"Intent cache: {intent_stats['hits']} hits / {intent_stats['misses']} misses ({intent_stats['hit_rate']:.0%})")
+    cascade_stats = intent_cascade.stats()
+    lines.append(f"Intent cascade: {cascade_stats['resolved']} resolved, {cascade_stats['escalation_rate']:.0%} escalated, "
+                 f"cheap {cascade_stats['mean_cheap_ms']:.2f} ms / neural {cascade_stats['mean_neural_ms']:.1f} ms, "
+                 f"{cascade_stats['neural_seconds']:.1f}s in the model"
+                 + (f", estimated saving {cascade_stats['saved_seconds']:.1f}s" if cascade_stats["saved_seconds"] is not None else ""))
+    outbound_stats = outbound_queue.stats()
+    lines.append(f"Outbound: {sum(outbound_stats['queued'].values())} queued, {outbound_stats['delivered']} messages in "
+                 f"{outbound_stats['payloads']} sends ({outbound_stats['coalesce_ratio']:.2f} per send), "
+                 f"{outbound_stats['throttled_seconds']:.1f}s throttled, {outbound_stats['dropped']} dropped")
+    executor_stats = intent_executor.stats()
+    fallbacks = ", ".join(f"{reason} {count}" for reason, count in executor_stats["fallbacks"].items())
+    lines.append(f"Intent executor ({executor_stats['kind']}): {executor_stats['completed']} scored, "
+                 f"mean {executor_stats['mean_ms']:.1f} ms, {executor_stats['pending']} pending; fallbacks: {fallbacks}")
+    conversation_stats = conversations.stats()
+    lines.append(f"Open conversations: {conversation_stats['open']} (timeouts {conversation_stats['timeouts']}, "
+                 f"cancelled {conversation_stats['cancelled']}, rejected {conversation_stats['rejected']})")
+    admission_stats = admission.stats()
+    lines.append(f"Admission: {admission_stats['running']} running, {admission_stats['queued']} queued "
+                 f"(peak {admission_stats['peak_queued']}), wait mean {admission_stats['mean_wait_ms']:.1f} ms / "
+                 f"max {admission_stats['max_wait_ms']:.1f} ms, {admission_stats['rate_limited']} rate limited, "
+                 f"{admission_stats['shed']} shed")
+    if bot.shard_count:
+        lines.append(f"Shards: {', '.join(map(str, sorted(bot.shards)))} of {bot.shard_count}, "
+                     f"{len(bot.guilds)} guilds in this process")
+    await reply(ctx, "\n".join(lines), priority=outbound.BULK)
 
 @bot.command(name="update team")
+@commands.guild_only()
 async def update_team(ctx, *, message: str = None):
     if message:
         await handle_natural_command(ctx, message=message)
     else:
-        await ctx.send("❓ Please specify the full team update details.")
+        await reply(ctx, "❓ Please specify the full team update details.")
 
 if __name__ == "__main__":
     try:
-        debug_print("Starting bot...")
+        logger.info("Starting bot...")
         token = os.getenv("DISCORD_BOT_TOKEN")
         if not token:
-            print("Error: DISCORD_BOT_TOKEN not found in data.env. Please set it and restart.")
+            logger.error("DISCORD_BOT_TOKEN not found in data.env. Please set it and restart.")
             exit(1)
-        debug_print(f"Bot token loaded: {token[:4]}...{token[-4:]}")
-        bot.run(token)
+        logger.debug("Bot token loaded: %s...%s", token[:4], token[-4:])
+        setup_database()
+        metrics_port = os.getenv("NEOBOT_METRICS_PORT")
+        if metrics_port:
+            metrics.start_http_server(int(metrics_port), host=os.getenv("NEOBOT_METRICS_HOST", "127.0.0.1"))
+            logger.info("Serving metrics on port %s", metrics_port)
+        # log_handler=None keeps discord.py on our queue-backed handler
+        bot.run(token, log_handler=None)
     except Exception as e:
-        print(f"Fatal error starting bot: {e}")
-        traceback.print_exc()
\ No newline at end of file
+        logger.exception("Fatal error starting bot: %s", e)
\ No newline at end of file
@@ -0,0 +1,123 @@
+import asyncio
+import math
+
+
+class ConversationLimitError(Exception):
+    """Raised when too many conversations are already waiting for a reply."""
+
+
+class ConversationCancelled(Exception):
+    """Raised in a waiting flow when its conversation is cancelled or replaced."""
+
+
+class _Pending:
+    __slots__ = ("key", "future", "rounds")
+
+    def __init__(self, key, future, rounds):
+        self.key = key
+        self.future = future
+        self.rounds = rounds
+
+
+class ConversationManager:
+    """Routes follow-up replies to the flow waiting for them.
+
+    Pending prompts are keyed by (channel_id, author_id), so delivering a message
+    is one dict lookup no matter how many flows are open. Timeouts are handled by
+    a single hashed timer wheel task instead of one timer per prompt.
+    """
+
+    def __init__(self, max_open=1000, tick=0.5, wheel_size=128):
+        self.max_open = max_open
+        self.tick = tick
+        self.wheel = [set() for _ in range(wheel_size)]
+        self.pending = {}
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._cursor = 0
+        self._task = None
+
+    def _ensure_wheel(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_wheel(), name="conversation-timer-wheel")
+
+    async def _run_wheel(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self._cursor = (self._cursor + 1) % len(self.wheel)
+            bucket = self.wheel[self._cursor]
+            for entry in list(bucket):
+                if entry.rounds > 0:
+                    entry.rounds -= 1
+                    continue
+                bucket.discard(entry)
+                if self.pending.get(entry.key) is entry:
+                    del self.pending[entry.key]
+                if not entry.future.done():
+                    self.timeouts += 1
+                    entry.future.set_exception(asyncio.TimeoutError())
+
+    def _schedule(self, key, future, timeout):
+        ticks = max(1, math.ceil(timeout / self.tick))
+        rounds, offset = divmod(ticks, len(self.wheel))
+        if offset == 0:
+            rounds, offset = rounds - 1, len(self.wheel)
+        entry = _Pending(key, future, rounds)
+        slot = (self._cursor + offset) % len(self.wheel)
+        self.wheel[slot].add(entry)
+        future.add_done_callback(lambda _: self.wheel[slot].discard(entry))
+        return entry
+
+    async def wait_for_reply(self, channel_id, author_id, timeout=30.0):
+        """Wait for the next message from author_id in channel_id.
+
+        Raises asyncio.TimeoutError, ConversationCancelled, or ConversationLimitError
+        if max_open flows are already waiting.
+        """
+        key = (channel_id, author_id)
+        previous = self.pending.get(key)
+        if previous is None and len(self.pending) >= self.max_open:
+            self.rejected += 1
+            raise ConversationLimitError(f"{self.max_open} conversations already open")
+        if previous is not None:
+            # One open prompt per user per channel: the newer flow replaces the older one
+            self._cancel_entry(previous)
+        self._ensure_wheel()
+        future = asyncio.get_running_loop().create_future()
+        entry = self._schedule(key, future, timeout)
+        self.pending[key] = entry
+        try:
+            return await future
+        finally:
+            if self.pending.get(key) is entry:
+                del self.pending[key]
+
+    def dispatch(self, message):
+        """Deliver message to the flow waiting on its channel and author. Returns True if one was."""
+        entry = self.pending.pop((message.channel.id, message.author.id), None)
+        if entry is None or entry.future.done():
+            return False
+        entry.future.set_result(message)
+        return True
+
+    def cancel(self, channel_id, author_id):
+        """Cancel the prompt waiting on (channel_id, author_id). Returns True if there was one."""
+        entry = self.pending.pop((channel_id, author_id), None)
+        if entry is None:
+            return False
+        return self._cancel_entry(entry)
+
+    def _cancel_entry(self, entry):
+        if entry.future.done():
+            return False
+        self.cancelled += 1
+        entry.future.set_exception(ConversationCancelled())
+        return True
+
+    def stats(self):
+        return {"open": len(self.pending), "timeouts": self.timeouts,
+                "cancelled": self.cancelled, "rejected": self.rejected}
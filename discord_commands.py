@@ -0,0 +1,29 @@
+# Discord slash commands from the bot. Kept apart from finalmodel so bot.py can build its app commands without
+# importing finalmodel and creating its intent cache
+DISCORD_COMMANDS = {
+    "addroledata": {
+        "name": "addroledata",
+        "description": "Add or update GitHub repository and team information for a role",
+        "options": {
+            "role_name": {"type": "string", "required": True, "description": "Team Name (The role associated)"},
+            "github_repo": {"type": "string", "required": False, "description": "The GitHub repository URL or name"},
+            "github_usernames": {"type": "string", "required": False, "description": "Comma-separated list of GitHub usernames"},
+            "status": {"type": "string", "required": False, "description": "Current project status or milestone"}
+        }
+    },
+    "showroledata": {
+        "name": "showroledata",
+        "description": "Display GitHub repository and team information for a role",
+        "options": {
+            "role_name": {"type": "string", "required": True, "description": "The name of the role or team"}
+        }
+    },
+    "setstatus": {
+        "name": "setstatus",
+        "description": "Update the project status or milestone for a team",
+        "options": {
+            "role_name": {"type": "string", "required": True, "description": "The name of the role or team"},
+            "status": {"type": "string", "required": True, "description": "Current project status or milestone"}
+        }
+    }
+}
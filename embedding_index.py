@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+def mapping_fingerprint(command_mapping, model_name):
+    """Stable hash of the mapping and model, used to key the on-disk matrix"""
+    payload = json.dumps(command_mapping, sort_keys=True) + "\0" + model_name
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class PhraseEmbeddingIndex:
+    """Sentence embeddings for every context and example phrase in a command mapping.
+
+    The matrix is computed once, saved to cache_dir and reloaded on later starts.
+    Scoring a query costs one forward pass for the query plus one matrix-vector product.
+    """
+
+    def __init__(self, command_mapping, tokenizer, model, model_name, cache_dir=".neobot_cache"):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.rows = []  # (command_key, kind, text) for each matrix row
+        self.slices = {}  # command_key -> (context row, first phrase row, end row)
+        for command_key, command_data in command_mapping.items():
+            start = len(self.rows)
+            self.rows.append((command_key, "context", command_data["context"]))
+            self.rows.extend((command_key, "command", phrase) for phrase in command_data["commands"])
+            self.slices[command_key] = (start, start + 1, len(self.rows))
+        self.path = os.path.join(cache_dir, f"intent_index-{mapping_fingerprint(command_mapping, model_name)}.npy")
+        self.matrix = self._load_or_build()
+
+    def _load_or_build(self):
+        if os.path.exists(self.path):
+            try:
+                matrix = np.load(self.path)
+            except (OSError, ValueError, EOFError):
+                matrix = None  # truncated by a crash during an older, in-place save; rebuild it
+            if matrix is not None and matrix.shape[0] == len(self.rows):
+                return matrix
+        matrix = self.encode([text for _, _, text in self.rows])
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Written aside and renamed into place, so a reader never sees half a matrix; the pid keeps
+        # intent executor workers building the index at the same time out of each other's way
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as fp:
+                np.save(fp, matrix)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return matrix
+
+    def encode(self, texts):
+        """Mean-pooled, L2-normalised last hidden states, one row per text"""
+        import torch
+
+        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
+        with torch.no_grad():
+            hidden = self.model(**inputs, output_hidden_states=True).hidden_states[-1]
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = ((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)).numpy()
+        return pooled / np.linalg.norm(pooled, axis=1, keepdims=True).clip(min=1e-12)
+
+    def similarities(self, query):
+        """Cosine similarity of the query against every row, clipped to [0, 1]"""
+        return np.clip(self.matrix @ self.encode([query])[0], 0.0, 1.0)
+
+    def score(self, query):
+        """Return {command_key: (context score, [example phrase scores])}"""
+        sims = self.similarities(query)
+        return {
+            command_key: (float(sims[context_row]), sims[first_phrase:end].tolist())
+            for command_key, (context_row, first_phrase, end) in self.slices.items()
+        }
+
+    def top_k(self, query, k=5):
+        """Best k (command_key, text, score) rows for the query"""
+        sims = self.similarities(query)
+        k = min(k, len(self.rows))
+        best = np.argpartition(-sims, k - 1)[:k]
+        best = best[np.argsort(-sims[best])]
+        return [(self.rows[i][0], self.rows[i][2], float(sims[i])) for i in best]
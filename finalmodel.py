@@ -1,54 +1,49 @@
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+import atexit
+import os
+import threading
+import time
 from difflib import SequenceMatcher
+from discord_commands import DISCORD_COMMANDS
+from intent_cache import IntentCache
+from intent_engine import IntentCascade, IntentMatcher
 
 
-# MongoDB connection setup
-from pymongo import MongoClient
+# The role store and the model are opened lazily on first use so importing this module is instant
+# distilbert - this is the AI model that helps understand user text
+MODEL_NAME = "distilbert-base-uncased-finetuned-sst-2-english"
+tokenizer = None
+model = None
+intent_recognition_pipeline = None
+_model_lock = threading.Lock()
 
-# Connect to MongoDB
-client = MongoClient("")
+# CPU inference backend: "torch" (fp32), "torch-int8" (dynamic quantization) or "onnx" (ONNX Runtime)
+INFERENCE_BACKEND = os.getenv("NEOBOT_BACKEND", "torch")
+INTRA_OP_THREADS = int(os.getenv("NEOBOT_INTRA_OP_THREADS", "0"))
 
-# Select the database and collection
-db = client['discord_bot_db']
-collection = db['roles']
+# Seconds spent in each startup stage: import, load, first_inference
+startup_timings = {}
 
+# Max prompts per forward pass; the default fits every prompt for one utterance in a single batch
+SEMANTIC_BATCH_SIZE = int(os.getenv("NEOBOT_BATCH_SIZE", "64"))
 
-# loads distilbert - this is the AI model that helps understand user text
-tokenizer = AutoTokenizer.from_pretrained("distilbert-base-uncased-finetuned-sst-2-english")
-model = AutoModelForSequenceClassification.from_pretrained("distilbert-base-uncased-finetuned-sst-2-english")
-intent_recognition_pipeline = pipeline("text-classification", model=model, tokenizer=tokenizer)
+# "pipeline" scores prompt pairs with the classifier, "embedding" uses the precomputed phrase index
+SEMANTIC_SCORER = os.getenv("NEOBOT_SCORER", "pipeline")
+EMBEDDING_CACHE_DIR = os.getenv("NEOBOT_CACHE_DIR", ".neobot_cache")
+embedding_index = None
 
-# In-memory data store for roles
-role_data_store = {}
+# Off-loop scoring for async callers: "process" (model preloaded in each worker), "thread" or "inline"
+INTENT_EXECUTOR = os.getenv("NEOBOT_INTENT_EXECUTOR", "process")
+INTENT_WORKERS = int(os.getenv("NEOBOT_INTENT_WORKERS", "2"))
+INTENT_TIMEOUT = float(os.getenv("NEOBOT_INTENT_TIMEOUT", "2.0"))
+intent_executor = None
 
-# Discord slash commands from the bot
-DISCORD_COMMANDS = {
-    "addroledata": {
-        "name": "addroledata",
-        "description": "Add or update GitHub repository and team information for a role",
-        "options": {
-            "role_name": {"type": "string", "required": True, "description": "Team Name (The role associated)"},
-            "github_repo": {"type": "string", "required": False, "description": "The GitHub repository URL or name"},
-            "github_usernames": {"type": "string", "required": False, "description": "Comma-separated list of GitHub usernames"},
-            "status": {"type": "string", "required": False, "description": "Current project status or milestone"}
-        }
-    },
-    "showroledata": {
-        "name": "showroledata",
-        "description": "Display GitHub repository and team information for a role",
-        "options": {
-            "role_name": {"type": "string", "required": True, "description": "The name of the role or team"}
-        }
-    },
-    "setstatus": {
-        "name": "setstatus",
-        "description": "Update the project status or milestone for a team",
-        "options": {
-            "role_name": {"type": "string", "required": True, "description": "The name of the role or team"},
-            "status": {"type": "string", "required": True, "description": "Current project status or milestone"}
-        }
-    }
-}
+# Where execute_discord_command keeps role data: "log" (append-only log + snapshot in NEOBOT_ROLE_STORE_PATH),
+# "mongo" (MONGODB_URI) or "memory"; NEOBOT_ROLE_STORE_FSYNC is "always", "interval" or "never"
+ROLE_STORE = os.getenv("NEOBOT_ROLE_STORE", "log")
+ROLE_STORE_PATH = os.getenv("NEOBOT_ROLE_STORE_PATH", os.path.join(EMBEDDING_CACHE_DIR, "roles"))
+ROLE_STORE_FSYNC = os.getenv("NEOBOT_ROLE_STORE_FSYNC", "interval")
+role_data_store = None
+_store_lock = threading.Lock()
 
 # Enhanced command mapping for natural language understanding
 command_mapping = {
@@ -120,74 +115,181 @@ command_mapping = {
     }
 }
 
+# Repeat phrasings skip scoring; set NEOBOT_FINALMODEL_INTENT_CACHE_PATH to keep the cache across restarts.
+# It has its own setting because bot.py saves a cache for a different command mapping to INTENT_CACHE_PATH.
+intent_cache = IntentCache(command_mapping, maxsize=int(os.getenv("INTENT_CACHE_SIZE", "512")),
+                           path=os.getenv("NEOBOT_FINALMODEL_INTENT_CACHE_PATH"))
+
+# String-only scorer used when the model is busy, with a fixed 0.5 in place of the model's context score.
+# Without semantic scores its range is lower: unrelated text tops out near 0.30, real commands start near 0.37.
+# So its 0.33 cutoff is deliberately below the model's NEURAL_THRESHOLD; the scores aren't comparable.
+cheap_matcher = IntentMatcher(command_mapping, context_score=0.5, threshold=0.33)
+# score_command answers only above this
+NEURAL_THRESHOLD = 0.4
+
 def calculate_string_similarity(str1, str2):
     """Calculate string similarity using SequenceMatcher"""
     return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
 
+def build_similarity_prompt(text1, text2):
+    """Build the prompt the transformer scores for a pair of texts"""
+    return f"Compare these two tasks: 1) {text1} 2) {text2}. Are they related to the same GitHub or project management operation?"
+
 def calculate_semantic_similarity(text1, text2, pipeline):
     """Calculate semantic similarity using the transformer model"""
-    context_prompt = f"Compare these two tasks: 1) {text1} 2) {text2}. Are they related to the same GitHub or project management operation?"
-    result = pipeline(context_prompt)[0]
-    return float(result["score"])
+    return calculate_semantic_similarities(text1, [text2], pipeline)[0]
+
+def calculate_semantic_similarities(text, candidates, pipeline, batch_size=None):
+    """Score text against every candidate in padded batches instead of one forward pass each"""
+    prompts = [build_similarity_prompt(text, candidate) for candidate in candidates]
+    start = time.perf_counter()
+    results = pipeline(prompts, batch_size=batch_size or SEMANTIC_BATCH_SIZE, truncation=True)
+    startup_timings.setdefault("first_inference", time.perf_counter() - start)
+    return [float(result["score"]) for result in results]
+
+def get_pipeline():
+    """Load the configured inference backend on first call; thread-safe"""
+    global tokenizer, model, intent_recognition_pipeline
+    if intent_recognition_pipeline is not None:
+        return intent_recognition_pipeline
+    with _model_lock:
+        if intent_recognition_pipeline is None:
+            from inference_backends import load_backend
+            backend = load_backend(INFERENCE_BACKEND, MODEL_NAME, intra_op_threads=INTRA_OP_THREADS,
+                                   cache_dir=EMBEDDING_CACHE_DIR, timings=startup_timings)
+            tokenizer, model = backend.tokenizer, backend.model
+            intent_recognition_pipeline = backend
+    return intent_recognition_pipeline
+
+def get_role_store():
+    """Open the role store on first call; thread-safe"""
+    global role_data_store
+    if role_data_store is not None:
+        return role_data_store
+    with _store_lock:
+        if role_data_store is None:
+            from role_store import open_role_store
+            store = open_role_store(ROLE_STORE, path=ROLE_STORE_PATH, fsync=ROLE_STORE_FSYNC,
+                                    fsync_interval=float(os.getenv("NEOBOT_ROLE_STORE_FSYNC_INTERVAL", "1.0")),
+                                    uri=os.getenv("MONGODB_URI"))
+            atexit.register(store.close)
+            role_data_store = store
+    return role_data_store
+
+def warm_up(background=True):
+    """Load the model and run one inference, optionally on a daemon thread"""
+    def run():
+        try:
+            calculate_semantic_similarity("warm up", "warm up", get_pipeline())
+        except Exception as e:
+            print(f"Model warm-up failed: {e}")
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def startup_report():
+    """Human-readable breakdown of import, load and first-inference time"""
+    lines = ["Startup timings:"]
+    for stage in ("import", "load", "first_inference"):
+        seconds = startup_timings.get(stage)
+        lines.append(f"  {stage}: {seconds:.3f}s" if seconds is not None else f"  {stage}: not yet run")
+    return "\n".join(lines)
+
+def get_embedding_index():
+    """Load (or build and persist) the phrase embedding index on first use"""
+    global embedding_index
+    if embedding_index is None:
+        from embedding_index import PhraseEmbeddingIndex
+        get_pipeline()
+        encoder = model
+        if encoder is None:
+            # The ONNX backend only exports logits, so encode phrases with the torch model
+            from transformers import AutoModel
+            encoder = AutoModel.from_pretrained(MODEL_NAME)
+        embedding_index = PhraseEmbeddingIndex(command_mapping, tokenizer, encoder, MODEL_NAME, cache_dir=EMBEDDING_CACHE_DIR)
+    return embedding_index
+
+def semantic_command_scores(user_input, mapping=None):
+    """Return {command_key: (context score, [example phrase scores])} using the configured scorer.
+
+    mapping defaults to this module's command_mapping; the embedding index only covers that one.
+    """
+    mapping = command_mapping if mapping is None else mapping
+    if SEMANTIC_SCORER == "embedding" and mapping is command_mapping:
+        return get_embedding_index().score(user_input)
+    # Score the context and every example phrase of every command in one batched call
+    candidates = []
+    for command_data in mapping.values():
+        candidates.append(command_data.get("context", ""))
+        candidates.extend(command_data["commands"])
+    semantic_scores = iter(calculate_semantic_similarities(user_input, candidates, get_pipeline()))
+    return {
+        command_key: (next(semantic_scores), [next(semantic_scores) for _ in command_data["commands"]])
+        for command_key, command_data in mapping.items()
+    }
+
+# Keyword sets for extract_command_args, built once instead of per call
+ROLE_KEYWORDS = ("role", "team", "project", "group", "leader")
+REPO_INDICATORS = ("github", "repo", "repository", "project")
+STATUS_KEYWORDS = ("status", "state", "progress", "milestone", "phase")
+USERNAME_INDICATORS = ("users", "usernames", "members", "contributors", "developers")
+STATUS_STOP = frozenset(REPO_INDICATORS + ROLE_KEYWORDS)
+USERNAME_STOP = STATUS_STOP | frozenset(STATUS_KEYWORDS)
+
+def _words_until(words, start, stop_words):
+    """Words from start up to (not including) the first stop word"""
+    end = start
+    while end < len(words) and words[end] not in stop_words:
+        end += 1
+    return words[start:end]
 
 def extract_command_args(user_input, command_name):
     """Extract arguments from user input based on command requirements."""
     args = {}
     command = DISCORD_COMMANDS.get(command_name, {})
     words = user_input.split()  # Case-sensitive handling removed
+    # First position of every word, so keyword lookups don't rescan the input
+    first_index = {}
+    for idx, word in enumerate(words):
+        first_index.setdefault(word, idx)
 
     # Extract role name (general roles + teams/groups)
-    role_keywords = ["role", "team", "project", "group", "leader"]
-    detected_role = None
-    for keyword in role_keywords:
-        if keyword in words:
-            idx = words.index(keyword)
-            if idx + 1 < len(words):
-                detected_role = words[idx + 1]
-                args["role_name"] = detected_role
-                break
+    for keyword in ROLE_KEYWORDS:
+        idx = first_index.get(keyword)
+        if idx is not None and idx + 1 < len(words):
+            args["role_name"] = words[idx + 1]
+            break
 
     # If role_name is missing, prompt the user
     if "role_name" not in args or not args["role_name"].strip():
         args["role_name"] = input("Please enter the role/team name: ").strip()
 
     # Extract GitHub repo (more robust URL detection)
-    repo_indicators = ["github", "repo", "repository", "project"]
-    detected_repo = None
-    for indicator in repo_indicators:
-        if indicator in words:
-            idx = words.index(indicator)
-            if idx + 1 < len(words):
-                potential_repo = words[idx + 1]
-                if "github.com" in potential_repo or "/" in potential_repo:
-                    detected_repo = potential_repo
-                    args["github_repo"] = detected_repo
-                    break
+    for indicator in REPO_INDICATORS:
+        idx = first_index.get(indicator)
+        if idx is not None and idx + 1 < len(words):
+            potential_repo = words[idx + 1]
+            if "github.com" in potential_repo or "/" in potential_repo:
+                args["github_repo"] = potential_repo
+                break
 
     # Extract status (supports multi-word statuses)
-    status_keywords = ["status", "state", "progress", "milestone", "phase"]
-    detected_status = []
-    for keyword in status_keywords:
-        if keyword in words:
-            idx = words.index(keyword)
-            current_idx = idx + 1
-            while current_idx < len(words) and words[current_idx] not in repo_indicators + role_keywords:
-                detected_status.append(words[current_idx])
-                current_idx += 1
+    for keyword in STATUS_KEYWORDS:
+        idx = first_index.get(keyword)
+        if idx is not None:
+            detected_status = _words_until(words, idx + 1, STATUS_STOP)
             if detected_status:
                 args["status"] = " ".join(detected_status)
                 break
 
     # Extract GitHub usernames (handles multiple names correctly)
-    username_indicators = ["users", "usernames", "members", "contributors", "developers"]
-    detected_users = []
-    for indicator in username_indicators:
-        if indicator in words:
-            idx = words.index(indicator)
-            current_idx = idx + 1
-            while current_idx < len(words) and words[current_idx] not in repo_indicators + role_keywords + status_keywords:
-                detected_users.append(words[current_idx])
-                current_idx += 1
+    for indicator in USERNAME_INDICATORS:
+        idx = first_index.get(indicator)
+        if idx is not None:
+            detected_users = _words_until(words, idx + 1, USERNAME_STOP)
             if detected_users:
                 args["github_usernames"] = ",".join(detected_users)
                 break
@@ -196,19 +298,19 @@ def extract_command_args(user_input, command_name):
 
 def execute_discord_command(command_name, args):
     """Execute the Discord command with extracted arguments"""
-    global role_data_store
+    store = get_role_store()
 
     if command_name == "addroledata":
         role_name = args.get("role_name")
         if not role_name:
             print("Role name is required.")
             return
-        if role_name not in role_data_store:
-            role_data_store[role_name] = {}
+        fields = {}
         if "github_repo" in args:
-            role_data_store[role_name]["github_repo"] = args["github_repo"]
+            fields["github_repo"] = args["github_repo"]
         if "github_usernames" in args:
-            role_data_store[role_name]["github_usernames"] = args["github_usernames"].split(",")
+            fields["github_usernames"] = args["github_usernames"].split(",")
+        store.update(role_name, fields)
         print(f"Role data for '{role_name}' has been updated.")
 
     elif command_name == "showroledata":
@@ -216,7 +318,7 @@ def execute_discord_command(command_name, args):
         if not role_name:
             print("Role name is required.")
             return
-        role_info = role_data_store.get(role_name)
+        role_info = store.get(role_name)
         if role_info:
             print(f"Data for role '{role_name}':")
             print(f"  GitHub Repo: {role_info.get('github_repo', 'N/A')}")
@@ -233,41 +335,118 @@ def execute_discord_command(command_name, args):
         if not status:
             print("Status is required.")
             return
-        if role_name not in role_data_store:
-            role_data_store[role_name] = {}
-        role_data_store[role_name]["status"] = status
+        store.update(role_name, {"status": status})
         print(f"Status for role '{role_name}' has been updated to '{status}'.")
 
 def get_best_command(user_input):
-    """Get the best matching command using enhanced matching logic"""
+    """Get the best matching command, reusing results for repeat phrasings"""
+    cached, best = intent_cache.get(user_input)
+    if cached:
+        return dict(best) if best else None
+    best = resolve_command(user_input)
+    intent_cache.put(user_input, dict(best) if best else None)
+    return best
+
+def cheap_score_command(user_input):
+    """Keyword and string similarity only, no model call"""
+    match = cheap_matcher.match(user_input)
+    return match_result(match) if match is not None else None
+
+def match_result(match):
+    """Result dict for an IntentMatch, shaped like score_command's"""
+    command_data = command_mapping[match.command]
+    return {
+        'command': match.command,
+        'score': match.score,
+        'description': command_data["description"],
+        'discord_command': command_data["discord_command"]
+    }
+
+def preload_worker(intra_op_threads=1):
+    """Intent executor initializer: load the model once per worker process"""
+    global INTRA_OP_THREADS
+    # Workers share the cores, so each one gets a small slice instead of torch's default of all of them
+    INTRA_OP_THREADS = intra_op_threads
+    if SEMANTIC_SCORER == "embedding":
+        get_embedding_index()
+    else:
+        warm_up(background=False)
+
+def get_intent_executor():
+    """Create the executor for get_best_command_async on first use"""
+    global intent_executor
+    if intent_executor is None:
+        from intent_executor import IntentExecutor
+        intent_executor = IntentExecutor(resolve_command, fallback=cheap_score_command, kind=INTENT_EXECUTOR,
+                                         max_workers=INTENT_WORKERS, timeout=INTENT_TIMEOUT,
+                                         initializer=preload_worker if INTENT_EXECUTOR == "process" else None,
+                                         initargs=(max(1, (os.cpu_count() or 1) // INTENT_WORKERS),))
+    return intent_executor
+
+async def get_best_command_async(user_input):
+    """get_best_command without blocking the event loop.
+
+    Scoring runs on the intent executor; if it is saturated or too slow the
+    string-only scorer answers instead, and that answer is not cached.
+    """
+    cached, best = intent_cache.get(user_input)
+    if cached:
+        return dict(best) if best else None
+    best, degraded = await get_intent_executor().run(user_input)
+    if not degraded:
+        intent_cache.put(user_input, dict(best) if best else None)
+    return best
+
+def resolve_command(user_input):
+    """Best command from the cascade: the string matcher when it is confident, the model otherwise"""
+    return intent_cascade.resolve(user_input)[0]
+
+def score_command(user_input, mapping=None):
+    """Get the best matching command using enhanced matching logic.
+
+    mapping defaults to this module's command_mapping; bot.py passes its own to use the model as its neural tier.
+    """
+    mapping = command_mapping if mapping is None else mapping
     command_scores = []
     user_words = set(user_input.lower().split())
 
-    for command_key, command_data in command_mapping.items():
+    semantic_scores = semantic_command_scores(user_input, mapping)
+
+    for command_key, command_data in mapping.items():
         keywords = set(command_data["keywords"])
         keyword_matches = len(keywords.intersection(user_words))
         keyword_score = keyword_matches / len(keywords) if keywords else 0
-        context_score = calculate_semantic_similarity(user_input, command_data["context"], intent_recognition_pipeline)
+        context_score, phrase_scores = semantic_scores[command_key]
         command_similarities = [
-            (0.3 * calculate_string_similarity(user_input, cmd)) + (0.7 * calculate_semantic_similarity(user_input, cmd, intent_recognition_pipeline))
-            for cmd in command_data["commands"]
+            (0.3 * calculate_string_similarity(user_input, cmd)) + (0.7 * phrase_score)
+            for cmd, phrase_score in zip(command_data["commands"], phrase_scores)
         ]
         command_score = max(command_similarities)
         final_score = (0.4 * keyword_score) + (0.3 * context_score) + (0.3 * command_score)
         command_scores.append({
             'command': command_key,
             'score': final_score,
-            'description': command_data["description"],
-            'discord_command': command_data["discord_command"]
+            'description': command_data.get("description"),
+            'discord_command': command_data.get("discord_command")
         })
     command_scores.sort(key=lambda x: x['score'], reverse=True)
-    return command_scores[0] if command_scores and command_scores[0]['score'] > 0.4 else None
+    return command_scores[0] if command_scores and command_scores[0]['score'] > NEURAL_THRESHOLD else None
+
+# Most utterances are settled by the string matcher; only close calls pay for a forward pass
+CASCADE_MARGIN = float(os.getenv("NEOBOT_CASCADE_MARGIN", "0.05"))
+intent_cascade = IntentCascade(cheap_matcher, neural=score_command, margin=CASCADE_MARGIN,
+                               accept=match_result)
 
 def simulate_user_input():
     """Simulate user input and command matching with Discord command execution"""
+    if SEMANTIC_SCORER == "embedding":
+        get_embedding_index()  # loads the cached matrix, or builds it on the very first run
+    elif os.getenv("NEOBOT_WARMUP", "1") == "1":
+        warm_up(background=True)
     print("\nWelcome to the Discord Bot Command Interface!")
     print("Type 'exit' to quit the program")
     print("Type 'help' to see available commands")
+    print("Type 'timings' to see model startup timings")
 
     while True:
         print("\nEnter your command (in plain English): ")
@@ -280,6 +459,9 @@ def simulate_user_input():
             for cmd, data in command_mapping.items():
                 print(f"- {cmd}: {data['description']}")
             continue
+        if user_input.lower() == 'timings':
+            print(startup_report())
+            continue
         if not user_input:
             print("Please enter a command.")
             continue
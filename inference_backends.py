@@ -0,0 +1,182 @@
+"""CPU inference backends for the intent classifier.
+
+Every backend is a callable with the same interface as a transformers
+text-classification pipeline: backend(texts, batch_size=..., truncation=True)
+returns one {"label", "score"} dict per text. Each one also exposes .tokenizer
+and .model (model is None for ONNX).
+
+Run `python inference_backends.py` to compare backends against the fp32 baseline.
+"""
+import os
+import sys
+import time
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+
+def _rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class OnnxTextClassifier:
+    """Pipeline-compatible wrapper around an ONNX Runtime session"""
+
+    def __init__(self, session, tokenizer, id2label):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.model = None
+        self.id2label = id2label
+        self.input_names = [i.name for i in session.get_inputs()]
+
+    def __call__(self, texts, batch_size=8, truncation=True, **kwargs):
+        import numpy as np
+
+        if isinstance(texts, str):
+            texts = [texts]
+        results = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(texts[start:start + batch_size], padding=True,
+                                     truncation=truncation, return_tensors="np")
+            feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            logits = self.session.run(None, feed)[0]
+            logits = logits - logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+            for row in probs:
+                best = int(row.argmax())
+                results.append({"label": self.id2label[best], "score": float(row[best])})
+        return results
+
+
+def _export_onnx(model_name, tokenizer, path):
+    """Export the fp32 model to path; the only time the ONNX backend needs torch"""
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    dummy = tokenizer(["export"], return_tensors="pt")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    torch.onnx.export(
+        model,
+        (dummy["input_ids"], dummy["attention_mask"]),
+        tmp_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=14,
+    )
+    # An interrupted export must not leave a truncated model for the next start to load
+    os.replace(tmp_path, path)
+
+
+def load_backend(name, model_name, intra_op_threads=0, cache_dir=".neobot_cache", timings=None):
+    """Build the named backend. intra_op_threads=0 keeps the library default.
+
+    If a timings dict is given, "import" and "load" seconds are recorded in it.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {', '.join(BACKENDS)}")
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    from transformers import AutoTokenizer
+    if name == "onnx":
+        import onnxruntime
+        from transformers import AutoConfig
+    else:
+        import torch
+        from transformers import AutoModelForSequenceClassification, pipeline
+    imported = time.perf_counter()
+    timings["import"] = imported - start
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if name == "onnx":
+        path = os.path.join(cache_dir, model_name.replace("/", "--") + ".onnx")
+        if not os.path.exists(path):
+            _export_onnx(model_name, tokenizer, path)
+        options = onnxruntime.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        # Only the label names are needed from the model, and the config has them without loading any weights
+        backend = OnnxTextClassifier(session, tokenizer, AutoConfig.from_pretrained(model_name).id2label)
+        timings["load"] = time.perf_counter() - imported
+        return backend
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    if name == "torch-int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    backend = pipeline("text-classification", model=model, tokenizer=tokenizer)
+    timings["load"] = time.perf_counter() - imported
+    return backend
+
+
+def compare_backends(prompts, model_name, backends=("torch-int8", "onnx"), intra_op_threads=0,
+                     cache_dir=".neobot_cache", batch_size=64, repeats=5):
+    """Report latency, memory and score drift of each backend against fp32 torch.
+
+    Returns one dict per backend, baseline first.
+    """
+    def measure(name):
+        rss_before = _rss_bytes()
+        backend = load_backend(name, model_name, intra_op_threads, cache_dir)
+        rss_after = _rss_bytes()
+        backend(prompts[:1], batch_size=1, truncation=True)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            results = backend(prompts, batch_size=batch_size, truncation=True)
+        latency = (time.perf_counter() - start) / repeats
+        return {"backend": name, "latency_ms": latency * 1000, "rss_delta_mb": (rss_after - rss_before) / 2**20}, results
+
+    baseline, baseline_results = measure("torch")
+    baseline.update(max_score_drift=0.0, mean_score_drift=0.0, label_agreement=1.0)
+    report = [baseline]
+    for name in backends:
+        row, results = measure(name)
+        drifts = []
+        agree = 0
+        for expected, actual in zip(baseline_results, results):
+            if expected["label"] == actual["label"]:
+                agree += 1
+                drifts.append(abs(expected["score"] - actual["score"]))
+            else:
+                # Binary classifier: compare probabilities of the same label
+                drifts.append(abs(expected["score"] - (1.0 - actual["score"])))
+        row.update(
+            max_score_drift=max(drifts),
+            mean_score_drift=sum(drifts) / len(drifts),
+            label_agreement=agree / len(results),
+        )
+        report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    import finalmodel
+
+    sample_inputs = ["add github repo for team echo", "show info for role design", "set status to completed"]
+    prompts = [
+        finalmodel.build_similarity_prompt(text, candidate)
+        for text in sample_inputs
+        for command_data in finalmodel.command_mapping.values()
+        for candidate in [command_data["context"]] + command_data["commands"]
+    ]
+    threads = int(os.getenv("NEOBOT_INTRA_OP_THREADS", "0"))
+    for row in compare_backends(prompts, finalmodel.MODEL_NAME, intra_op_threads=threads):
+        print(f"{row['backend']:<11} latency {row['latency_ms']:8.1f} ms/batch  "
+              f"rss +{row['rss_delta_mb']:7.1f} MB  drift max {row['max_score_drift']:.4f} "
+              f"mean {row['mean_score_drift']:.4f}  label agreement {row['label_agreement']:.1%}")
@@ -0,0 +1,137 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+URL_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?github\.com/\S+|https?://\S+", re.IGNORECASE)
+MENTION_PATTERN = re.compile(r"<[@#][!&]?\d+>")
+NUMBER_PATTERN = re.compile(r"\b\d+\b")
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+# Words that introduce a value (a role, team, member or status name) rather than describe the command
+ENTITY_KEYWORDS = frozenset({
+    "role", "team", "group", "project", "name", "member", "members", "user", "users", "person",
+    "contributors", "developers", "usernames", "status", "state", "milestone", "phase", "to", "for", "from",
+})
+
+
+def mapping_fingerprint(command_mapping):
+    return hashlib.sha256(json.dumps(command_mapping, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class IntentCache:
+    """LRU memo of intent results keyed on a normalised form of the utterance.
+
+    Normalisation case-folds, collapses whitespace and masks entity values, so
+    "add member Alice to role frontend" and "Add  member Bob to role backend"
+    share one entry. Values that are part of the command vocabulary are never
+    masked. Entries are dropped automatically when command_mapping changes.
+    """
+
+    def __init__(self, command_mapping, maxsize=512, path=None, check_interval=1.0):
+        self.command_mapping = command_mapping
+        self.maxsize = maxsize
+        self.path = path
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._reindex()
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def _reindex(self):
+        self.fingerprint = mapping_fingerprint(self.command_mapping)
+        vocabulary = set()
+        for command_data in self.command_mapping.values():
+            vocabulary.update(command_data.get("keywords", []))
+            for phrase in command_data.get("commands", []):
+                vocabulary.update(phrase.lower().split())
+        self.vocabulary = frozenset(vocabulary)
+        self._checked_at = time.monotonic()
+
+    def _check_mapping(self):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        old = self.fingerprint
+        self._reindex()
+        if self.fingerprint != old:
+            self._entries.clear()
+
+    def normalize(self, text):
+        text = URL_PATTERN.sub(" <url> ", text.casefold())
+        text = MENTION_PATTERN.sub(" <mention> ", text)
+        text = NUMBER_PATTERN.sub(" <num> ", text)
+        tokens = text.split()
+        masked = []
+        previous = None
+        for token in tokens:
+            word = WORD_PATTERN.fullmatch(token.strip(",.!?;:"))
+            if previous in ENTITY_KEYWORDS and word and word.group() not in self.vocabulary:
+                masked.append("<value>")
+            else:
+                masked.append(token)
+            previous = word.group() if word else None
+        return " ".join(masked)
+
+    def get(self, text):
+        """Return (found, value) for an utterance"""
+        key = self.normalize(text)
+        with self._lock:
+            self._check_mapping()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, text, value):
+        key = self.normalize(text)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+    def load(self):
+        """Load persisted entries; ignored if the file is missing or from another mapping"""
+        try:
+            with open(self.path, encoding="utf-8") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if data.get("fingerprint") != self.fingerprint:
+            return
+        with self._lock:
+            for key, value in data.get("entries", [])[-self.maxsize:]:
+                self._entries[key] = value
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"fingerprint": self.fingerprint, "entries": list(self._entries.items())}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(data, fp)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,188 @@
+import threading
+import time
+from difflib import SequenceMatcher
+
+
+class IntentMatch:
+    """Top intent for an utterance with its score breakdown"""
+
+    __slots__ = ("command", "score", "keyword_score", "context_score", "command_score", "phrase")
+
+    def __init__(self, command, score, keyword_score, context_score, command_score, phrase):
+        self.command = command
+        self.score = score
+        self.keyword_score = keyword_score
+        self.context_score = context_score
+        self.command_score = command_score
+        self.phrase = phrase
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"IntentMatch({self.command!r}, score={self.score:.4f})"
+
+
+class _CompiledIntent:
+    __slots__ = ("order", "command", "keywords", "keyword_count", "phrases", "matchers", "lengths")
+
+    def __init__(self, order, command, command_data):
+        self.order = order
+        self.command = command
+        self.keywords = frozenset(command_data.get("keywords", ()))
+        self.keyword_count = len(self.keywords)
+        self.phrases = tuple(command_data.get("commands", ()))
+        # SequenceMatcher caches its analysis of the second sequence, so build one per phrase up front
+        self.matchers = tuple(SequenceMatcher(None, "", phrase.lower()) for phrase in self.phrases)
+        self.lengths = tuple(len(phrase) for phrase in self.phrases)
+
+
+class IntentMatcher:
+    """Keyword + fuzzy-phrase intent scorer compiled once from a command mapping.
+
+    Scores are identical to the original per-call loop:
+    keyword_weight * keyword overlap + context_weight * context_score
+    + command_weight * best SequenceMatcher ratio against the example phrases.
+    Ties go to the command listed first in the mapping. An inverted keyword
+    index and score upper bounds skip intents and phrases that cannot win.
+    The prebuilt SequenceMatchers are shared state, so top() holds a lock and
+    the matcher is safe to call from executor threads.
+    """
+
+    def __init__(self, command_mapping, keyword_weight=0.4, context_weight=0.3, command_weight=0.3,
+                 context_score=0.5, threshold=0.1):
+        self.keyword_weight = keyword_weight
+        self.context_weight = context_weight
+        self.command_weight = command_weight
+        self.context_score = context_score
+        self.threshold = threshold
+        self.intents = tuple(_CompiledIntent(order, command, data)
+                             for order, (command, data) in enumerate(command_mapping.items()))
+        self.keyword_index = {}
+        for intent in self.intents:
+            for keyword in intent.keywords:
+                self.keyword_index.setdefault(keyword, []).append(intent)
+        self._lock = threading.Lock()
+
+    def _score(self, keyword_score, command_score):
+        return (self.keyword_weight * keyword_score) + (self.context_weight * self.context_score) + (self.command_weight * command_score)
+
+    def top(self, text, k=1):
+        """Return the k best IntentMatch objects, best first (no threshold applied)"""
+        with self._lock:
+            return self._top(text, k)
+
+    def _top(self, text, k):
+        lowered = text.lower()
+        hits = {}
+        for word in set(lowered.split()):
+            for intent in self.keyword_index.get(word, ()):
+                hits[intent] = hits.get(intent, 0) + 1
+
+        # Bound each intent's score using the length-only bound on SequenceMatcher.ratio()
+        size = len(lowered)
+        candidates = []
+        for intent in self.intents:
+            keyword_score = hits.get(intent, 0) / intent.keyword_count if intent.keyword_count else 0
+            ratio_bound = max((2.0 * min(size, length) / (size + length) if size + length else 1.0
+                               for length in intent.lengths), default=0)
+            candidates.append((self._score(keyword_score, ratio_bound), keyword_score, intent))
+        candidates.sort(key=lambda c: (-c[0], c[2].order))
+
+        best = []  # (match, order) sorted by score desc then mapping order, at most k entries
+        for upper_bound, keyword_score, intent in candidates:
+            if len(best) == k:
+                worst, worst_order = best[-1]
+                if upper_bound < worst.score or (upper_bound == worst.score and intent.order > worst_order):
+                    break
+            command_score = 0
+            best_phrase = None
+            for phrase, matcher in zip(intent.phrases, intent.matchers):
+                matcher.set_seq1(lowered)
+                if matcher.real_quick_ratio() <= command_score or matcher.quick_ratio() <= command_score:
+                    continue
+                ratio = matcher.ratio()
+                if ratio > command_score or best_phrase is None:
+                    command_score = ratio
+                    best_phrase = phrase
+            if best_phrase is None and intent.phrases:
+                best_phrase = intent.phrases[0]
+            match = IntentMatch(intent.command, self._score(keyword_score, command_score), keyword_score,
+                                self.context_score, command_score, best_phrase)
+            best.append((match, intent.order))
+            best.sort(key=lambda entry: (-entry[0].score, entry[1]))
+            del best[k:]
+        return [match for match, _ in best]
+
+    def match(self, text):
+        """Return the best IntentMatch, or None if it does not clear the threshold"""
+        ranked = self.top(text, 1)
+        if ranked and ranked[0].score > self.threshold:
+            return ranked[0]
+        return None
+
+
+
+class IntentCascade:
+    """Cheap matcher first, neural scorer only for ambiguous utterances.
+
+    The matcher's answer is accepted when its top score clears the matcher's
+    threshold and leads the runner-up by at least margin. Anything else is
+    escalated to neural(text), whose result is returned as is. accept(match)
+    turns an accepted IntentMatch into the same shape neural returns. Without
+    a neural scorer the cascade is just the matcher, with the same stats.
+
+    The two tiers keep their own thresholds, since their scores are on
+    different scales. stats() estimates the time saved as if every accepted
+    utterance had gone to neural at its mean latency, less the time spent in
+    the matcher for every utterance; it is None until something has been
+    escalated.
+    """
+
+    def __init__(self, matcher, neural=None, accept=IntentMatch.as_dict, margin=0.05):
+        self.matcher = matcher
+        self.neural = neural
+        self.accept = accept
+        self.margin = margin
+        self.accepted = 0
+        self.escalated = 0
+        self.cheap_seconds = 0.0
+        self.neural_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def resolve(self, text):
+        """Return (result or None, tier), where tier is "cheap" or "neural"."""
+        start = time.perf_counter()
+        ranked = self.matcher.top(text, 2)
+        cheap_done = time.perf_counter()
+        best = ranked[0] if ranked else None
+        runner_up = ranked[1].score if len(ranked) > 1 else 0.0
+        confident = best is not None and best.score > self.matcher.threshold and best.score - runner_up >= self.margin
+        if confident or self.neural is None:
+            with self._lock:
+                self.accepted += 1
+                self.cheap_seconds += cheap_done - start
+            return (self.accept(best) if best is not None and best.score > self.matcher.threshold else None), "cheap"
+        result = self.neural(text)
+        with self._lock:
+            self.escalated += 1
+            self.cheap_seconds += cheap_done - start
+            self.neural_seconds += time.perf_counter() - cheap_done
+        return result, "neural"
+
+    def stats(self):
+        with self._lock:
+            total = self.accepted + self.escalated
+            mean_cheap = self.cheap_seconds / total if total else 0.0
+            mean_neural = self.neural_seconds / self.escalated if self.escalated else 0.0
+            saved = self.accepted * mean_neural - self.cheap_seconds if self.escalated else None
+            return {
+                "resolved": total,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / total if total else 0.0,
+                "cheap_seconds": self.cheap_seconds,
+                "neural_seconds": self.neural_seconds,
+                "mean_cheap_ms": mean_cheap * 1000,
+                "mean_neural_ms": mean_neural * 1000,
+                "saved_seconds": saved,
+            }
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+EXECUTOR_KINDS = ("thread", "process", "inline")
+
+logger = logging.getLogger(__name__)
+
+
+def _initialize_worker(initializer, initargs, ready):
+    """Worker initializer: run the real one, then report the worker ready, even if it failed"""
+    try:
+        initializer(*initargs)
+    finally:
+        ready.put(None)
+
+
+def _start_worker():
+    pass
+
+
+class IntentExecutor:
+    """Runs a CPU-bound intent scoring function off the event loop.
+
+    kind is "thread", "process" or "inline" (run on the calling thread, for
+    tests and benchmarks). In a process pool, score must be a module-level
+    function, and initializer runs once per worker, so it is the place to load
+    a model. When max_pending calls are already in flight, a call takes longer
+    than timeout seconds, or the scorer raises, run() answers with the
+    fallback scorer on the loop instead. A timed-out call still finishes in its
+    worker and counts as pending until it does. The first call starts the
+    workers; until every one has run its initializer, a call waits for them for
+    at most timeout seconds and then gets the fallback. Await warm_up() at
+    startup to load them before the first call.
+    """
+
+    def __init__(self, score, fallback=None, kind="thread", max_workers=1, max_pending=None, timeout=2.0,
+                 initializer=None, initargs=()):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind {kind!r}; expected one of {', '.join(EXECUTOR_KINDS)}")
+        self.score = score
+        self.fallback = fallback
+        self.kind = kind
+        self.max_pending = max_pending if max_pending is not None else max_workers * 2
+        self.timeout = timeout
+        self.pending = 0
+        self.completed = 0
+        self.fallbacks = {"saturated": 0, "warming": 0, "timeout": 0, "error": 0}
+        self.total_seconds = 0.0
+        self.max_workers = max_workers
+        self.warm = initializer is None or kind == "inline"
+        self._ready = None
+        self._warming = None
+        if not self.warm:
+            self._ready = multiprocessing.get_context("spawn").SimpleQueue() if kind == "process" else queue.SimpleQueue()
+            initializer, initargs = _initialize_worker, (initializer, initargs, self._ready)
+        if kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="intent",
+                                                initializer=initializer, initargs=initargs)
+        elif kind == "process":
+            # spawn, not fork: forking after torch has started its thread pools can deadlock the child
+            self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=initializer, initargs=initargs)
+        else:
+            self._executor = None
+            if initializer is not None:
+                initializer(*initargs)
+
+    def _done(self, future):
+        self.pending -= 1
+
+    async def warm_up(self):
+        """Start every worker and wait until each has run its initializer, however long loading takes"""
+        if self.warm:
+            return
+        await asyncio.shield(self._start_warming())
+
+    def _start_warming(self):
+        if self._warming is None:
+            self._warming = asyncio.ensure_future(self._start_workers())
+        return self._warming
+
+    async def _start_workers(self):
+        start = time.perf_counter()
+        # The pool starts a new worker for each call made while none is idle, up to max_workers
+        started = [self._executor.submit(_start_worker) for _ in range(self.max_workers)]
+        ready = 0
+        while ready < self.max_workers:
+            while not self._ready.empty():
+                self._ready.get()
+                ready += 1
+            if any(future.done() and future.exception() is not None for future in started):
+                # A broken pool; run() reports its calls as errors and answers with the fallback
+                logger.error("Intent executor workers failed to start")
+                break
+            await asyncio.sleep(0.05)
+        self.warm = True
+        logger.info("Intent executor warmed up %d %s workers in %.1fs", self.max_workers, self.kind,
+                    time.perf_counter() - start)
+
+    async def run(self, text):
+        """Score text. Returns (result, degraded); degraded is True if the fallback scorer answered.
+
+        Without a fallback, saturation, warm-up and timeouts raise asyncio.TimeoutError and scorer errors propagate.
+        """
+        start = time.perf_counter()
+        timeout = self.timeout
+        if not self.warm:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._start_warming()), timeout)
+            except asyncio.TimeoutError:
+                # Workers still loading the model; warm-up carries on in the background
+                self.fallbacks["warming"] += 1
+                if self.fallback is None:
+                    raise
+                return self.fallback(text), True
+            timeout -= time.perf_counter() - start
+        if self._executor is None:
+            result = self.score(text)
+            self.completed += 1
+            self.total_seconds += time.perf_counter() - start
+            return result, False
+        if self.pending >= self.max_pending:
+            self.fallbacks["saturated"] += 1
+            if self.fallback is None:
+                raise asyncio.TimeoutError(f"{self.pending} intent scoring calls already pending")
+            return self.fallback(text), True
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self.score, text)
+        except RuntimeError as e:
+            # A broken pool (a worker died or its initializer raised) or one that is shutting down
+            self.fallbacks["error"] += 1
+            if self.fallback is None:
+                raise
+            logger.error("Intent executor can't take calls, using the fallback scorer: %s", e)
+            return self.fallback(text), True
+        self.pending += 1
+        future.add_done_callback(self._done)
+        try:
+            # shield: cancelling the future on timeout would drop it from pending while its worker is still busy
+            result = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.fallbacks["timeout"] += 1
+            if self.fallback is None:
+                raise
+            return self.fallback(text), True
+        except Exception as e:
+            self.fallbacks["error"] += 1
+            if self.fallback is None:
+                raise
+            logger.exception("Intent scoring failed, using the fallback scorer: %s", e)
+            return self.fallback(text), True
+        self.completed += 1
+        self.total_seconds += time.perf_counter() - start
+        return result, False
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "warm": self.warm,
+            "pending": self.pending,
+            "completed": self.completed,
+            "mean_ms": self.total_seconds / self.completed * 1000 if self.completed else 0.0,
+            "fallbacks": dict(self.fallbacks),
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,456 @@
+"""Offline load test: simulated users drive !cmd end to end, prompts included.
+
+    python loadtest.py --users 200 --duration 30
+    python loadtest.py --users 50 --mongo-uri mongodb://localhost:27017/   # local mongod instead of the stand-in
+    python loadtest.py --respect-limits --output run.json
+
+Commands go through the real handle_natural_command and ask_user with fake
+discord.py Context/Message objects, and the repository runs against an
+in-process collection (or a scratch database on a local mongod). Nothing
+talks to Discord.
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from bench import NAMES, ROLES, STATUSES, TEAMS, add_typo, percentile
+
+# (weight, first message); the bare commands leave every argument for the bot to prompt for
+SCENARIOS = [
+    (20, "show info for role {role}"),
+    (15, "set status {status} for role {role}"),
+    (15, "add member {name} to role {role}"),
+    (10, "remove member {name} from role {role}"),
+    (10, "add team {team} for role {role} with repo github.com/org/{role}"),
+    (10, "show info"),
+    (8, "add team"),
+    (7, "update repo"),
+    (5, "set status"),
+]
+
+
+# --- In-process MongoDB stand-in -------------------------------------------------------------
+
+class _Result:
+    def __init__(self, **counts):
+        self.__dict__.update(counts)
+
+
+def _matches(document, query):
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$exists" in condition and (field in document) != condition["$exists"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _apply(document, update, inserting):
+    for field, value in update.get("$set", {}).items():
+        document[field] = value
+    if inserting:
+        for field, value in update.get("$setOnInsert", {}).items():
+            document[field] = value
+    for field, spec in update.get("$addToSet", {}).items():
+        values = document.setdefault(field, [])
+        for value in spec["$each"] if isinstance(spec, dict) else [spec]:
+            if value not in values:
+                values.append(value)
+    for field, removed in update.get("$pullAll", {}).items():
+        document[field] = [value for value in document.get(field, []) if value not in removed]
+
+
+class FakeCollection:
+    """Just enough of pymongo's Collection for RoleRepository and role_io.
+
+    Thread-safe, enforces the unique (guild_id, role) index, and sleeps latency
+    seconds per call to stand in for the network round trip.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.documents = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _find(self, query):
+        if "guild_id" in query and "role" in query and not isinstance(query["role"], dict):
+            document = self.documents.get((query["guild_id"], query["role"]))
+            return [document] if document is not None and _matches(document, query) else []
+        return [document for document in self.documents.values() if _matches(document, query)]
+
+    def _check_key(self, document, old_key):
+        key = (document.get("guild_id"), document.get("role"))
+        if key != old_key and key in self.documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error: {key}")
+        return key
+
+    def _update(self, query, update, upsert):
+        found = self._find(query)
+        if found:
+            document = found[0]
+            old_key = (document.get("guild_id"), document.get("role"))
+            updated = copy.deepcopy(document)
+            _apply(updated, update, inserting=False)
+            key = self._check_key(updated, old_key)
+            del self.documents[old_key]
+            self.documents[key] = updated
+            return document, updated, None
+        if not upsert:
+            return None, None, None
+        document = {field: value for field, value in query.items() if not isinstance(value, dict)}
+        _apply(document, update, inserting=True)
+        document["_id"] = ObjectId()
+        self.documents[self._check_key(document, None)] = document
+        return None, document, document["_id"]
+
+    def find_one(self, query):
+        self._wait()
+        with self._lock:
+            found = self._find(query)
+            return copy.deepcopy(found[0]) if found else None
+
+    def find(self, query, projection=None, batch_size=None):
+        self._wait()
+        with self._lock:
+            found = copy.deepcopy(self._find(query))
+        if projection:
+            keep = {field for field, include in projection.items() if include}
+            found = [{field: value for field, value in document.items() if field in keep} for document in found]
+        return iter(found)
+
+    def update_one(self, query, update, upsert=False):
+        self._wait()
+        with self._lock:
+            before, _, upserted_id = self._update(query, update, upsert)
+        return _Result(matched_count=int(before is not None), upserted_id=upserted_id)
+
+    def find_one_and_update(self, query, update, return_document=False):
+        self._wait()
+        with self._lock:
+            before, after, _ = self._update(query, update, upsert=False)
+        return copy.deepcopy(after if return_document else before)
+
+    def find_one_and_delete(self, query):
+        self._wait()
+        with self._lock:
+            found = self._find(query)
+            if not found:
+                return None
+            return self.documents.pop((found[0].get("guild_id"), found[0].get("role")))
+
+    def update_many(self, query, update):
+        with self._lock:
+            found = self._find(query)
+            for document in found:
+                _apply(document, update, inserting=False)
+        return _Result(modified_count=len(found))
+
+    def count_documents(self, query):
+        with self._lock:
+            return len(self._find(query))
+
+    def bulk_write(self, operations, ordered=True):
+        self._wait()
+        counts = {"upserted_count": 0, "modified_count": 0, "deleted_count": 0}
+        with self._lock:
+            for operation in operations:
+                if isinstance(operation, DeleteOne):
+                    found = self._find(operation._filter)
+                    if found:
+                        del self.documents[(found[0].get("guild_id"), found[0].get("role"))]
+                        counts["deleted_count"] += 1
+                elif isinstance(operation, UpdateOne):
+                    before, _, upserted_id = self._update(operation._filter, operation._doc, operation._upsert)
+                    counts["upserted_count" if upserted_id is not None else "modified_count"] += int(
+                        before is not None or upserted_id is not None)
+        return _Result(**counts)
+
+    def create_index(self, keys, unique=False, name=None):
+        return name
+
+    def index_information(self):
+        return {"_id_": {}, "guild_id_1_role_1": {"unique": True}}
+
+    def drop_index(self, name):
+        pass
+
+
+# --- Fake discord.py objects -----------------------------------------------------------------
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    filesize_limit = 8 * 1024 * 1024
+
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+
+
+class FakeMessage:
+    def __init__(self, content, author, channel):
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.attachments = []
+
+
+class FakeContext:
+    """What handle_natural_command sees as ctx; send is one Discord API call"""
+
+    def __init__(self, user, message):
+        self.user = user
+        self.message = message
+        self.author = message.author
+        self.channel = message.channel
+        self.guild = message.guild
+
+    async def send(self, content, **kwargs):
+        self.user.stats["payloads"] += 1
+        # discord.py returns the sent message
+        return FakeMessage(content, FakeUser(0), self.channel)
+
+
+def observe_replies(bot_module):
+    """Hand every reply to the user it was meant for once it is actually sent.
+
+    The outbound queue may merge replies for several users into one channel
+    message, which real users would all read; hooking the queue keeps each
+    simulated user's view of its own prompts exact.
+    """
+    queue = bot_module.outbound_queue
+    send = queue.send
+
+    async def observed_send(destination, content, **kwargs):
+        message = await send(destination, content, **kwargs)
+        destination.user.on_bot_message(content)
+        return message
+
+    queue.send = observed_send
+
+
+# --- Simulated users -------------------------------------------------------------------------
+
+class SimulatedUser:
+    """Sends commands in a loop and answers the bot's prompts after a think time"""
+
+    def __init__(self, bot_module, user_id, channel, roles, think_time, rng, stats):
+        self.bot = bot_module
+        self.author = FakeUser(user_id)
+        self.channel = channel
+        self.roles = roles
+        self.think_time = think_time
+        self.rng = rng
+        self.stats = stats
+        self.sent_at = None
+
+    def on_bot_message(self, content):
+        now = time.perf_counter()
+        if self.sent_at is not None:
+            # Response latency: from the user's last message to the bot's next reply
+            self.stats["response"].append(now - self.sent_at)
+            self.sent_at = None
+        self.stats["bot_messages"] += 1
+        if content.rstrip().endswith(")") and "?" in content:
+            asyncio.get_running_loop().create_task(self.answer(content))
+
+    def answer_for(self, question):
+        if "GitHub repo" in question:
+            return f"https://github.com/org/{self.rng.choice(TEAMS)}"
+        if "status" in question and question.startswith("What"):
+            return self.rng.choice(STATUSES)
+        if "team name" in question:
+            return self.rng.choice(TEAMS).capitalize()
+        if question.startswith("Who"):
+            return self.rng.choice(NAMES).capitalize()
+        if "new role name" in question:
+            return f"{self.rng.choice(ROLES)}-{self.rng.randrange(1000)}"
+        return self.rng.choice(self.roles)
+
+    async def answer(self, question):
+        await asyncio.sleep(self.rng.expovariate(1 / self.think_time) if self.think_time else 0)
+        self.stats["replies"] += 1
+        self.sent_at = time.perf_counter()
+        self.bot.conversations.dispatch(FakeMessage(self.answer_for(question), self.author, self.channel))
+
+    def next_command(self):
+        template = self.rng.choices([template for _, template in SCENARIOS], [weight for weight, _ in SCENARIOS])[0]
+        text = template.format(role=self.rng.choice(self.roles), status=self.rng.choice(STATUSES),
+                               name=self.rng.choice(NAMES).capitalize(), team=self.rng.choice(TEAMS).capitalize())
+        return add_typo(text, self.rng) if self.rng.random() < 0.2 else text
+
+    async def run(self, deadline):
+        callback = self.bot.handle_natural_command.callback
+        while time.perf_counter() < deadline:
+            text = self.next_command()
+            ctx = FakeContext(self, FakeMessage("!cmd " + text, self.author, self.channel))
+            start = self.sent_at = time.perf_counter()
+            await callback(ctx, message=text)
+            self.stats["commands"].append(time.perf_counter() - start)
+            await asyncio.sleep(self.rng.expovariate(1 / self.think_time) if self.think_time else 0)
+
+
+async def monitor_loop_lag(interval, samples, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {"count": len(ordered), "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "p50_ms": percentile(ordered, 0.50) * 1000, "p95_ms": percentile(ordered, 0.95) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000, "max_ms": ordered[-1] * 1000}
+
+
+async def run_load(bot_module, args):
+    rng = random.Random(args.seed)
+    guilds = [FakeGuild(1000 + index) for index in range(args.guilds)]
+    channels = [FakeChannel(2000 + index, guilds[index % len(guilds)]) for index in range(args.channels)]
+    roles = [f"{role}{index}" for role, index in itertools.product(ROLES, range(args.roles_per_kind))]
+    for guild in guilds:
+        for role in roles:
+            await bot_module.roles_repo.create_team({"guild_id": guild.id, "role": role, "team_name": rng.choice(TEAMS),
+                                                     "project_repo": f"https://github.com/org/{role}",
+                                                     "team_members": [], "status": "Not started"})
+
+    stats = {"commands": [], "response": [], "replies": 0, "bot_messages": 0, "payloads": 0}
+    observe_replies(bot_module)
+    users = [SimulatedUser(bot_module, 5000 + index, channels[index % len(channels)], roles, args.think_time,
+                           random.Random(rng.random()), stats) for index in range(args.users)]
+    lag_samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(0.01, lag_samples, stop))
+    outcomes_before = bot_module.metrics.summary()["outcomes"]
+    start = time.perf_counter()
+    # Stagger arrivals over the first second so the run doesn't open with one synchronized burst
+    deadline = start + args.duration
+
+    async def arrive(user, delay):
+        await asyncio.sleep(delay)
+        await user.run(deadline)
+
+    await asyncio.gather(*(arrive(user, rng.random()) for user in users))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    outcomes = {outcome: count - outcomes_before.get(outcome, 0)
+                for outcome, count in bot_module.metrics.summary()["outcomes"].items()}
+    return {
+        "users": args.users,
+        "channels": args.channels,
+        "guilds": args.guilds,
+        "seconds": elapsed,
+        "commands": len(stats["commands"]),
+        "commands_per_sec": len(stats["commands"]) / elapsed,
+        "prompt_replies": stats["replies"],
+        "bot_messages": stats["bot_messages"],
+        "discord_sends": stats["payloads"],
+        "outcomes": outcomes,
+        "command_latency": summarize(stats["commands"]),
+        "response_latency": summarize(stats["response"]),
+        "loop_lag": summarize(lag_samples),
+        "admission": bot_module.admission.stats(),
+        "intent_cascade": bot_module.intent_cascade.stats(),
+    }
+
+
+def print_report(report):
+    print(f"{report['users']} users, {report['channels']} channels, {report['guilds']} guilds, {report['seconds']:.1f}s")
+    print(f"commands: {report['commands']} ({report['commands_per_sec']:.1f}/s), prompt replies: {report['prompt_replies']}, "
+          f"bot messages: {report['bot_messages']} in {report['discord_sends']} Discord sends")
+    print("outcomes: " + ", ".join(f"{outcome} {count}" for outcome, count in sorted(report["outcomes"].items()) if count))
+    for name in ("command_latency", "response_latency", "loop_lag"):
+        row = report[name]
+        if row["count"]:
+            print(f"{name:<17} p50 {row['p50_ms']:8.2f} ms  p95 {row['p95_ms']:8.2f} ms  "
+                  f"p99 {row['p99_ms']:8.2f} ms  max {row['max_ms']:8.2f} ms")
+    print("(command latency includes the users' think time on prompts; response latency is message to next reply)")
+    admission = report["admission"]
+    print(f"admission: peak queue {admission['peak_queued']}, mean wait {admission['mean_wait_ms']:.2f} ms, "
+          f"{admission['rate_limited']} rate limited, {admission['shed']} shed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay synthetic Discord traffic through handle_natural_command")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--guilds", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to keep issuing commands")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds a user waits before typing")
+    parser.add_argument("--roles-per-kind", type=int, default=5, help="seeded roles per role name in each guild")
+    parser.add_argument("--mongo-latency", type=float, default=0.002, help="stand-in round trip in seconds")
+    parser.add_argument("--mongo-uri", help="use a scratch database on this mongod instead of the stand-in")
+    parser.add_argument("--respect-limits", action="store_true",
+                        help="keep the per-user/channel rate limits (by default they are lifted to measure capacity)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("NEOBOT_LOG_LEVEL", "WARNING")
+    if not args.respect_limits:
+        for name in ("CMD_USER_RATE", "CMD_CHANNEL_RATE", "CMD_USER_BURST", "CMD_CHANNEL_BURST"):
+            os.environ.setdefault(name, "1000000")
+    import bot
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri, serverSelectionTimeoutMS=5000)
+        database = f"neobot_loadtest_{os.getpid()}"
+        collection = client[database]["roles"]
+    else:
+        collection = FakeCollection(latency=args.mongo_latency)
+    bot.setup_database(collection)
+    try:
+        report = asyncio.run(run_load(bot, args))
+    finally:
+        bot.roles_repo.close()
+        if args.mongo_uri:
+            client.drop_database(database)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING,
+          "ERROR": logging.ERROR, "CRITICAL": logging.CRITICAL}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line. Extra structured fields go in extra={"data": {...}}."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data:
+            entry.update(data)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock handler merges msg % args before enqueueing, which would put the
+    formatting cost back on the event loop.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class Sampler:
+    """True once every `every` calls; use to thin out hot-path log events.
+
+        if logger.isEnabledFor(logging.DEBUG) and sampler():
+            logger.debug(...)
+    """
+
+    def __init__(self, every):
+        self.every = max(1, int(every))
+        self._counter = itertools.count()
+
+    def __call__(self):
+        return next(self._counter) % self.every == 0
+
+
+def parse_levels(spec):
+    """Parse "bot=DEBUG,role_cache=WARNING" into {logger name: level}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = LEVELS[level.strip().upper()]
+    return levels
+
+
+def configure_logging(level=None, module_levels=None, stream=None):
+    """Route all logging through a queue to a background JSON-lines writer.
+
+    level defaults to NEOBOT_LOG_LEVEL (INFO); module_levels defaults to
+    NEOBOT_LOG_LEVELS, e.g. "bot=DEBUG,intent_engine=WARNING". Safe to call twice.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = level or os.getenv("NEOBOT_LOG_LEVEL", "INFO")
+    if module_levels is None:
+        module_levels = parse_levels(os.getenv("NEOBOT_LOG_LEVELS", ""))
+
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root = logging.getLogger()
+    root.handlers[:] = [DeferredQueueHandler(records)]
+    root.setLevel(LEVELS[level.upper()] if isinstance(level, str) else level)
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
+    # discord.py's gateway chatter stays at INFO unless asked for explicitly
+    if "discord" not in module_levels:
+        logging.getLogger("discord").setLevel(max(root.level, logging.INFO))
+
+
+def set_level(level, module=None):
+    """Change a logger's level at runtime (the root logger if module is None)"""
+    logging.getLogger(module).setLevel(LEVELS[level.upper()])
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
@@ -0,0 +1,261 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time; the callback returns {labelvalues: value}"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, labelnames, function):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for labelvalues, value in sorted(self.function().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class CallbackCounter(Gauge):
+    """Counter read from a callback at scrape time, for running totals another object already keeps"""
+
+    metric_type = "counter"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}  # labelvalues -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labelvalues)
+            if series is None:
+                series = self.series[labelvalues] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {labelvalues: list(series) for labelvalues, series in self.series.items()}
+
+    def quantile(self, series, q):
+        """Estimate a quantile from bucket counts (upper bound of the matching bucket)"""
+        total = sum(series[:-1])
+        if not total:
+            return 0.0
+        target = q * total
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, series in sorted(self.snapshot().items()):
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                running += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, [('le', le)])} {running}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames, function):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def callback_counter(self, name, documentation, labelnames, function):
+        return self.register(CallbackCounter(name, documentation, labelnames, function))
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+COMMANDS = REGISTRY.counter("neobot_commands_total", "Natural-language commands handled", ("intent", "outcome"))
+COMMAND_SECONDS = REGISTRY.histogram("neobot_command_seconds", "End-to-end !cmd latency", ("intent", "outcome"))
+STAGE_SECONDS = REGISTRY.histogram("neobot_stage_seconds", "Time spent in each !cmd stage", ("stage", "intent"))
+OUTBOUND_WAIT_SECONDS = REGISTRY.histogram("neobot_outbound_wait_seconds", "Time messages wait in the outbound queue",
+                                           ("priority",))
+
+# Outcomes used by the handlers
+SUCCESS = "success"
+NOT_FOUND = "not_found"
+TIMEOUT = "timeout"
+VALIDATION_FAILURE = "validation_failure"
+DUPLICATE = "duplicate"
+UNRECOGNIZED = "unrecognized"
+UNAVAILABLE = "unavailable"
+CANCELLED = "cancelled"
+BUSY = "busy"
+RATE_LIMITED = "rate_limited"
+ERROR = "error"
+
+
+class CommandTrace:
+    __slots__ = ("intent", "outcome", "start")
+
+    def __init__(self):
+        self.intent = "unknown"
+        self.outcome = None
+        self.start = time.perf_counter()
+
+
+_current_trace = contextvars.ContextVar("neobot_command_trace", default=None)
+
+
+def begin_command():
+    """Start timing a command; stages and outcomes recorded in this task attach to it"""
+    trace = CommandTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def set_intent(intent):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.intent = intent
+
+
+def set_outcome(outcome):
+    """Record why the command ended; the first outcome set wins"""
+    trace = _current_trace.get()
+    if trace is not None and trace.outcome is None:
+        trace.outcome = outcome
+
+
+def finish_command(trace, default_outcome=SUCCESS):
+    if trace.outcome is None:
+        trace.outcome = default_outcome
+    COMMANDS.inc(trace.intent, trace.outcome)
+    COMMAND_SECONDS.observe(time.perf_counter() - trace.start, trace.intent, trace.outcome)
+
+
+def observe_stage(stage, seconds):
+    trace = _current_trace.get()
+    STAGE_SECONDS.observe(seconds, stage, trace.intent if trace is not None else "none")
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current command"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def summary():
+    """Plain dict of command outcomes and per-stage latency, for the !stats command"""
+    outcomes = {}
+    with COMMANDS._lock:
+        for (intent, outcome), count in COMMANDS.values.items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+    stages = {}
+    merged = {}
+    for (stage_name, _), series in STAGE_SECONDS.snapshot().items():
+        total = merged.setdefault(stage_name, [0] * len(series))
+        for index, value in enumerate(series):
+            total[index] += value
+    for stage_name, series in merged.items():
+        count = sum(series[:-1])
+        stages[stage_name] = {
+            "count": count,
+            "mean_ms": series[-1] / count * 1000 if count else 0.0,
+            "p95_ms": STAGE_SECONDS.quantile(series, 0.95) * 1000,
+        }
+    return {"commands": sum(outcomes.values()), "outcomes": outcomes, "stages": stages}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics in Prometheus text format from a daemon thread"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    return server
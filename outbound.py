@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Lower sends first when a channel has a backlog
+PROMPT = 0
+NORMAL = 1
+BULK = 2
+PRIORITY_NAMES = {PROMPT: "prompt", NORMAL: "normal", BULK: "bulk"}
+
+MAX_MESSAGE_LENGTH = 2000
+
+
+class OutboundFull(Exception):
+    """Raised when a channel already has max_pending messages waiting."""
+
+
+class _Bucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is now)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def idle(self):
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+class _Outgoing:
+    __slots__ = ("priority", "seq", "destination", "content", "kwargs", "future", "queued_at")
+
+    def __init__(self, priority, seq, destination, content, kwargs, future):
+        self.priority = priority
+        self.seq = seq
+        self.destination = destination
+        self.content = content
+        self.kwargs = kwargs
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Channel:
+    __slots__ = ("heap", "bucket", "task")
+
+    def __init__(self, bucket):
+        self.heap = []
+        self.bucket = bucket
+        self.task = None
+
+
+class OutboundQueue:
+    """Per-channel outbound message queue in front of discord.py's send.
+
+    Each channel has a token bucket matching Discord's per-channel limit (by
+    default 5 messages per 5 seconds) plus one shared global bucket, so sends
+    wait here instead of stalling in discord.py's 429 handling. Messages that
+    pile up while a channel waits, or within coalesce_window seconds of each
+    other, go out as one payload of up to 2000 characters. When they don't all
+    fit, prompts go first and bulk summaries last; a payload keeps the order
+    the messages were queued in. Messages with files or other send options are
+    never merged. observer, if given, is called with (priority name, seconds
+    queued) for every message delivered.
+    """
+
+    def __init__(self, channel_rate=1.0, channel_burst=5, global_rate=50.0, global_burst=50, coalesce_window=0.025,
+                 max_pending=100, max_channels=10000, observer=None):
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.coalesce_window = coalesce_window
+        self.max_pending = max_pending
+        self.max_channels = max_channels
+        self.observer = observer
+        self.channels = {}
+        self.global_bucket = _Bucket(global_rate, global_burst)
+        self.enqueued = 0
+        self.payloads = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.throttled_seconds = 0.0
+        self._seq = itertools.count()
+
+    async def send(self, destination, content, priority=NORMAL, channel_id=None, **kwargs):
+        """Queue content for destination (anything with an async send) and return the sent message.
+
+        Messages merged into one payload all return the same message.
+        """
+        key = channel_id if channel_id is not None else destination.channel.id
+        channel = self.channels.get(key)
+        if channel is None:
+            if len(self.channels) >= self.max_channels:
+                self._prune()
+            channel = self.channels[key] = _Channel(_Bucket(self.channel_rate, self.channel_burst))
+        if len(channel.heap) >= self.max_pending:
+            self.dropped += 1
+            raise OutboundFull(f"{len(channel.heap)} messages already queued for channel {key}")
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(channel.heap, _Outgoing(priority, next(self._seq), destination, content, kwargs, future))
+        self.enqueued += 1
+        if channel.task is None or channel.task.done():
+            channel.task = asyncio.get_running_loop().create_task(self._drain(channel), name=f"outbound-{key}")
+        return await future
+
+    def _prune(self):
+        self.channels = {key: channel for key, channel in self.channels.items()
+                         if channel.heap or not channel.bucket.idle()}
+
+    def _take_payload(self, channel):
+        """Pop the next payload: the first message, plus others that fit if it can be merged"""
+        first = heapq.heappop(channel.heap)
+        if first.kwargs or not isinstance(first.content, str):
+            return [first]
+        taken = [first]
+        size = len(first.content)
+        kept = []
+        while channel.heap:
+            item = heapq.heappop(channel.heap)
+            if not item.kwargs and isinstance(item.content, str) and size + 1 + len(item.content) <= MAX_MESSAGE_LENGTH:
+                taken.append(item)
+                size += 1 + len(item.content)
+            else:
+                kept.append(item)
+        for item in kept:
+            heapq.heappush(channel.heap, item)
+        taken.sort(key=lambda item: item.seq)
+        return taken
+
+    async def _drain(self, channel):
+        while channel.heap:
+            if self.coalesce_window:
+                await asyncio.sleep(self.coalesce_window)
+            delay = max(channel.bucket.delay(), self.global_bucket.delay())
+            while delay > 0:
+                self.throttled_seconds += delay
+                await asyncio.sleep(delay)
+                delay = max(channel.bucket.delay(), self.global_bucket.delay())
+            channel.bucket.tokens -= 1
+            self.global_bucket.tokens -= 1
+            batch = self._take_payload(channel)
+            first = batch[0]
+            content = "\n".join(item.content for item in batch) if len(batch) > 1 else first.content
+            try:
+                message = await first.destination.send(content, **first.kwargs)
+            except Exception as e:
+                logger.warning("Outbound send failed: %s", e)
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            self.payloads += 1
+            self.delivered += len(batch)
+            sent_at = time.perf_counter()
+            for item in batch:
+                if self.observer is not None:
+                    self.observer(PRIORITY_NAMES.get(item.priority, str(item.priority)), sent_at - item.queued_at)
+                if not item.future.done():
+                    item.future.set_result(message)
+
+    def depth(self):
+        """Queued messages per priority name, across all channels"""
+        counts = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+        for channel in self.channels.values():
+            for item in channel.heap:
+                name = PRIORITY_NAMES.get(item.priority, str(item.priority))
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def stats(self):
+        return {
+            "queued": self.depth(),
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "payloads": self.payloads,
+            "coalesce_ratio": self.delivered / self.payloads if self.payloads else 0.0,
+            "dropped": self.dropped,
+            "throttled_seconds": self.throttled_seconds,
+        }
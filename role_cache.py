@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class RoleCache:
+    """Bounded TTL/LRU cache of role documents keyed by (guild id, lowercased role name).
+
+    Missing roles are cached as None so repeated "No role found" lookups are
+    also served from memory. Thread-safe, because the change-stream listener
+    updates it from a background thread.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_id = {}
+        self._lock = threading.Lock()
+
+    def get(self, guild_id, role):
+        """Return (found, document). found is False on a miss or expired entry."""
+        key = (guild_id, role.lower())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, guild_id, role, document):
+        key = (guild_id, role.lower())
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, document)
+            if document is not None and "_id" in document:
+                self._keys_by_id[document["_id"]] = key
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, guild_id, role):
+        with self._lock:
+            self._drop((guild_id, role.lower()))
+
+    def invalidate_id(self, document_id):
+        """Drop the entry for a document id. Returns False if the id is unknown."""
+        with self._lock:
+            key = self._keys_by_id.get(document_id)
+            if key is None:
+                return False
+            self._drop(key)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_id.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[1] is not None:
+            self._keys_by_id.pop(entry[1].get("_id"), None)
+
+
+def watch_changes(collection, cache, stop_event=None, index=None):
+    """Keep the cache, and the role name index if given, in sync with writes made by other bot instances.
+
+    Runs until stop_event is set; needs a replica set for change streams.
+    Call it from a daemon thread.
+    """
+    try:
+        with collection.watch(full_document="updateLookup") as stream:
+            while stop_event is None or not stop_event.is_set():
+                change = stream.try_next()
+                if change is None:
+                    time.sleep(0.5)
+                    continue
+                document_id = change.get("documentKey", {}).get("_id")
+                # Drop whatever key the id was cached under first, in case the role was renamed
+                if not cache.invalidate_id(document_id) and change["operationType"] in ("delete", "drop", "invalidate"):
+                    cache.clear()
+                if index is not None:
+                    index.remove_id(document_id)
+                document = change.get("fullDocument")
+                if document is not None and "role" in document:
+                    cache.put(document.get("guild_id"), document["role"], document)
+                    if index is not None:
+                        index.add(document.get("guild_id"), document["role"], document_id)
+    except Exception as e:
+        logger.exception("Role cache change stream stopped: %s", e)
+        cache.clear()
+
+
+def start_change_listener(collection, cache, index=None):
+    """Start watch_changes on a daemon thread and return its stop event."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=watch_changes, args=(collection, cache, stop_event, index),
+                              name="role-cache-watch", daemon=True)
+    thread.start()
+    return stop_event
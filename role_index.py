@@ -0,0 +1,259 @@
+import bisect
+import re
+import threading
+from collections import Counter
+
+# An edit changes at most this many of a name's trigrams; a transposition of two middle characters changes four
+GRAMS_PER_EDIT = 4
+
+
+def normalize(role):
+    """Lowercase and drop everything but letters and digits, so "Back-End" and "backend" compare equal"""
+    return re.sub(r"[\W_]+", "", role.lower())
+
+
+def trigrams(key):
+    padded = f"$${key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, bound):
+    """Optimal string alignment distance between a and b (a transposition counts as one edit), or bound + 1 if larger.
+
+    Bit-parallel (Hyyrö 2003): each character of b updates the whole column of
+    the edit table for a at once, as a few integer operations.
+    """
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    if not a:
+        return len(b)
+    match = {}
+    for i, char in enumerate(a):
+        match[char] = match.get(char, 0) | 1 << i
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    positive, negative, diagonal, previous_match = full, 0, 0, 0
+    distance = len(a)
+    for char in b:
+        char_match = match.get(char, 0)
+        transposed = ((~diagonal & char_match) << 1) & previous_match
+        diagonal = ((((char_match & positive) + positive) ^ positive) | char_match | negative | transposed) & full
+        horizontal_positive = negative | ~(diagonal | positive) & full
+        horizontal_negative = diagonal & positive
+        if horizontal_positive & last:
+            distance += 1
+        elif horizontal_negative & last:
+            distance -= 1
+        horizontal_positive = (horizontal_positive << 1 | 1) & full
+        horizontal_negative = (horizontal_negative << 1) & full
+        positive = horizontal_negative | ~(diagonal | horizontal_positive) & full
+        negative = horizontal_positive & diagonal
+        previous_match = char_match
+    return min(distance, bound + 1)
+
+
+def max_typos(key):
+    # Short names are too close to each other for a guess to be safe
+    return 0 if len(key) <= 3 else 1 if len(key) <= 7 else 2
+
+
+class _GuildRoles:
+    __slots__ = ("names", "keys", "grams")
+
+    def __init__(self):
+        self.names = []
+        self.keys = {}
+        self.grams = {}
+
+    def add(self, role):
+        position = bisect.bisect_left(self.names, role)
+        if position < len(self.names) and self.names[position] == role:
+            return
+        self.names.insert(position, role)
+        key = normalize(role)
+        self.keys.setdefault(key, set()).add(role)
+        for gram in trigrams(key):
+            self.grams.setdefault(gram, set()).add(role)
+
+    def remove(self, role):
+        position = bisect.bisect_left(self.names, role)
+        if position == len(self.names) or self.names[position] != role:
+            return
+        del self.names[position]
+        key = normalize(role)
+        self._discard(self.keys, key, role)
+        for gram in trigrams(key):
+            self._discard(self.grams, gram, role)
+
+    @staticmethod
+    def _discard(mapping, key, role):
+        roles = mapping.get(key)
+        if roles is not None:
+            roles.discard(role)
+            if not roles:
+                del mapping[key]
+
+
+class RoleIndex:
+    """Every role name per guild, held in memory for autocomplete and typo correction.
+
+    Loaded from the collection at startup, then kept in sync by RoleRepository
+    on each write and by the change-stream listener for writes made by other
+    bot instances, so lookups never query MongoDB. Names are kept sorted per
+    guild, so a prefix lookup is a binary search, and every normalized name
+    is indexed by its trigrams, so a mistyped name is compared by edit distance
+    only against names sharing enough trigrams with it to be within max_typos
+    edits. Thread-safe, because loading and the change-stream listener run off
+    the event loop.
+    """
+
+    def __init__(self):
+        self._guilds = {}
+        self._keys_by_id = {}
+        self._lock = threading.Lock()
+
+    def load(self, collection, guild_id=None, batch_size=1000):
+        """Replace the index, or one guild's part of it, with what is in collection (blocking). Returns the count."""
+        guilds = {}
+        keys_by_id = {}
+        query = {} if guild_id is None else {"guild_id": guild_id}
+        for document in collection.find(query, {"guild_id": 1, "role": 1}, batch_size=batch_size):
+            if "role" not in document:
+                continue
+            key = (document.get("guild_id"), document["role"].lower())
+            guild = guilds.get(key[0])
+            if guild is None:
+                guild = guilds[key[0]] = _GuildRoles()
+            guild.add(key[1])
+            keys_by_id[document["_id"]] = key
+        with self._lock:
+            if guild_id is None:
+                self._guilds = guilds
+                self._keys_by_id = keys_by_id
+            else:
+                self._guilds[guild_id] = guilds.get(guild_id, _GuildRoles())
+                self._keys_by_id = {document_id: key for document_id, key in self._keys_by_id.items()
+                                    if key[0] != guild_id}
+                self._keys_by_id.update(keys_by_id)
+        return len(keys_by_id)
+
+    def add(self, guild_id, role, document_id=None):
+        role = role.lower()
+        with self._lock:
+            guild = self._guilds.get(guild_id)
+            if guild is None:
+                guild = self._guilds[guild_id] = _GuildRoles()
+            guild.add(role)
+            if document_id is not None:
+                self._keys_by_id[document_id] = (guild_id, role)
+
+    def remove(self, guild_id, role):
+        with self._lock:
+            self._remove(guild_id, role.lower())
+
+    def remove_id(self, document_id):
+        """Remove the role a document id was added under. Returns False if the id is unknown."""
+        with self._lock:
+            key = self._keys_by_id.pop(document_id, None)
+            if key is None:
+                return False
+            self._remove(*key)
+            return True
+
+    def rename(self, guild_id, role, new_role, document_id=None):
+        with self._lock:
+            self._remove(guild_id, role.lower())
+        self.add(guild_id, new_role, document_id)
+
+    def sync(self, guild_id, roles, existing):
+        """Add the roles in existing and remove the other roles, e.g. after a bulk write touched them"""
+        for role in roles:
+            if role.lower() in existing:
+                self.add(guild_id, role)
+            else:
+                self.remove(guild_id, role)
+
+    def complete(self, guild_id, text, limit=25):
+        """Up to limit role names starting with text, then ones containing it, then near-misses"""
+        text = text.strip().lower()
+        with self._lock:
+            guild = self._guilds.get(guild_id)
+            if guild is None:
+                return []
+            names = guild.names
+            position = bisect.bisect_left(names, text)
+            matches = []
+            while position < len(names) and len(matches) < limit and names[position].startswith(text):
+                matches.append(names[position])
+                position += 1
+            if text and len(matches) < limit:
+                matches.extend(name for name in names if text in name and not name.startswith(text))
+            if text and len(matches) < limit:
+                matches.extend(name for _, name in self._similar(guild, normalize(text)) if name not in matches)
+            return matches[:limit]
+
+    def resolve(self, guild_id, text, limit=3):
+        """Map text onto an existing role. Returns (role, candidates).
+
+        role is the existing name when text matches one exactly, up to case and
+        punctuation, or is the one nearest name within max_typos of it;
+        otherwise it is None and candidates are up to limit names that are
+        equally near.
+        """
+        role = text.strip().lower()
+        key = normalize(role)
+        with self._lock:
+            guild = self._guilds.get(guild_id)
+            if guild is None or not key:
+                return None, []
+            position = bisect.bisect_left(guild.names, role)
+            if position < len(guild.names) and guild.names[position] == role:
+                return role, []
+            same = guild.keys.get(key)
+            if same:
+                same = sorted(same)
+                return (same[0], []) if len(same) == 1 else (None, same[:limit])
+            similar = self._similar(guild, key)
+        # A different digit is a different team ("team1" vs "team2"), not a typo
+        if len(similar) == 1 and re.sub(r"\d", "", key) != re.sub(r"\d", "", normalize(similar[0][1])):
+            return similar[0][1], []
+        return None, [name for _, name in similar[:limit]]
+
+    def _similar(self, guild, key):
+        """(distance, name) for the names nearest to key, if they are within max_typos(key) edits"""
+        bound = max_typos(key)
+        if not key or not bound:
+            return []
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(guild.grams.get(gram, ()))
+        # Count filter: a name within bound edits still shares len(grams) - GRAMS_PER_EDIT * bound trigrams with key.
+        # Names are checked most shared first, and each match tightens the bound, so the rest soon fall below it.
+        threshold = len(grams) - GRAMS_PER_EDIT * bound
+        candidates = sorted(((count, name) for name, count in shared.items() if count >= threshold), reverse=True)
+        scored = []
+        for count, name in candidates:
+            if count < threshold:
+                break
+            distance = edit_distance(key, normalize(name), bound)
+            if distance <= bound:
+                scored.append((distance, name))
+                bound = distance
+                threshold = len(grams) - GRAMS_PER_EDIT * bound
+        scored.sort()
+        return [(distance, name) for distance, name in scored if distance <= bound]
+
+    def roles(self, guild_id):
+        with self._lock:
+            guild = self._guilds.get(guild_id)
+            return list(guild.names) if guild is not None else []
+
+    def stats(self):
+        with self._lock:
+            return {"guilds": len(self._guilds), "roles": sum(len(guild.names) for guild in self._guilds.values())}
+
+    def _remove(self, guild_id, role):
+        guild = self._guilds.get(guild_id)
+        if guild is not None:
+            guild.remove(role)
@@ -0,0 +1,230 @@
+"""Streaming CSV/JSONL import and export for the roles collection.
+
+    python role_io.py export --guild-id 1234 --output roles.csv
+    python role_io.py import --guild-id 1234 --input roles.jsonl --chunk-size 2000
+    python role_io.py migrate --guild-id 1234    # adopt documents from before guild scoping
+    python role_io.py export --output all.jsonl     # every guild, with a guild_id column
+    python role_io.py import --input all.jsonl      # back into the guild named on each row
+
+Both directions run in constant memory: export walks a projected cursor in
+batches, import upserts fixed-size chunks keyed on (guild_id, role). An export
+of one guild does not carry the guild id, so it can be imported into another.
+An export of every guild does, and an import without a guild id writes each
+row back to its own guild.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+FIELDS = ("role", "team_name", "project_repo", "team_members", "status")
+MEMBER_SEPARATOR = ";"
+
+
+class PartialImportError(Exception):
+    """Raised when MongoDB rejected rows of a chunk and the import stopped there.
+
+    stats has the same keys import_roles returns, counting every row written
+    up to and including that chunk, plus "rejected" and up to 20
+    "rejected_lines". The rows after the chunk were not imported.
+    """
+
+    def __init__(self, stats, write_errors):
+        super().__init__(f"{stats['rejected']} rows rejected; import stopped after line {stats['last_line']}")
+        self.stats = stats
+        self.write_errors = write_errors
+
+
+def detect_format(path, default="jsonl"):
+    extension = os.path.splitext(path or "")[1].lower()
+    return {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}.get(extension, default)
+
+
+def _throughput(rows, start):
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds else 0.0}
+
+
+def export_roles(collection, fp, fmt="jsonl", batch_size=1000, guild_id=None):
+    """Write every role document of guild_id to the text file fp. Returns throughput stats.
+
+    With guild_id None every guild is exported, and each row carries its guild_id.
+    """
+    start = time.perf_counter()
+    fields = FIELDS if guild_id is not None else ("guild_id",) + FIELDS
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    query = {} if guild_id is None else {"guild_id": guild_id}
+    cursor = collection.find(query, projection, batch_size=batch_size)
+    rows = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(fp, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for document in cursor:
+            document["team_members"] = MEMBER_SEPARATOR.join(document.get("team_members") or [])
+            writer.writerow(document)
+            rows += 1
+    else:
+        for document in cursor:
+            fp.write(json.dumps(document, ensure_ascii=False, default=str))
+            fp.write("\n")
+            rows += 1
+    return _throughput(rows, start)
+
+
+def iter_rows(fp, fmt="jsonl"):
+    """Yield (line number, cleaned document or None) from a CSV or JSONL text file.
+
+    A guild_id column, as written by an export of every guild, is kept as an int.
+    """
+    if fmt == "csv":
+        records = ((number, dict(row)) for number, row in enumerate(csv.DictReader(fp), start=2))
+    else:
+        records = ((number, line) for number, line in enumerate(fp, start=1) if line.strip())
+    for number, record in records:
+        if isinstance(record, str):
+            try:
+                record = json.loads(record)
+            except ValueError:
+                yield number, None
+                continue
+        if not isinstance(record, dict) or not str(record.get("role") or "").strip():
+            yield number, None
+            continue
+        document = {field: record[field] for field in FIELDS if record.get(field) not in (None, "")}
+        document["role"] = str(document["role"]).strip().lower()
+        if record.get("guild_id") not in (None, ""):
+            try:
+                document["guild_id"] = int(record["guild_id"])
+            except (TypeError, ValueError):
+                yield number, None
+                continue
+        members = document.get("team_members")
+        if isinstance(members, str):
+            document["team_members"] = [member.strip() for member in members.split(MEMBER_SEPARATOR) if member.strip()]
+        yield number, document
+
+
+def import_roles(collection, fp, fmt="jsonl", chunk_size=1000, defaults=None, guild_id=None):
+    """Upsert every row of fp into guild_id's roles in chunks of chunk_size. Returns stats.
+
+    With guild_id None each row goes to the guild in its own guild_id column, and
+    rows without one are skipped. defaults are written only when a role is
+    created (e.g. the initial status).
+    Raises PartialImportError, with the stats so far, if rows are rejected.
+    """
+    if defaults is None:
+        defaults = {"team_members": [], "status": "Not started"}
+    start = time.perf_counter()
+    stats = {"upserted": 0, "modified": 0, "skipped": 0, "skipped_lines": []}
+    rows = 0
+    chunk = []
+    chunk_lines = []
+
+    def flush():
+        try:
+            result = collection.bulk_write(chunk, ordered=False)
+        except BulkWriteError as e:
+            # Unordered, so the rest of the chunk was still written; report it with everything before it
+            write_errors = e.details.get("writeErrors", [])
+            stats["upserted"] += e.details.get("nUpserted", 0)
+            stats["modified"] += e.details.get("nModified", 0)
+            stats["rejected"] = len(write_errors)
+            stats["rejected_lines"] = [chunk_lines[error["index"]] for error in write_errors[:20]]
+            stats["last_line"] = chunk_lines[-1]
+            stats.update(_throughput(rows, start))
+            raise PartialImportError(stats, write_errors) from e
+        stats["upserted"] += result.upserted_count
+        stats["modified"] += result.modified_count
+        chunk.clear()
+        chunk_lines.clear()
+
+    for number, document in iter_rows(fp, fmt):
+        row_guild_id = document.pop("guild_id", None) if document is not None else None
+        if guild_id is not None:
+            row_guild_id = guild_id
+        if document is None or row_guild_id is None:
+            stats["skipped"] += 1
+            if len(stats["skipped_lines"]) < 20:
+                stats["skipped_lines"].append(number)
+            continue
+        on_insert = {key: value for key, value in defaults.items() if key not in document}
+        update = {"$set": document}
+        if on_insert:
+            update["$setOnInsert"] = on_insert
+        chunk.append(UpdateOne({"guild_id": row_guild_id, "role": document["role"]}, update, upsert=True))
+        chunk_lines.append(number)
+        rows += 1
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    stats.update(_throughput(rows, start))
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import or export NeoBot team data")
+    parser.add_argument("command", choices=("import", "export", "migrate"))
+    parser.add_argument("--guild-id", type=int,
+                        help="guild to read or write (required for migrate); without it, export writes every guild "
+                             "with a guild_id column and import uses each row's guild_id")
+    parser.add_argument("--input", help="file to import (default: stdin)")
+    parser.add_argument("--output", help="file to export to (default: stdout)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="default: from the file extension, else jsonl")
+    parser.add_argument("--batch-size", type=int, default=1000, help="export cursor batch size")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="import bulk_write chunk size")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--database", default="discordbot")
+    args = parser.parse_args(argv)
+    if args.command == "migrate" and args.guild_id is None:
+        parser.error(f"{args.command} needs --guild-id")
+
+    from pymongo import MongoClient
+    from role_repository import RoleRepository
+    repository = RoleRepository(MongoClient(args.uri)[args.database]["roles"], max_workers=1)
+    collection = repository.collection
+    if args.command == "migrate":
+        migrated = repository.migrate_legacy_documents(args.guild_id)
+        repository.ensure_indexes()
+        print(f"migrate: assigned {migrated} documents to guild {args.guild_id}", file=sys.stderr)
+        return
+    if args.command == "export":
+        fmt = args.format or detect_format(args.output)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8", newline="") as fp:
+                stats = export_roles(collection, fp, fmt, args.batch_size, guild_id=args.guild_id)
+        else:
+            stats = export_roles(collection, sys.stdout, fmt, args.batch_size, guild_id=args.guild_id)
+    else:
+        repository.ensure_indexes()
+        fmt = args.format or detect_format(args.input)
+        try:
+            if args.input:
+                with open(args.input, encoding="utf-8", newline="") as fp:
+                    stats = import_roles(collection, fp, fmt, args.chunk_size, guild_id=args.guild_id)
+            else:
+                stats = import_roles(collection, sys.stdin, fmt, args.chunk_size, guild_id=args.guild_id)
+        except PartialImportError as e:
+            stats = e.stats
+            for error in e.write_errors[:3]:
+                print(f"rejected: {error.get('errmsg', error)}", file=sys.stderr)
+    summary = f"{args.command}: {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/s)"
+    if args.command == "import":
+        summary += f", {stats['upserted']} created, {stats['modified']} updated, {stats['skipped']} skipped"
+        if "rejected" in stats:
+            lines = ", ".join(str(number) for number in stats["rejected_lines"])
+            summary += (f", {stats['rejected']} rejected (lines {lines}); "
+                        f"stopped after line {stats['last_line']}, later rows were not imported")
+    print(summary, file=sys.stderr)
+    if "rejected" in stats:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import role_io
+
+logger = logging.getLogger(__name__)
+
+
+GUILD_ROLE_INDEX = "guild_id_1_role_1"
+LEGACY_ROLE_INDEX = "role_1"
+
+
+class RoleRepository:
+    """Async access to the roles collection.
+
+    Every document carries the id of the guild it belongs to, and every query
+    is scoped to one guild, so role names only need to be unique per guild.
+    pymongo is synchronous, so every call is pushed onto a small bounded thread
+    pool instead of running on the discord.py event loop. Mutations are single
+    atomic calls that report "not found" from their own result. An optional
+    RoleCache serves reads and is written through on every mutation, and an
+    optional RoleIndex of role names is kept in step with creates, renames and
+    deletes.
+    observer, if given, is called with (operation name, seconds) after every
+    database call.
+    """
+
+    def __init__(self, collection, max_workers=4, cache=None, index=None, observer=None):
+        self.collection = collection
+        self.cache = cache
+        self.index = index
+        self.observer = observer
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongo")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            if self.observer is not None:
+                self.observer(func.__name__, time.perf_counter() - start)
+
+    def ensure_indexes(self):
+        """Create the unique (guild_id, role) index (blocking, call once at startup).
+
+        The pre-tenancy unique index on role alone is dropped, since it would stop
+        two guilds from using the same role name.
+        """
+        self.collection.create_index([("guild_id", 1), ("role", 1)], unique=True, name=GUILD_ROLE_INDEX)
+        if LEGACY_ROLE_INDEX in self.collection.index_information():
+            self.collection.drop_index(LEGACY_ROLE_INDEX)
+            logger.info("Dropped legacy unique index %s", LEGACY_ROLE_INDEX)
+
+    def migrate_legacy_documents(self, guild_id):
+        """Assign documents written before guild scoping to guild_id (blocking). Returns the count."""
+        result = self.collection.update_many({"guild_id": {"$exists": False}}, {"$set": {"guild_id": guild_id}})
+        if self.cache is not None:
+            self.cache.clear()
+        return result.modified_count
+
+    def count_legacy_documents(self):
+        return self.collection.count_documents({"guild_id": {"$exists": False}})
+
+    async def find_role(self, guild_id, role):
+        if self.cache is not None:
+            found, document = self.cache.get(guild_id, role)
+            if found:
+                return document
+        document = await self._run(self.collection.find_one, {"guild_id": guild_id, "role": role.lower()})
+        if self.cache is not None:
+            self.cache.put(guild_id, role, document)
+        return document
+
+    async def create_team(self, document):
+        """Insert the team unless its role exists in its guild. Returns True if it was created."""
+        try:
+            result = await self._run(
+                self.collection.update_one,
+                {"guild_id": document["guild_id"], "role": document["role"]},
+                {"$setOnInsert": document},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Lost a race with a concurrent upsert for the same role
+            return False
+        created = result.matched_count == 0
+        if created and self.index is not None:
+            self.index.add(document["guild_id"], document["role"], result.upserted_id)
+        if self.cache is not None:
+            if created:
+                self.cache.put(document["guild_id"], document["role"], dict(document, _id=result.upserted_id))
+            else:
+                self.cache.invalidate(document["guild_id"], document["role"])
+        return created
+
+    async def upsert_role(self, guild_id, role, update):
+        """Apply the update, creating the role if it is missing. Returns True if it was created.
+
+        Defaults for a new document belong in the update's $setOnInsert.
+        """
+        try:
+            result = await self._run(self.collection.update_one, {"guild_id": guild_id, "role": role.lower()},
+                                     update, upsert=True)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(guild_id, role)
+        created = result.upserted_id is not None
+        if created and self.index is not None:
+            self.index.add(guild_id, role, result.upserted_id)
+        return created
+
+    async def update_role(self, guild_id, role, update):
+        """Apply the update and return the document as it was before, or None if missing."""
+        try:
+            return await self._run(
+                self.collection.find_one_and_update,
+                {"guild_id": guild_id, "role": role.lower()},
+                update,
+                return_document=ReturnDocument.BEFORE,
+            )
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(guild_id, role)
+
+    async def rename_role(self, guild_id, role, new_role):
+        """Rename a role. Returns the old document, or None if missing.
+
+        Raises DuplicateKeyError if new_role is already taken in the guild.
+        """
+        try:
+            document = await self.update_role(guild_id, role, {"$set": {"role": new_role.lower()}})
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(guild_id, new_role)
+        if document is not None and self.index is not None:
+            self.index.rename(guild_id, role, new_role, document.get("_id"))
+        return document
+
+    async def delete_role(self, guild_id, role):
+        """Delete the role and return the removed document, or None if missing."""
+        document = await self._run(self.collection.find_one_and_delete, {"guild_id": guild_id, "role": role.lower()})
+        if self.cache is not None:
+            self.cache.put(guild_id, role, None)
+        if document is not None and self.index is not None:
+            self.index.remove(guild_id, role)
+        return document
+
+    async def find_existing_roles(self, guild_id, roles):
+        """Return the subset of the guild's roles that exist, in one query"""
+        cursor = await self._run(self.collection.find,
+                                 {"guild_id": guild_id, "role": {"$in": [role.lower() for role in roles]}},
+                                 {"role": 1, "_id": 0})
+        return {document["role"] for document in await self._run(list, cursor)}
+
+    async def bulk_write(self, operations, guild_id, roles, ordered=True):
+        """Run the operations as one bulk_write, then drop the guild's touched roles from the cache"""
+        try:
+            return await self._run(self.collection.bulk_write, operations, ordered=ordered)
+        finally:
+            if self.cache is not None:
+                for role in roles:
+                    self.cache.invalidate(guild_id, role)
+            if self.index is not None and roles:
+                # An ordered batch can stop part way, so ask the database which touched roles exist now
+                self.index.sync(guild_id, roles, await self.find_existing_roles(guild_id, roles))
+
+    async def export_to(self, fp, guild_id, fmt="jsonl", batch_size=1000):
+        """Stream the guild's roles into the text file fp on the executor. Returns throughput stats."""
+        return await self._run(role_io.export_roles, self.collection, fp, fmt, batch_size, guild_id=guild_id)
+
+    async def import_from(self, fp, guild_id, fmt="jsonl", chunk_size=1000):
+        """Upsert every row of the text file fp into the guild in chunks. Returns throughput stats."""
+        try:
+            return await self._run(role_io.import_roles, self.collection, fp, fmt, chunk_size, guild_id=guild_id)
+        finally:
+            if self.cache is not None:
+                self.cache.clear()
+            if self.index is not None:
+                await self._run(self.index.load, self.collection, guild_id)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,513 @@
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import threading
+
+STORE_KINDS = ("log", "mongo", "memory")
+FSYNC_POLICIES = ("always", "interval", "never")
+
+SNAPSHOT_MAGIC = b"NEOROLE1"
+# Snapshot layout: header, one slot per record sorted by key, then the records (key bytes followed by JSON)
+_HEADER = struct.Struct("<8sQ")
+_SLOT = struct.Struct("<QII")
+
+logger = logging.getLogger(__name__)
+
+
+def _check_fsync(fsync):
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(f"Unknown fsync policy {fsync!r}; expected one of {', '.join(FSYNC_POLICIES)}")
+
+
+class MemoryRoleStore:
+    """Role records in a dict, lost on exit. For tests and throwaway runs."""
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def get(self, role, default=None):
+        with self._lock:
+            record = self._records.get(role)
+            return dict(record) if record is not None else default
+
+    def update(self, role, fields):
+        """Merge fields into the role's record, creating it if needed. Returns the new record."""
+        with self._lock:
+            record = self._records[role] = {**self._records.get(role, {}), **fields}
+            return dict(record)
+
+    def __contains__(self, role):
+        return role in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def keys(self):
+        with self._lock:
+            return list(self._records)
+
+    def stats(self):
+        return {"kind": "memory", "records": len(self._records)}
+
+    def close(self):
+        pass
+
+
+class _Snapshot:
+    """Read-only view of a snapshot file through mmap; records are decoded only when looked up."""
+
+    def __init__(self, path):
+        self.count = 0
+        self._file = None
+        self._map = None
+        try:
+            fp = open(path, "rb")
+        except FileNotFoundError:
+            return
+        size = os.fstat(fp.fileno()).st_size
+        if size == 0:
+            fp.close()
+            return
+        if size < _HEADER.size:
+            fp.close()
+            raise ValueError(f"{path} is truncated: {size} bytes is shorter than the snapshot header")
+        self._file = fp
+        self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = _HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a role store snapshot")
+        end = _HEADER.size + self.count * _SLOT.size
+        if self.count and end <= size:
+            # Records are written in slot order, so the last one ends the file
+            offset, key_length, value_length = self._slot(self.count - 1)
+            end = offset + key_length + value_length
+        if end > size:
+            count = self.count
+            self.close()
+            raise ValueError(f"{path} is truncated: {size} bytes can't hold {count} records")
+
+    def _slot(self, index):
+        return _SLOT.unpack_from(self._map, _HEADER.size + index * _SLOT.size)
+
+    def find(self, key):
+        """Binary search for the encoded key. Returns the record's JSON bytes, or None."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset, key_length, value_length = self._slot(middle)
+            found = self._map[offset:offset + key_length]
+            if found == key:
+                return self._map[offset + key_length:offset + key_length + value_length]
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def items(self):
+        """(key bytes, JSON bytes) for every record, in key order"""
+        for index in range(self.count):
+            offset, key_length, value_length = self._slot(index)
+            yield self._map[offset:offset + key_length], self._map[offset + key_length:offset + key_length + value_length]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.count = 0
+
+
+def write_snapshot(path, items, count):
+    """Write count (key bytes, JSON bytes) pairs, already in key order, as a snapshot at path (blocking)"""
+    records_start = _HEADER.size + count * _SLOT.size
+    slots = []
+    with open(path, "wb") as fp:
+        fp.seek(records_start)
+        offset = records_start
+        for key, value in items:
+            fp.write(key)
+            fp.write(value)
+            slots.append(_SLOT.pack(offset, len(key), len(value)))
+            offset += len(key) + len(value)
+        if len(slots) != count:
+            raise ValueError(f"Expected {count} records for the snapshot, got {len(slots)}")
+        fp.seek(0)
+        fp.write(_HEADER.pack(SNAPSHOT_MAGIC, count))
+        fp.write(b"".join(slots))
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def _fsync_directory(path):
+    # Makes a rename durable on POSIX; Windows can't open a directory and doesn't need it
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class LogRoleStore:
+    """Role records in an append-only log on top of a compacted, memory-mapped snapshot.
+
+    Every update appends one JSON line to log.jsonl and is flushed to the OS at
+    once, so a crashed process loses nothing. fsync decides when it reaches
+    the disk: "always" after every update, "interval" within fsync_interval
+    seconds, from a background thread (and on close), "never" whenever the
+    OS gets to it. Opening the store maps snapshot.bin without reading it,
+    since lookups binary search its sorted slot table in place, and replays
+    only the log written since the last snapshot. Once the log holds
+    compact_after entries (or a quarter of the snapshot, if that is more), a
+    background thread merges it into a new snapshot. The log is moved aside to
+    log.compacting.jsonl first, so updates carry on into a fresh log while
+    the snapshot is written, and the store is locked only to move the log and
+    to swap the new snapshot in with an atomic rename. Replaying a log over a
+    snapshot that already contains it is harmless, so a crash at any point
+    leaves a consistent store. If compacting fails, e.g. on a full disk, the
+    log moved aside is put back in front of the new one and compaction is
+    retried after another compact_after updates.
+    """
+
+    def __init__(self, path, fsync="interval", fsync_interval=1.0, compact_after=10000):
+        _check_fsync(fsync)
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.snapshot_path = os.path.join(path, "snapshot.bin")
+        self.log_path = os.path.join(path, "log.jsonl")
+        self.compacting_log_path = os.path.join(path, "log.compacting.jsonl")
+        self.compactions = 0
+        self.failed_compactions = 0
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        # Held for a whole compaction, so compact() waits for one running in the background
+        self._compaction_lock = threading.Lock()
+        self._compactor = None
+        self._snapshot = _Snapshot(self.snapshot_path)
+        # Records updated since the snapshot; _frozen holds those being written into a new one
+        self._overlay = {}
+        self._frozen = {}
+        self._count = self._snapshot.count
+        self._log_entries = 0
+        self._retry_compaction_at = 0
+        if os.path.exists(self.compacting_log_path):
+            # A compaction was interrupted: its log comes before the current one
+            self._replay(self.compacting_log_path)
+            self._replay(self.log_path)
+            self._fold_log_back()
+        else:
+            self._replay(self.log_path)
+        self._log = open(self.log_path, "ab")
+        self._unsynced = False
+        self._closing = threading.Event()
+        self._flusher = None
+        if fsync == "interval":
+            self._flusher = threading.Thread(target=self._flush_periodically, name="role-store-fsync", daemon=True)
+            self._flusher.start()
+
+    def _replay(self, path):
+        try:
+            fp = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with fp:
+            valid = 0
+            for line in fp:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated entry")
+                    role, fields = json.loads(line)
+                except (ValueError, TypeError):
+                    break
+                self._apply(role, fields)
+                self._log_entries += 1
+                valid += len(line)
+            torn = valid < os.fstat(fp.fileno()).st_size
+        if torn:
+            # A crash mid-write leaves a partial last line; cut it off so new entries start on a line of their own
+            with open(path, "r+b") as fp:
+                fp.truncate(valid)
+
+    def _fold_log_back(self):
+        """Append log.jsonl to the log moved aside for compaction and make the result log.jsonl again"""
+        with open(self.compacting_log_path, "ab") as fp:
+            try:
+                with open(self.log_path, "rb") as log:
+                    shutil.copyfileobj(log, fp)
+            except FileNotFoundError:
+                pass
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(self.compacting_log_path, self.log_path)
+        _fsync_directory(self.path)
+
+    def _lookup(self, role):
+        record = self._overlay.get(role)
+        if record is None:
+            record = self._frozen.get(role)
+        if record is not None:
+            return record
+        value = self._snapshot.find(role.encode("utf-8"))
+        return json.loads(value) if value is not None else None
+
+    def _apply(self, role, fields):
+        record = self._lookup(role)
+        if record is None:
+            self._count += 1
+            record = {}
+        record = self._overlay[role] = {**record, **fields}
+        return record
+
+    def get(self, role, default=None):
+        with self._lock:
+            record = self._lookup(role)
+            return dict(record) if record is not None else default
+
+    def update(self, role, fields):
+        """Merge fields into the role's record, creating it if needed. Returns the new record."""
+        line = json.dumps([role, fields], separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            self._log.write(line)
+            self._log.flush()
+            record = self._apply(role, fields)
+            self._log_entries += 1
+            if self.fsync == "always":
+                os.fsync(self._log.fileno())
+            else:
+                self._unsynced = True
+            if ((self._compactor is None or not self._compactor.is_alive()) and not self._closing.is_set()
+                    and self._log_entries >= max(self.compact_after, self._snapshot.count // 4,
+                                                 self._retry_compaction_at)):
+                self._compactor = threading.Thread(target=self._compact_in_background, name="role-store-compact",
+                                                   daemon=True)
+                self._compactor.start()
+            return dict(record)
+
+    def _flush_periodically(self):
+        while not self._closing.wait(self.fsync_interval):
+            with self._lock:
+                unsynced, self._unsynced = self._unsynced, False
+                log = self._log
+            if unsynced:
+                try:
+                    os.fsync(log.fileno())
+                except ValueError:
+                    # Closed by a compaction moving the log aside, which synced it first
+                    pass
+                except OSError:
+                    with self._lock:
+                        self._unsynced = True
+                    logger.exception("Syncing the role store log in %s failed", self.path)
+
+    @staticmethod
+    def _merged_items(snapshot, overlay):
+        """Snapshot records with overlay applied, as (key bytes, JSON bytes) in key order"""
+        pending = sorted((role.encode("utf-8"), role) for role in overlay)
+
+        def encode(role):
+            return json.dumps(overlay[role], separators=(",", ":")).encode("utf-8")
+
+        position = 0
+        for key, value in snapshot.items():
+            while position < len(pending) and pending[position][0] < key:
+                yield pending[position][0], encode(pending[position][1])
+                position += 1
+            if position < len(pending) and pending[position][0] == key:
+                yield key, encode(pending[position][1])
+                position += 1
+            else:
+                yield key, value
+        for key, role in pending[position:]:
+            yield key, encode(role)
+
+    def compact(self):
+        """Fold the log into a new snapshot now (blocking), after any compaction already running"""
+        with self._compaction_lock:
+            self._compact()
+
+    def _compact_in_background(self):
+        try:
+            with self._compaction_lock:
+                self._compact()
+        except Exception:
+            # The updates are all in the log; compaction only bounds its length
+            logger.exception("Compacting the role store in %s failed; retrying after %d more updates",
+                             self.path, self.compact_after)
+
+    def _compact(self):
+        tmp_path = self.snapshot_path + ".tmp"
+        frozen_entries = 0
+        try:
+            with self._lock:
+                if self._log.closed:
+                    return
+                if os.path.exists(self.compacting_log_path):
+                    self._reopen_log(self._fold_log_back)
+                # Updates from here on go to a new log and a new overlay, while the frozen ones are written out
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._unsynced = False
+                self._reopen_log(lambda: os.replace(self.log_path, self.compacting_log_path))
+                _fsync_directory(self.path)
+                self._frozen, self._overlay = self._overlay, {}
+                frozen_entries, self._log_entries = self._log_entries, 0
+                snapshot, count = self._snapshot, self._count
+            write_snapshot(tmp_path, self._merged_items(snapshot, self._frozen), count)
+            with self._lock:
+                # Windows can't replace a file that is still mapped
+                self._snapshot.close()
+                try:
+                    os.replace(tmp_path, self.snapshot_path)
+                finally:
+                    # The new snapshot if the rename happened, the old one otherwise
+                    self._snapshot = _Snapshot(self.snapshot_path)
+                _fsync_directory(self.path)
+                self._frozen = {}
+                # Until it is removed the old log is replayed over a snapshot that already holds it, which is harmless
+                os.remove(self.compacting_log_path)
+                _fsync_directory(self.path)
+                self._retry_compaction_at = 0
+                self.compactions += 1
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            with self._lock:
+                self.failed_compactions += 1
+                if self._frozen:
+                    # Newer records in the overlay already include the frozen ones they were updated from
+                    self._overlay = {**self._frozen, **self._overlay}
+                    self._frozen = {}
+                    self._log_entries += frozen_entries
+                self._retry_compaction_at = self._log_entries + self.compact_after
+                if os.path.exists(self.compacting_log_path) and not self._log.closed:
+                    try:
+                        self._reopen_log(self._fold_log_back)
+                    except OSError:
+                        # Folded back by the next compaction, or on opening the store
+                        logger.exception("Restoring the role store log in %s failed", self.path)
+            raise
+
+    def _reopen_log(self, move):
+        """Close the log, call move to rename log files (Windows can't rename an open file), then reopen log.jsonl"""
+        self._log.close()
+        try:
+            move()
+        finally:
+            self._log = open(self.log_path, "ab")
+
+    def __contains__(self, role):
+        with self._lock:
+            return self._lookup(role) is not None
+
+    def __len__(self):
+        return self._count
+
+    def keys(self):
+        with self._lock:
+            overlay = {**self._frozen, **self._overlay}
+            return [key.decode("utf-8") for key, _ in self._merged_items(self._snapshot, overlay)]
+
+    def stats(self):
+        return {
+            "kind": "log",
+            "records": self._count,
+            "snapshot_records": self._snapshot.count,
+            "log_entries": self._log_entries,
+            "compactions": self.compactions,
+            "failed_compactions": self.failed_compactions,
+            "compacting": self._compactor is not None and self._compactor.is_alive(),
+            "fsync": self.fsync,
+        }
+
+    def close(self):
+        self._closing.set()
+        for thread in (self._flusher, self._compactor):
+            if thread is not None and thread is not threading.current_thread():
+                thread.join()
+        with self._lock:
+            if self._log.closed:
+                return
+            if self._unsynced:
+                os.fsync(self._log.fileno())
+            self._log.close()
+            self._snapshot.close()
+
+
+class MongoRoleStore:
+    """Role records as documents keyed by a unique role field in a MongoDB collection.
+
+    fsync "always" waits for each write to reach the journal; "interval" and
+    "never" are acknowledged as soon as the server applies them and reach the
+    journal on its commit interval.
+    """
+
+    def __init__(self, collection, fsync="interval", client=None):
+        _check_fsync(fsync)
+        from pymongo import WriteConcern
+        if fsync == "always":
+            collection = collection.with_options(write_concern=WriteConcern(w=1, j=True))
+        self.collection = collection
+        self.fsync = fsync
+        self._client = client
+        collection.create_index("role", unique=True)
+
+    def get(self, role, default=None):
+        document = self.collection.find_one({"role": role}, {"_id": 0, "role": 0})
+        return document if document is not None else default
+
+    def update(self, role, fields):
+        """Merge fields into the role's record, creating it if needed. Returns the new record."""
+        from pymongo import ReturnDocument
+        return self.collection.find_one_and_update(
+            {"role": role},
+            {"$set": fields} if fields else {"$setOnInsert": {"role": role}},
+            projection={"_id": 0, "role": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def __contains__(self, role):
+        return self.collection.find_one({"role": role}, {"_id": 1}) is not None
+
+    def __len__(self):
+        return self.collection.count_documents({})
+
+    def keys(self):
+        return [document["role"] for document in self.collection.find({}, {"role": 1, "_id": 0})]
+
+    def stats(self):
+        return {"kind": "mongo", "records": len(self), "fsync": self.fsync}
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+
+def open_role_store(kind, path=".neobot_cache/roles", fsync="interval", fsync_interval=1.0, compact_after=10000,
+                    uri=None, database="discord_bot_db", collection="roles"):
+    """Open the named store: "log" in the directory path, "mongo" at uri, or "memory"."""
+    if kind not in STORE_KINDS:
+        raise ValueError(f"Unknown role store {kind!r}; expected one of {', '.join(STORE_KINDS)}")
+    if kind == "log":
+        return LogRoleStore(path, fsync=fsync, fsync_interval=fsync_interval, compact_after=compact_after)
+    if kind == "mongo":
+        from pymongo import MongoClient
+        client = MongoClient(uri or "mongodb://localhost:27017/")
+        return MongoRoleStore(client[database][collection], fsync=fsync, client=client)
+    return MemoryRoleStore()
@@ -0,0 +1,116 @@
+from pymongo import DeleteOne, UpdateOne
+
+# Arguments each intent needs in batch mode, where there is nobody to prompt
+REQUIRED_ARGS = {
+    "add_team": ("role", "team_name", "project_repo"),
+    "add_member": ("role", "team_members"),
+    "remove_member": ("role", "team_members"),
+    "delete_team": ("role",),
+    "update_name": ("role", "team_name"),
+    "update_repo": ("role", "project_repo"),
+    "set_status": ("role", "status"),
+}
+
+ARG_LABELS = {"role": "role", "team_name": "team name", "project_repo": "GitHub repo",
+              "team_members": "member", "status": "status"}
+
+
+class BatchLine:
+    __slots__ = ("number", "text", "intent", "args", "error", "operation")
+
+    def __init__(self, number, text):
+        self.number = number
+        self.text = text
+        self.intent = None
+        self.args = None
+        self.error = None
+        self.operation = None
+
+
+def split_batch(text, max_lines):
+    """Non-empty, non-comment lines as (line number, text); raises ValueError above max_lines"""
+    lines = [(number, line.strip()) for number, line in enumerate(text.splitlines(), start=1)
+             if line.strip() and not line.strip().startswith("#")]
+    if len(lines) > max_lines:
+        raise ValueError(f"Batch has {len(lines)} lines; the limit is {max_lines}.")
+    return lines
+
+
+def parse_batch(lines, get_best_command, extract_command_args):
+    """Resolve intent and arguments for every line and check required arguments"""
+    parsed = []
+    for number, text in lines:
+        line = BatchLine(number, text)
+        best = get_best_command(text)
+        if not best:
+            line.error = "couldn't understand this line"
+        elif best["command"] not in REQUIRED_ARGS:
+            line.error = f"`{best['command']}` isn't supported in batch mode"
+        else:
+            line.intent = best["command"]
+            line.args = extract_command_args(text)
+            missing = [ARG_LABELS[name] for name in REQUIRED_ARGS[line.intent] if not line.args.get(name)]
+            if missing:
+                line.error = "missing " + ", ".join(missing)
+        parsed.append(line)
+    return parsed
+
+
+def plan_operations(parsed, existing_roles, guild_id):
+    """Check every line against the guild's existing roles (applying earlier lines first) and build its write.
+
+    Returns True if every line is valid.
+    """
+    existing = set(existing_roles)
+    for line in parsed:
+        if line.error:
+            continue
+        role = line.args.get("role").lower()
+        key = {"guild_id": guild_id, "role": role}
+        if line.intent == "add_team":
+            if role in existing:
+                line.error = f"role **{role}** already exists"
+                continue
+            existing.add(role)
+            document = {"guild_id": guild_id, "role": role, "team_name": line.args.get("team_name"),
+                        "project_repo": line.args.get("project_repo"), "team_members": [], "status": "Not started"}
+            line.operation = UpdateOne(key, {"$setOnInsert": document}, upsert=True)
+            continue
+        if role not in existing:
+            line.error = f"no role **{role}** found"
+            continue
+        if line.intent == "delete_team":
+            existing.discard(role)
+            line.operation = DeleteOne(key)
+        elif line.intent == "add_member":
+            line.operation = UpdateOne(key, {"$addToSet": {"team_members": {"$each": line.args.get("team_members")}}})
+        elif line.intent == "remove_member":
+            line.operation = UpdateOne(key, {"$pullAll": {"team_members": line.args.get("team_members")}})
+        elif line.intent == "update_name":
+            line.operation = UpdateOne(key, {"$set": {"team_name": line.args.get("team_name")}})
+        elif line.intent == "update_repo":
+            line.operation = UpdateOne(key, {"$set": {"project_repo": line.args.get("project_repo")}})
+        elif line.intent == "set_status":
+            line.operation = UpdateOne(key, {"$set": {"status": line.args.get("status").capitalize()}})
+    return all(line.error is None for line in parsed)
+
+
+def describe(line):
+    """One-line result for the summary message"""
+    if line.error:
+        return f"❌ {line.number}: `{line.text[:60]}` — {line.error}"
+    return f"✅ {line.number}: {line.intent.replace('_', ' ')} **{line.args.get('role').lower()}**"
+
+
+def format_summary(header, parsed, limit=1900):
+    """Header plus per-line results, trimmed to fit one Discord message"""
+    lines = [header]
+    size = len(header)
+    for index, line in enumerate(parsed):
+        text = describe(line)
+        if size + len(text) + 1 > limit:
+            lines.append(f"… and {len(parsed) - index} more lines.")
+            break
+        lines.append(text)
+        size += len(text) + 1
+    return "\n".join(lines)
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+import pytest
+
+import bot
+import outbound
+
+
+class Guild:
+    id = 1
+
+
+class Channel:
+    id = 10
+    guild = Guild()
+
+
+class User:
+    id = 100
+
+    def __str__(self):
+        return "user100"
+
+
+class Context:
+    def __init__(self):
+        self.author = User()
+        self.channel = Channel()
+        self.guild = self.channel.guild
+        self.sent = []
+
+    async def send(self, content, **kwargs):
+        self.sent.append(content)
+        return content
+
+
+@pytest.fixture
+def full_queue(monkeypatch):
+    """Replace the bot's outbound queue with one that drops every message"""
+    queue = outbound.OutboundQueue(coalesce_window=0, max_pending=0)
+    monkeypatch.setattr(bot, "outbound_queue", queue)
+    return queue
+
+
+def test_reply_returns_sent_message():
+    ctx = Context()
+    assert asyncio.run(bot.reply(ctx, "hello")) == "hello"
+    assert ctx.sent == ["hello"]
+
+
+def test_reply_to_full_channel_returns_none(full_queue):
+    ctx = Context()
+    assert asyncio.run(bot.reply(ctx, "hello")) is None
+    assert ctx.sent == []
+    assert full_queue.dropped == 1
+
+
+def test_ask_user_gives_up_when_prompt_is_dropped(full_queue):
+    ctx = Context()
+    # Waiting for an answer to a question nobody saw would hold the conversation for 30 seconds
+    answer = asyncio.run(asyncio.wait_for(bot.ask_user(ctx, "Which role?"), 1))
+    assert answer is None
+    assert full_queue.dropped == 1
+
+
+def test_full_channel_does_not_reach_on_command_error(full_queue, caplog):
+    ctx = Context()
+    callback = bot.handle_natural_command.callback
+    # discord.py hands anything the callback raises to on_command_error, which would reply into the full channel again
+    with caplog.at_level(logging.ERROR):
+        asyncio.run(callback(ctx, message=""))
+    assert ctx.sent == []
+    assert full_queue.dropped == 1
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
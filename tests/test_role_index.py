@@ -0,0 +1,157 @@
+import random
+import string
+
+from role_index import RoleIndex, edit_distance, max_typos, normalize
+
+
+def osa_distance(a, b):
+    """Optimal string alignment distance by the textbook O(len(a) * len(b)) table, kept three rows at a time"""
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], before[j - 2] + 1)
+        before, previous = previous, row
+    return previous[len(b)]
+
+
+def brute_force_similar(names, key):
+    bound = max_typos(key)
+    if not key or not bound:
+        return []
+    # Each edit changes the length by at most one, so only names within bound of the key's length can score
+    scored = sorted((min(osa_distance(key, normalize(name)), bound + 1)
+                     if abs(len(normalize(name)) - len(key)) <= bound else bound + 1, name) for name in names)
+    return [(distance, name) for distance, name in scored if distance <= min(bound, scored[0][0])]
+
+
+def make_index(names, guild_id=1):
+    index = RoleIndex()
+    for name in names:
+        index.add(guild_id, name)
+    return index
+
+
+def typo(name, rng):
+    position = rng.randrange(len(name))
+    edit = rng.choice("sidt")
+    letter = rng.choice(string.ascii_lowercase)
+    if edit == "s":
+        return name[:position] + letter + name[position + 1:]
+    if edit == "i":
+        return name[:position] + letter + name[position:]
+    if edit == "d" and len(name) > 1:
+        return name[:position] + name[position + 1:]
+    if edit == "t" and position + 1 < len(name):
+        return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+    return name
+
+
+def random_string(rng, alphabet, length):
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+def test_osa_distance_reference():
+    assert osa_distance("", "abc") == 3
+    assert osa_distance("kitten", "sitting") == 3
+    assert osa_distance("ab", "ba") == 1
+    # Unlike full Damerau-Levenshtein, OSA can't edit a transposed pair again
+    assert osa_distance("ca", "abc") == 3
+
+
+def test_edit_distance_matches_reference_on_random_strings():
+    rng = random.Random(11)
+    for _ in range(1500):
+        alphabet = rng.choice(["ab", "abcd", string.ascii_lowercase])
+        a = random_string(rng, alphabet, rng.randint(0, 12))
+        b = random_string(rng, alphabet, rng.randint(0, 12))
+        bound = rng.randint(0, 14)
+        assert edit_distance(a, b, bound) == min(osa_distance(a, b), bound + 1), (a, b, bound)
+
+
+def test_edit_distance_on_strings_longer_than_a_machine_word():
+    rng = random.Random(12)
+    for _ in range(60):
+        a = random_string(rng, "abc", rng.randint(60, 150))
+        b = list(a)
+        for _ in range(rng.randint(0, 6)):
+            position = rng.randrange(len(b) - 1)
+            if rng.random() < 0.5:
+                b[position], b[position + 1] = b[position + 1], b[position]
+            else:
+                b[position] = rng.choice("abcd")
+        b = "".join(b)
+        bound = len(a) + len(b)
+        assert edit_distance(a, b, bound) == osa_distance(a, b), (a, b)
+        assert edit_distance(a, b, 2) == min(osa_distance(a, b), 3), (a, b)
+    a = "x" * 100 + "ab" + "y" * 100
+    assert edit_distance(a, "x" * 100 + "ba" + "y" * 100, 5) == 1
+    assert edit_distance(a, a[:-1] + "z", 5) == 1
+
+
+def test_edit_distance_counts_transpositions_once():
+    assert edit_distance("ab", "ba", 2) == 1
+    assert edit_distance("grwoth", "growth", 2) == 1
+    assert edit_distance("abcdef", "badcfe", 5) == 3
+    assert edit_distance("ca", "abc", 5) == 3
+
+
+def test_edit_distance_bound_cutoff():
+    assert edit_distance("kitten", "sitting", 3) == 3
+    assert edit_distance("kitten", "sitting", 2) == 3
+    assert edit_distance("kitten", "sitting", 1) == 2
+    assert edit_distance("kitten", "sitting", 0) == 1
+    # Lengths alone rule these out
+    assert edit_distance("ab", "abcdef", 2) == 3
+    assert edit_distance("", "abc", 2) == 3
+    assert edit_distance("", "ab", 2) == 2
+
+
+def test_resolve_exact_and_normalized():
+    index = make_index(["frontend", "back-end", "team1"])
+    assert index.resolve(1, "Frontend") == ("frontend", [])
+    assert index.resolve(1, "backend") == ("back-end", [])
+    assert index.resolve(2, "frontend") == (None, [])
+
+
+def test_resolve_picks_the_nearest_name_over_names_sharing_more_trigrams():
+    # Each "masecurity..." name shares every trigram of the input but is several edits away
+    suffixes = ("ops", "dev", "api", "web", "app", "net", "iam", "soc", "lab", "hub")
+    index = make_index(["qasecurity"] + [f"masecurity{suffix}" for suffix in suffixes])
+    assert index.resolve(1, "masecurity") == ("qasecurity", [])
+
+
+def test_resolve_prefers_fewer_edits_over_more_shared_trigrams():
+    suffixes = ("api", "app", "ops", "dev", "lab", "hub", "web", "net", "iam")
+    index = make_index(["growth91"] + [f"grwoth{suffix}" for suffix in suffixes])
+    assert index.resolve(1, "grwoth91") == ("growth91", [])
+
+
+def test_resolve_keeps_digit_variants_as_suggestions():
+    index = make_index(["team1", "team2"])
+    role, candidates = index.resolve(1, "team3")
+    assert role is None
+    assert candidates == ["team1", "team2"]
+
+
+def test_resolve_ambiguous_typo_suggests_both():
+    index = make_index(["design", "desigh", "designs"])
+    role, candidates = index.resolve(1, "desig")
+    assert role is None
+    assert candidates == ["desigh", "design"]
+
+
+def test_similar_matches_brute_force():
+    rng = random.Random(7)
+    alphabet = "abcdefghij0123"
+    names = {"".join(rng.choice(alphabet) for _ in range(rng.randint(3, 14))) for _ in range(800)}
+    names |= {typo(name, rng) for name in list(names)[:150]}
+    index = make_index(sorted(names))
+    guild = index._guilds[1]
+    queries = [typo(typo(name, rng), rng) for name in rng.sample(sorted(names), 200)]
+    queries += ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))) for _ in range(100)]
+    for query in queries:
+        key = normalize(query)
+        assert index._similar(guild, key) == brute_force_similar(guild.names, key), query
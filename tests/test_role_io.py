@@ -0,0 +1,58 @@
+import io
+
+import pytest
+
+from loadtest import FakeCollection
+from role_io import export_roles, import_roles
+
+
+def make_collection():
+    collection = FakeCollection()
+    import_roles(collection, io.StringIO('{"role": "frontend", "team_name": "Web"}\n'), guild_id=1)
+    import_roles(collection, io.StringIO('{"role": "frontend", "team_name": "Site"}\n'
+                                         '{"role": "backend", "team_members": ["ann"]}\n'), guild_id=2)
+    return collection
+
+
+def roles(collection):
+    return {key: {field: document.get(field) for field in ("team_name", "team_members")}
+            for key, document in collection.documents.items()}
+
+
+@pytest.mark.parametrize("fmt", ["jsonl", "csv"])
+def test_export_of_every_guild_round_trips(fmt):
+    source = make_collection()
+    fp = io.StringIO()
+    assert export_roles(source, fp, fmt)["rows"] == 3
+    assert "guild_id" in fp.getvalue()
+
+    target = FakeCollection()
+    stats = import_roles(target, io.StringIO(fp.getvalue()), fmt)
+    assert stats["upserted"] == 3
+    assert stats["skipped"] == 0
+    assert roles(target) == roles(source)
+
+
+def test_export_of_one_guild_has_no_guild_id():
+    fp = io.StringIO()
+    export_roles(make_collection(), fp, "csv", guild_id=2)
+    assert fp.getvalue().splitlines()[0] == "role,team_name,project_repo,team_members,status"
+
+
+def test_import_guild_id_overrides_rows():
+    fp = io.StringIO()
+    export_roles(make_collection(), fp)
+    target = FakeCollection()
+    import_roles(target, io.StringIO(fp.getvalue()), guild_id=3)
+    assert sorted(target.documents) == [(3, "backend"), (3, "frontend")]
+    assert target.documents[(3, "frontend")]["team_name"] in ("Web", "Site")
+
+
+def test_import_without_guild_id_skips_rows_without_one():
+    target = FakeCollection()
+    stats = import_roles(target, io.StringIO('{"role": "ops"}\n'
+                                             '{"role": "qa", "guild_id": 4}\n'
+                                             '{"role": "dev", "guild_id": "x"}\n'))
+    assert list(target.documents) == [(4, "qa")]
+    assert stats["skipped"] == 2
+    assert stats["skipped_lines"] == [1, 3]
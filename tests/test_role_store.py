@@ -0,0 +1,189 @@
+import os
+import threading
+
+import pytest
+
+import role_store
+from role_store import LogRoleStore, write_snapshot
+
+
+def open_store(path, **kwargs):
+    return LogRoleStore(str(path), fsync="never", **kwargs)
+
+
+def fill(store, count, prefix="role"):
+    for number in range(count):
+        store.update(f"{prefix}{number}", {"number": number})
+
+
+def test_replay_after_crash_drops_torn_entry(tmp_path):
+    store = open_store(tmp_path)
+    fill(store, 3)
+    store.update("role1", {"status": "Done"})
+    # A crash mid-write: the process dies without closing and leaves half a line behind
+    store._log.write(b'["role9",{"num')
+    store._log.flush()
+
+    store = open_store(tmp_path)
+    assert store.get("role1") == {"number": 1, "status": "Done"}
+    assert "role9" not in store
+    assert len(store) == 3
+    store.update("role3", {"number": 3})
+    store.close()
+
+    store = open_store(tmp_path)
+    assert sorted(store.keys()) == ["role0", "role1", "role2", "role3"]
+    store.close()
+
+
+def test_compaction_moves_log_into_snapshot(tmp_path):
+    store = open_store(tmp_path)
+    fill(store, 50)
+    store.update("role7", {"status": "Done"})
+    store.compact()
+    assert store.stats()["snapshot_records"] == 50
+    assert store.stats()["log_entries"] == 0
+    assert os.path.getsize(store.log_path) == 0
+    assert not os.path.exists(store.compacting_log_path)
+    store.update("extra", {"number": -1})
+    store.close()
+
+    store = open_store(tmp_path)
+    assert len(store) == 51
+    assert store.get("role7") == {"number": 7, "status": "Done"}
+    assert store.get("extra") == {"number": -1}
+    assert store.keys() == sorted(store.keys())
+    store.close()
+
+
+def test_compaction_triggered_by_updates_runs_in_background(tmp_path):
+    store = open_store(tmp_path, compact_after=20)
+    fill(store, 100)
+    store.close()
+    assert store.compactions >= 1
+
+    store = open_store(tmp_path)
+    assert len(store) == 100
+    assert all(store.get(f"role{number}") == {"number": number} for number in range(100))
+    store.close()
+
+
+def test_updates_during_compaction_are_kept(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    fill(store, 10)
+    writing, release = threading.Event(), threading.Event()
+
+    def slow_write_snapshot(*args):
+        writing.set()
+        release.wait(5)
+        write_snapshot(*args)
+
+    monkeypatch.setattr(role_store, "write_snapshot", slow_write_snapshot)
+    compactor = threading.Thread(target=store.compact)
+    compactor.start()
+    assert writing.wait(5)
+    # The store isn't locked while the snapshot is written
+    store.update("role3", {"status": "Done"})
+    store.update("late", {"number": 10})
+    assert store.get("role3") == {"number": 3, "status": "Done"}
+    release.set()
+    compactor.join()
+
+    assert store.stats()["snapshot_records"] == 10
+    assert store.stats()["log_entries"] == 2
+    assert store.get("role3") == {"number": 3, "status": "Done"}
+    store.close()
+
+    store = open_store(tmp_path)
+    assert len(store) == 11
+    assert store.get("role3") == {"number": 3, "status": "Done"}
+    assert store.get("late") == {"number": 10}
+    store.close()
+
+
+def test_failed_compaction_keeps_every_update(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    fill(store, 10)
+    store.compact()
+
+    def failing_write_snapshot(path, items, count):
+        with open(path, "wb") as fp:
+            fp.write(b"partial")
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(role_store, "write_snapshot", failing_write_snapshot)
+    fill(store, 5, prefix="new")
+    with pytest.raises(OSError):
+        store.compact()
+    assert store.failed_compactions == 1
+    assert not os.path.exists(store.snapshot_path + ".tmp")
+    assert not os.path.exists(store.compacting_log_path)
+    assert store.stats()["log_entries"] == 5
+    assert store.get("new4") == {"number": 4}
+    store.update("role0", {"status": "Done"})
+
+    monkeypatch.undo()
+    store.compact()
+    assert store.stats()["snapshot_records"] == 15
+    store.close()
+
+    store = open_store(tmp_path)
+    assert len(store) == 15
+    assert store.get("role0") == {"number": 0, "status": "Done"}
+    store.close()
+
+
+def test_interrupted_compaction_is_recovered_on_open(tmp_path):
+    store = open_store(tmp_path)
+    fill(store, 5)
+    store.close()
+    # The process died after moving the log aside, with one more update in the new log
+    os.replace(store.log_path, store.compacting_log_path)
+    with open(store.log_path, "wb") as fp:
+        fp.write(b'["role1",{"status":"Done"}]\n')
+
+    store = open_store(tmp_path)
+    assert not os.path.exists(store.compacting_log_path)
+    assert len(store) == 5
+    assert store.get("role1") == {"number": 1, "status": "Done"}
+    store.compact()
+    store.close()
+
+    store = open_store(tmp_path)
+    assert store.get("role1") == {"number": 1, "status": "Done"}
+    store.close()
+
+
+def write_test_snapshot(path, count=3):
+    items = sorted((f"role{number}".encode(), f'{{"number":{number}}}'.encode()) for number in range(count))
+    write_snapshot(str(path), items, count)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize("size", [1, role_store._HEADER.size - 1, role_store._HEADER.size + 1, -1])
+def test_truncated_snapshot_is_rejected(tmp_path, size):
+    path = tmp_path / "snapshot.bin"
+    data = write_test_snapshot(path)
+    path.write_bytes(data[:size])
+    with pytest.raises(ValueError, match="truncated"):
+        role_store._Snapshot(str(path))
+
+
+def test_corrupt_snapshot_is_rejected(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    data = write_test_snapshot(path)
+    path.write_bytes(b"NOTAROLE" + data[8:])
+    with pytest.raises(ValueError, match="not a role store snapshot"):
+        role_store._Snapshot(str(path))
+    with pytest.raises(ValueError):
+        open_store(tmp_path)
+
+
+def test_snapshot_lookups(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    write_test_snapshot(path, count=100)
+    snapshot = role_store._Snapshot(str(path))
+    assert snapshot.count == 100
+    assert snapshot.find(b"role42") == b'{"number":42}'
+    assert snapshot.find(b"role100") is None
+    snapshot.close()